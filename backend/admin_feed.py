@@ -0,0 +1,215 @@
+"""
+Live admin feed: new orders, order status changes and contact messages, pushed to the dashboard.
+
+``AdminEventBus`` fans events out to the open ``GET /api/admin/events``
+streams (server-sent events). Routes publish what they change, so the worker
+that handled a request delivers it at once; ``AdminFeedFollower`` picks up
+what other workers wrote, from a Mongo change stream when the server is a
+replica set and otherwise by polling the order event log and the messages
+every ``ADMIN_FEED_POLL_SECONDS`` while anyone is listening. The bus drops
+events it already delivered, so a change that arrives both ways is sent once.
+
+Each event's SSE ``id`` is a resume token, ``<time>|<id>`` of the document it
+came from. A client reconnecting with ``Last-Event-ID`` is replayed what it
+missed from storage, whichever worker it reaches; when that's more than
+``ADMIN_FEED_REPLAY_LIMIT`` events it gets a ``reset`` event and reloads.
+"""
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from serialization import dumps
+
+ADMIN_FEED_POLL_SECONDS = float(os.getenv("ADMIN_FEED_POLL_SECONDS", "2"))
+ADMIN_FEED_KEEPALIVE_SECONDS = float(os.getenv("ADMIN_FEED_KEEPALIVE_SECONDS", "15"))
+ADMIN_FEED_REPLAY_LIMIT = int(os.getenv("ADMIN_FEED_REPLAY_LIMIT", "500"))
+# Events a stream may fall behind by before it is told to reload
+ADMIN_FEED_QUEUE_SIZE = 1000
+# Recently delivered event ids remembered, so the same change isn't delivered twice
+ADMIN_FEED_DEDUPE_SIZE = 10000
+
+RESET = {"kind": "reset"}
+
+logger = logging.getLogger(__name__)
+
+
+def order_event(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """A feed event for an ``order_events`` document; notes aren't sent"""
+    if doc.get("type") == "note":
+        return None
+    data = {key: doc.get(key) for key in ("order_id", "order_number", "type", "from", "to", "actor", "at")}
+    return {"kind": "order", "id": doc["id"], "at": doc["at"], "data": data}
+
+
+def message_event(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """A feed event for a new contact message"""
+    data = {key: doc.get(key) for key in ("id", "name", "email", "subject", "created_at")}
+    return {"kind": "message", "id": doc["id"], "at": doc["created_at"], "data": data}
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    if event is RESET:
+        return "event: reset\ndata: {}\n\n"
+    data = dumps(event["data"]).decode("utf-8")
+    return f"id: {event['at']}|{event['id']}\nevent: {event['kind']}\ndata: {data}\n\n"
+
+
+async def events_since(storage, at: str, limit: int = ADMIN_FEED_REPLAY_LIMIT) -> Tuple[List[Dict[str, Any]], bool]:
+    """Events from ``at`` on, oldest first, and whether that's all of them (not cut at ``limit``)"""
+    orders = await storage.order_events.find({"at": {"$gte": at}, "type": {"$ne": "note"}},
+                                             sort=[("at", 1)], limit=limit + 1)
+    messages = await storage.messages.find({"created_at": {"$gte": at}}, sort=[("created_at", 1)],
+                                           limit=limit + 1, exclude=["message"])
+    events = [order_event(doc) for doc in orders[:limit]] + [message_event(doc) for doc in messages[:limit]]
+    events.sort(key=lambda event: event["at"])
+    complete = len(orders) <= limit and len(messages) <= limit and len(events) <= limit
+    return events[:limit], complete
+
+
+class AdminEventBus:
+    """In-process pub/sub between the routes that change things and the open admin streams"""
+
+    def __init__(self, queue_size: int = ADMIN_FEED_QUEUE_SIZE, dedupe_size: int = ADMIN_FEED_DEDUPE_SIZE):
+        self.queue_size = queue_size
+        self.dedupe_size = dedupe_size
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._delivered: "OrderedDict[str, None]" = OrderedDict()
+
+    @property
+    def listening(self) -> bool:
+        return bool(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, event: Optional[Dict[str, Any]]) -> bool:
+        """Deliver an event to every stream; False if it was None or already delivered"""
+        if event is None or event["id"] in self._delivered:
+            return False
+        self._delivered[event["id"]] = None
+        while len(self._delivered) > self.dedupe_size:
+            self._delivered.popitem(last=False)
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too far behind to catch up: drop what it holds and have it reload
+                self._subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESET)
+        return True
+
+
+async def sse_stream(bus: AdminEventBus, storage, last_event_id: Optional[str] = None,
+                     keepalive: float = ADMIN_FEED_KEEPALIVE_SECONDS,
+                     replay_limit: int = ADMIN_FEED_REPLAY_LIMIT) -> AsyncIterator[str]:
+    """The text of one admin event stream: replay after ``last_event_id``, then live events"""
+    # Subscribe first, so nothing published during the replay is missed
+    queue = bus.subscribe()
+    try:
+        yield "retry: 3000\n\n"
+        replayed: Set[str] = set()
+        if last_event_id:
+            at, _, last_id = last_event_id.partition("|")
+            # The event the token names comes back too, and isn't sent again
+            events, complete = await events_since(storage, at, replay_limit + 1)
+            if not complete:
+                yield format_sse(RESET)
+            for event in events if complete else []:
+                if event["id"] != last_id:
+                    replayed.add(event["id"])
+                    yield format_sse(event)
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                # A comment line keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+            if event is RESET:
+                yield format_sse(RESET)
+                return
+            if event["id"] not in replayed:
+                yield format_sse(event)
+    finally:
+        bus.unsubscribe(queue)
+
+
+class AdminFeedFollower:
+    """Publishes the changes other workers make: a Mongo change stream where there is one, else polling"""
+
+    def __init__(self, bus: AdminEventBus, storage, poll_seconds: float = ADMIN_FEED_POLL_SECONDS):
+        self.bus = bus
+        self.storage = storage
+        self.poll_seconds = poll_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        if self.storage.name == "mongo":
+            try:
+                await self._watch()
+                return
+            except Exception as e:
+                # Change streams need a replica set; a standalone server is polled instead
+                logger.info(f"Admin feed change stream unavailable, polling instead: {str(e)}")
+        await self._poll()
+
+    async def _watch(self):
+        collections = {self.storage.order_events.name: order_event, self.storage.messages.name: message_event}
+        pipeline = [{"$match": {"operationType": "insert", "ns.coll": {"$in": list(collections)}}}]
+        resume_token = None
+        while True:
+            watching = False
+            try:
+                async with self.storage.db.watch(pipeline, resume_after=resume_token) as stream:
+                    watching = True
+                    async for change in stream:
+                        resume_token = change["_id"]
+                        doc = change["fullDocument"]
+                        doc.pop("_id", None)
+                        self.bus.publish(collections[change["ns"]["coll"]](doc))
+            except Exception as e:
+                if not watching:
+                    raise
+                logger.warning(f"Admin feed change stream interrupted, resuming: {str(e)}")
+                await asyncio.sleep(self.poll_seconds)
+
+    async def _poll(self):
+        cursor = datetime.now(timezone.utc).isoformat()
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            if not self.bus.listening:
+                # New streams replay their own history; only what happens while someone listens is needed
+                cursor = datetime.now(timezone.utc).isoformat()
+                continue
+            try:
+                events, _ = await events_since(self.storage, cursor)
+            except Exception as e:
+                logger.error(f"Admin feed poll failed: {str(e)}")
+                continue
+            for event in events:
+                # Already delivered events (published here, or seen at the cursor last time) are dropped
+                self.bus.publish(event)
+                cursor = max(cursor, event["at"])
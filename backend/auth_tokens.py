@@ -0,0 +1,222 @@
+"""
+Access and refresh tokens for admins and customers.
+
+Access tokens are short-lived JWTs carrying the principal's role, name and
+email plus a ``jti``, so an authenticated request is authorised from the token
+alone, without a storage read. A token is only accepted for its own role: an
+admin token is not a customer token and vice versa.
+
+Refresh tokens are opaque random strings, stored server-side by hash and
+rotated on every use. Presenting a refresh token that was already rotated is
+treated as theft: all of that principal's refresh tokens are revoked.
+
+Logged-out access tokens are kept in an in-memory revocation list until they
+expire. With several workers each process has its own list, which the short
+access-token lifetime bounds.
+"""
+import hashlib
+import os
+import secrets
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+ACCESS_TOKEN_MINUTES = int(os.getenv("ACCESS_TOKEN_MINUTES", "30"))
+REFRESH_TOKEN_DAYS = int(os.getenv("REFRESH_TOKEN_DAYS", "30"))
+ROLES = ("admin", "customer")
+
+
+class TokenError(Exception):
+    """Rejected token; the message is safe to return as a 401 detail"""
+
+
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def principal_claims(role: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Identity claims of an admin or customer document"""
+    return {"sub": doc["id"], "role": role, "name": doc.get("name", ""), "email": doc.get("email", "")}
+
+
+class RevocationList:
+    """Revoked access-token ids, and subjects whose earlier tokens are void, until they expire"""
+
+    def __init__(self, ttl: float = ACCESS_TOKEN_MINUTES * 60):
+        self.ttl = ttl
+        self._jtis: Dict[str, float] = {}
+        self._subjects: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._pruned = time.time()
+
+    def revoke(self, jti: str, expires_at: float):
+        with self._lock:
+            self._jtis[jti] = expires_at
+            self._prune()
+
+    def revoke_subject(self, subject: str):
+        """Void every access token issued to ``subject`` so far"""
+        with self._lock:
+            self._subjects[subject] = time.time()
+            self._prune()
+
+    def is_revoked(self, claims: Dict[str, Any]) -> bool:
+        if claims.get("jti") in self._jtis:
+            return True
+        revoked_at = self._subjects.get(claims.get("sub"))
+        return revoked_at is not None and claims.get("iat", 0) <= revoked_at
+
+    def _prune(self):
+        now = time.time()
+        if now - self._pruned < 60:
+            return
+        self._pruned = now
+        self._jtis = {jti: exp for jti, exp in self._jtis.items() if exp > now}
+        self._subjects = {sub: at for sub, at in self._subjects.items() if at + self.ttl > now}
+
+    def __len__(self) -> int:
+        return len(self._jtis)
+
+
+class JsonRefreshStore:
+    """Refresh tokens in a JSON file, read and written with the server's load/save helpers"""
+
+    def __init__(self, path, load: Callable[[Any], List[Dict]], save: Callable[[Any, List[Dict]], None]):
+        self.path = path
+        self.load = load
+        self.save = save
+        self._lock = threading.Lock()
+
+    def _live(self, records: List[Dict]) -> List[Dict]:
+        now = datetime.now(timezone.utc).isoformat()
+        return [r for r in records if r["expires_at"] > now]
+
+    async def add(self, record: Dict[str, Any]):
+        with self._lock:
+            records = self._live(self.load(self.path))
+            records.append(record)
+            self.save(self.path, records)
+
+    async def rotate(self, token_hash: str) -> Optional[Dict[str, Any]]:
+        """Mark a record rotated and return it as it was before"""
+        with self._lock:
+            records = self.load(self.path)
+            record = next((r for r in records if r["id"] == token_hash), None)
+            if record is None:
+                return None
+            before = dict(record)
+            if not record.get("rotated"):
+                record["rotated"] = True
+                self.save(self.path, records)
+            return before
+
+    async def revoke_subject(self, subject: str):
+        with self._lock:
+            records = self.load(self.path)
+            self.save(self.path, [r for r in records if r["subject"] != subject])
+
+
+class MongoRefreshStore:
+    """Refresh tokens in a ``refresh_tokens`` collection with a TTL index"""
+
+    def __init__(self, db):
+        self.collection = db.refresh_tokens
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+        await self.collection.create_index("subject")
+
+    async def add(self, record: Dict[str, Any]):
+        await self.collection.insert_one({
+            **record, "_id": record["id"], "expires_at": datetime.fromisoformat(record["expires_at"])
+        })
+
+    async def rotate(self, token_hash: str) -> Optional[Dict[str, Any]]:
+        record = await self.collection.find_one_and_update({"_id": token_hash}, {"$set": {"rotated": True}})
+        if record is not None:
+            record.pop("_id", None)
+            record["expires_at"] = record["expires_at"].replace(tzinfo=timezone.utc).isoformat()
+        return record
+
+    async def revoke_subject(self, subject: str):
+        await self.collection.delete_many({"subject": subject})
+
+
+class TokenService:
+    def __init__(self, secret: str, algorithm: str, refresh_store,
+                 revocations: Optional[RevocationList] = None,
+                 access_minutes: int = ACCESS_TOKEN_MINUTES, refresh_days: int = REFRESH_TOKEN_DAYS):
+        self.secret = secret
+        self.algorithm = algorithm
+        self.refresh_store = refresh_store
+        self.revocations = revocations or RevocationList(access_minutes * 60)
+        self.access_ttl = access_minutes * 60
+        self.refresh_ttl = timedelta(days=refresh_days)
+
+    def create_access_token(self, claims: Dict[str, Any]) -> str:
+        import jwt
+
+        now = time.time()
+        payload = {**claims, "type": "access", "jti": uuid.uuid4().hex, "iat": now, "exp": int(now) + self.access_ttl}
+        return jwt.encode(payload, self.secret, algorithm=self.algorithm)
+
+    async def issue(self, claims: Dict[str, Any]) -> Dict[str, Any]:
+        """Access and refresh token pair for ``principal_claims(...)``"""
+        refresh_token = secrets.token_urlsafe(32)
+        now = datetime.now(timezone.utc)
+        await self.refresh_store.add({
+            "id": hash_refresh_token(refresh_token),
+            "subject": claims["sub"],
+            "role": claims["role"],
+            "created_at": now.isoformat(),
+            "expires_at": (now + self.refresh_ttl).isoformat(),
+            "rotated": False
+        })
+        return {
+            "access_token": self.create_access_token(claims),
+            "refresh_token": refresh_token,
+            "token_type": "bearer",
+            "expires_in": self.access_ttl
+        }
+
+    def verify(self, token: str, role: Optional[str] = None) -> Dict[str, Any]:
+        """Claims of a valid access token, for ``role`` when given"""
+        # PyJWT loads cryptography's algorithms on import, so it is imported with the first token
+        import jwt
+
+        try:
+            claims = jwt.decode(token, self.secret, algorithms=[self.algorithm])
+        except jwt.ExpiredSignatureError:
+            raise TokenError("Token expired")
+        except jwt.InvalidTokenError:
+            raise TokenError("Invalid token")
+        if claims.get("type") != "access" or claims.get("role") not in ROLES:
+            raise TokenError("Invalid token")
+        if role is not None and claims["role"] != role:
+            raise TokenError("Invalid token")
+        if self.revocations.is_revoked(claims):
+            raise TokenError("Token revoked")
+        return claims
+
+    async def rotate(self, refresh_token: str) -> Dict[str, Any]:
+        """Consume a refresh token, returning its record (subject and role)"""
+        record = await self.refresh_store.rotate(hash_refresh_token(refresh_token))
+        if record is None or record["expires_at"] <= datetime.now(timezone.utc).isoformat():
+            raise TokenError("Invalid refresh token")
+        if record.get("rotated"):
+            await self.revoke_subject(record["subject"])
+            raise TokenError("Refresh token reused")
+        return record
+
+    async def revoke(self, claims: Dict[str, Any], refresh_token: Optional[str] = None):
+        """Log out one session: its access token and, if given, its refresh token"""
+        self.revocations.revoke(claims["jti"], claims["exp"])
+        if refresh_token:
+            await self.refresh_store.rotate(hash_refresh_token(refresh_token))
+
+    async def revoke_subject(self, subject: str):
+        """Log a principal out everywhere"""
+        self.revocations.revoke_subject(subject)
+        await self.refresh_store.revoke_subject(subject)
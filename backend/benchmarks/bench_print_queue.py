@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark the print-queue scheduler with hundreds of pending items.
+
+Usage: python benchmarks/bench_print_queue.py [--items 500] [--printers 4] [--repeat 20]
+"""
+import argparse
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from print_queue import build_print_plan
+
+COLORS = ["Branco", "Preto", "Vermelho", "Azul", "Verde", "Amarelo", "Cinzento", "Laranja"]
+SIZES = [("Pequeno", 0.6), ("Médio", 1.0), ("Grande", 1.8)]
+
+
+def synthetic_catalog(count: int):
+    return [{
+        "id": f"prod-{i}",
+        "name_pt": f"Produto {i}",
+        "print_time_minutes": random.randint(15, 240),
+        "sizes": [{"name": name, "print_time_multiplier": mult} for name, mult in SIZES]
+    } for i in range(count)]
+
+
+def synthetic_orders(items: int, products):
+    orders = []
+    remaining = items
+    while remaining > 0:
+        count = min(remaining, random.randint(1, 4))
+        remaining -= count
+        orders.append({
+            "id": str(uuid.uuid4()),
+            "order_number": f"PX{len(orders):05d}",
+            "status": "confirmed",
+            "created_at": f"2026-01-{random.randint(1, 28):02d}T10:00:00+00:00",
+            "items": [{
+                "product_id": random.choice(products)["id"],
+                "selected_color": random.choice(COLORS),
+                "selected_size": random.choice(SIZES)[0],
+                "quantity": random.randint(1, 3)
+            } for _ in range(count)]
+        })
+    return orders
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--printers", type=int, default=4)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    products = synthetic_catalog(args.products)
+    orders = synthetic_orders(args.items, products)
+
+    timings = []
+    plan = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        plan = build_print_plan(orders, products, args.printers)
+        timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    lower_bound = plan["total_print_minutes"] / args.printers
+    print(f"Items: {plan['job_count']}  Orders: {len(orders)}  Printers: {args.printers}")
+    print(f"Plan time: median {timings[len(timings) // 2] * 1000:.2f} ms, max {timings[-1] * 1000:.2f} ms")
+    print(f"Makespan: {plan['makespan_minutes']:.0f} min (lower bound {lower_bound:.0f} min, "
+          f"{plan['makespan_minutes'] / lower_bound:.3f}x)")
+    print(f"Color changes: {plan['color_changes']} across {len(COLORS)} colors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON serialization for /api/products and /api/orders.
+
+Compares the previous path (stdlib json files, a Pydantic model per product
+and FastAPI's default encoder) with the orjson path (orjson files, projection
+of already-validated documents, FastJSONResponse), then measures end-to-end
+throughput of both routes through the server on the JSON-file backend.
+
+Usage: python benchmarks/bench_serialization.py [--sizes 1000 10000] [--repeat 5] [--json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from common import asgi_request, synthetic_categories, synthetic_customers, synthetic_orders, synthetic_products
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    random.seed(42)
+    data_dir = os.path.join(tempfile.mkdtemp(prefix="pulgax-bench-"), "data")
+    os.environ["STORAGE_BACKEND"] = "json"
+    os.environ["DATA_DIR"] = data_dir
+
+    # Imported after the environment is set so the server's data directory lives in the temp dir
+    from fastapi.encoders import jsonable_encoder
+    import server
+    from server import ProductResponse, token_service
+    from storage import load_json, save_json
+    from auth_tokens import principal_claims
+    from serialization import dumps, project
+
+    data = server.storage.data_dir
+    admins_file, categories_file = data / "admins.json", data / "categories.json"
+    products_file, orders_file = data / "products.json", data / "orders.json"
+
+    bench_admin = {"id": "bench-admin", "email": "bench@example.com", "password": "", "name": "Bench", "created_at": ""}
+    save_json(admins_file, [bench_admin])
+    headers = {"authorization": f"Bearer {token_service.create_access_token(principal_claims('admin', bench_admin))}"}
+
+    def legacy_load(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def legacy_save(path, data):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
+    def legacy_render(content):
+        return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                          indent=None, separators=(",", ":")).encode("utf-8")
+
+    results = []
+    categories = synthetic_categories()
+    customers = synthetic_customers(200)
+    save_json(categories_file, categories)
+
+    for size in args.sizes:
+        products = synthetic_products(size, categories)
+        orders = synthetic_orders(size, products, customers)
+        save_json(products_file, products)
+        save_json(orders_file, orders)
+        server.storage.stock.load(products)
+
+        def products_before():
+            docs = legacy_load(products_file)
+            legacy_render([ProductResponse(**p) for p in docs if p.get("active", True)])
+
+        def products_after():
+            docs = load_json(products_file)
+            dumps([project(p, ProductResponse) for p in docs if p.get("active", True)])
+
+        def orders_before():
+            legacy_render(legacy_load(orders_file))
+
+        def orders_after():
+            dumps(load_json(orders_file))
+
+        row = {
+            "records": size,
+            "products_before_ms": best_of(args.repeat, products_before) * 1000,
+            "products_after_ms": best_of(args.repeat, products_after) * 1000,
+            "orders_before_ms": best_of(args.repeat, orders_before) * 1000,
+            "orders_after_ms": best_of(args.repeat, orders_after) * 1000,
+            "save_before_ms": best_of(args.repeat, lambda: legacy_save(orders_file, orders)) * 1000,
+            "save_after_ms": best_of(args.repeat, lambda: save_json(orders_file, orders)) * 1000,
+        }
+
+        async def throughput(path):
+            start = time.perf_counter()
+            for _ in range(args.requests):
+                status, _, _ = await asgi_request(server.app, "GET", path, headers)
+                assert status == 200, f"{path} returned {status}"
+            return args.requests / (time.perf_counter() - start)
+
+        row["products_rps"] = asyncio.run(throughput("/api/products"))
+        row["orders_rps"] = asyncio.run(throughput("/api/orders"))
+        results.append(row)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for row in results:
+        print(f"\n{row['records']} records")
+        for name in ("products", "orders", "save"):
+            before, after = row[f"{name}_before_ms"], row[f"{name}_after_ms"]
+            print(f"  {name:<9} before {before:8.2f} ms  after {after:8.2f} ms  ({before / after:.1f}x)")
+        print(f"  GET /api/products {row['products_rps']:.1f} req/s, GET /api/orders {row['orders_rps']:.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
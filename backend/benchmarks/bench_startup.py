@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark the API's cold start: importing ``server`` and running its lifespan.
+
+Each run is a fresh interpreter started with ``-X importtime``, so the report
+has the same per-module breakdown: the median import and lifespan times, the
+packages taking the most import time (self time, summed per top-level
+package) and whether any of the packages the app defers until first use
+(the Mongo driver, jinja2, PyJWT, smtplib) was imported anyway.
+
+The lifespan is skipped for the mongo backend, which needs a server to start;
+its import alone runs without one, as the client is only created on first use.
+
+Usage: python benchmarks/bench_startup.py [--backends json sqlite mongo] [--repeat 5] [--top 15] [--json]
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+BACKENDS = ["json", "sqlite", "mongo"]
+# Imported only once a request (or the Mongo backend) needs them
+DEFERRED = ["motor", "pymongo", "bson", "dns", "cryptography", "jinja2", "jwt", "smtplib"]
+
+_PROBE = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+import server
+imported = time.perf_counter()
+result = {"import_s": imported - start, "modules": len(sys.modules)}
+if %(lifespan)r:
+    async def run():
+        async with server.app.router.lifespan_context(server.app):
+            result["lifespan_s"] = time.perf_counter() - imported
+    asyncio.run(run())
+print(json.dumps(result))
+"""
+
+_IMPORT_TIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """The ``-X importtime`` lines of ``stderr``: module, self and cumulative microseconds, nesting depth"""
+    rows = []
+    for line in stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match:
+            rows.append({"module": match[4], "self_us": int(match[1]), "cumulative_us": int(match[2]),
+                         "depth": (len(match[3]) - 1) // 2})
+    return rows
+
+
+def run_once(backend: str, lifespan: bool) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="pulgax-startup-") as root:
+        env = {**os.environ, "STORAGE_BACKEND": backend, "DATA_DIR": str(Path(root) / "data"),
+               "DB_NAME": "pulgax_bench_startup"}
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _PROBE % {"lifespan": lifespan}],
+                              cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{backend} startup failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["imports"] = parse_importtime(proc.stderr)
+    return result
+
+
+def bench_backend(backend: str, repeat: int, top: int) -> Dict[str, Any]:
+    lifespan = backend != "mongo"
+    # The first run compiles the bytecode caches; every deploy after the build starts warm
+    run_once(backend, lifespan)
+    runs = [run_once(backend, lifespan) for _ in range(repeat)]
+
+    packages: Counter = Counter()
+    for run in runs:
+        for row in run["imports"]:
+            packages[row["module"].split(".")[0]] += row["self_us"]
+    imported = {row["module"].split(".")[0] for row in runs[-1]["imports"]}
+    server_row = next(row for row in runs[-1]["imports"] if row["module"] == "server")
+    return {
+        "backend": backend,
+        "import_ms": statistics.median(run["import_s"] for run in runs) * 1000,
+        "lifespan_ms": statistics.median(run["lifespan_s"] for run in runs) * 1000 if lifespan else None,
+        "server_cumulative_ms": server_row["cumulative_us"] / 1000,
+        "modules": runs[-1]["modules"],
+        "top_packages": [{"package": name, "self_ms": us / len(runs) / 1000} for name, us in packages.most_common(top)],
+        "deferred_imported": [name for name in DEFERRED if name in imported],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=["json", "sqlite"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = [bench_backend(backend, args.repeat, args.top) for backend in args.backends]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for row in results:
+        lifespan = f"{row['lifespan_ms']:.1f} ms" if row["lifespan_ms"] is not None else "skipped"
+        print(f"\n{row['backend']}: import {row['import_ms']:.1f} ms (median of {args.repeat}), "
+              f"lifespan {lifespan}, {row['modules']} modules")
+        print(f"  {'package':<24}{'self ms':>10}")
+        for package in row["top_packages"]:
+            print(f"  {package['package']:<24}{package['self_ms']:>10.1f}")
+        deferred = ", ".join(row["deferred_imported"]) or "none"
+        print(f"  deferred packages imported at startup: {deferred}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark the embedded storage backends (JSON files and SQLite) with large order tables.
+
+Seeds each backend through the repository interface, then times the order
+operations the API performs: a cold first read (a new worker, or any worker
+after another one wrote the file), checkout inserts, admin status updates,
+the customer's order history, the pending-orders count and the admin order
+list.
+
+Usage: python benchmarks/bench_storage.py [--sizes 10000 100000] [--repeat 5] [--json]
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from common import synthetic_categories, synthetic_customers, synthetic_orders, synthetic_products
+
+from storage import JsonStorage, SqliteStorage
+
+BACKENDS = {
+    "json": lambda root: JsonStorage(root / "data"),
+    "sqlite": lambda root: SqliteStorage(root / "data" / "store.sqlite3"),
+}
+
+
+async def timed(repeat, fn):
+    """Median milliseconds of ``repeat`` runs of the coroutine function ``fn``"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+async def bench_backend(name, orders, customers, repeat):
+    root = Path(tempfile.mkdtemp(prefix=f"pulgax-storage-{name}-"))
+    storage = BACKENDS[name](root)
+    await storage.start()
+
+    start = time.perf_counter()
+    await storage.orders.insert_many(orders)
+    row = {"backend": name, "seed_s": time.perf_counter() - start}
+
+    sample = random.Random(7)
+    order_ids = [order["id"] for order in orders]
+    customer_ids = [customer["id"] for customer in customers]
+
+    async def cold_get():
+        # A fresh backend object has nothing cached, like a worker whose copy went stale
+        fresh = BACKENDS[name](root)
+        await fresh.orders.get(sample.choice(order_ids))
+        await fresh.close()
+
+    async def get_order():
+        await storage.orders.get(sample.choice(order_ids))
+
+    async def insert_order():
+        order = dict(sample.choice(orders), id=str(uuid.uuid4()))
+        await storage.orders.insert(order)
+
+    async def update_status():
+        now = time.strftime("%Y-%m-%dT%H:%M:%S")
+        await storage.orders.update_one(
+            {"id": sample.choice(order_ids)}, {"status": "processing", "updated_at": now},
+            prepend={"status_history": {"status": "processing", "updated_at": now, "note": "", "updated_by": "bench"}}
+        )
+
+    async def customer_orders():
+        await storage.orders.find({"customer_id": sample.choice(customer_ids)}, sort=[("created_at", -1)], limit=100)
+
+    async def pending_count():
+        await storage.orders.count({"status": "pending"})
+
+    async def admin_list():
+        await storage.orders.find(sort=[("created_at", -1)], limit=500)
+
+    for label, fn in (("cold_get", cold_get), ("get", get_order), ("insert", insert_order),
+                      ("update_status", update_status), ("customer_orders", customer_orders),
+                      ("pending_count", pending_count), ("admin_list", admin_list)):
+        row[f"{label}_ms"] = await timed(repeat, fn)
+
+    await storage.close()
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS))
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    random.seed(42)
+    categories = synthetic_categories()
+    products = synthetic_products(200, categories)
+    customers = synthetic_customers(2000)
+
+    results = []
+    for size in args.sizes:
+        orders = synthetic_orders(size, products, customers)
+        for name in args.backends:
+            results.append({"orders": size, **asyncio.run(bench_backend(name, orders, customers, args.repeat))})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    operations = ["cold_get", "get", "insert", "update_status", "customer_orders", "pending_count", "admin_list"]
+    for size in args.sizes:
+        print(f"\n{size} orders (median ms)")
+        print(f"  {'operation':<16}" + "".join(f"{name:>12}" for name in args.backends))
+        rows = {row["backend"]: row for row in results if row["orders"] == size}
+        print(f"  {'seed (s)':<16}" + "".join(f"{rows[name]['seed_s']:>12.2f}" for name in args.backends))
+        for op in operations:
+            print(f"  {op:<16}" + "".join(f"{rows[name][f'{op}_ms']:>12.2f}" for name in args.backends))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Shared helpers for the benchmark scripts: synthetic data and an in-process
+ASGI driver that exercises the full FastAPI stack without a network client.
+"""
+import asyncio
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+COLORS = ["Branco", "Preto", "Vermelho", "Azul", "Verde", "Amarelo", "Cinzento", "Laranja"]
+SIZES = [("Pequeno", 0, 0.6), ("Médio", 5, 1.0), ("Grande", 12, 1.8)]
+
+
+def synthetic_categories(count: int = 8) -> List[Dict[str, Any]]:
+    now = datetime.now(timezone.utc).isoformat()
+    return [{
+        "id": f"cat-{i}",
+        "name_pt": f"Categoria {i}",
+        "name_en": f"Category {i}",
+        "description_pt": "Itens impressos em 3D",
+        "description_en": "3D printed items",
+        "image_url": "",
+        "created_at": now
+    } for i in range(count)]
+
+
+def synthetic_products(count: int, categories: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    now = datetime.now(timezone.utc).isoformat()
+    products = []
+    for i in range(count):
+        colors = random.sample(COLORS, random.randint(1, 4))
+        products.append({
+            "id": f"prod-{i}",
+            "name_pt": f"Produto impresso {i}",
+            "name_en": f"Printed product {i}",
+            "description_pt": "Peça impressa em 3D com acabamento cuidado. " * 4,
+            "description_en": "3D printed piece with a careful finish. " * 4,
+            "base_price": round(random.uniform(5, 80), 2),
+            "category_id": random.choice(categories)["id"],
+            "colors": [{"name": c, "hex_code": "#%06x" % random.randint(0, 0xFFFFFF),
+                        "image_url": f"https://cdn.example.com/{i}/{c}.jpg"} for c in colors],
+            "sizes": [{"name": name, "price_modifier": mod, "print_time_multiplier": mult}
+                      for name, mod, mult in SIZES],
+            "customization_options": [{"name": "Gravação", "price_modifier": 3}],
+            "images": [f"https://cdn.example.com/{i}/main.jpg"],
+            "featured": random.random() < 0.1,
+            "active": random.random() < 0.95,
+            "print_time_minutes": random.randint(15, 240),
+            "created_at": now
+        })
+    return products
+
+
+def synthetic_customers(count: int, password_hash: str = "") -> List[Dict[str, Any]]:
+    now = datetime.now(timezone.utc).isoformat()
+    return [{
+        "id": f"cust-{i}",
+        "email": f"customer{i}@example.com",
+        "password": password_hash,
+        "name": f"Cliente {i}",
+        "phone": f"91{i:07d}",
+        "address": {"street": f"Rua {i}", "city": "Lisboa", "postal_code": "1000-001", "country": "Portugal"},
+        "created_at": now
+    } for i in range(count)]
+
+
+def synthetic_orders(count: int, products: List[Dict[str, Any]], customers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    statuses = ["pending", "confirmed", "processing", "shipped", "delivered", "cancelled"]
+    orders = []
+    for i in range(count):
+        customer = random.choice(customers) if customers else None
+        items = []
+        for product in random.sample(products, min(len(products), random.randint(1, 3))):
+            size = random.choice(SIZES)
+            items.append({
+                "product_id": product["id"],
+                "product_name": product["name_pt"],
+                "quantity": random.randint(1, 3),
+                "unit_price": product["base_price"],
+                "selected_color": random.choice(product["colors"])["name"],
+                "selected_size": size[0],
+                "size_price_adjustment": size[1],
+                "customizations": {},
+                "image_url": product["images"][0]
+            })
+        subtotal = sum(item["unit_price"] * item["quantity"] for item in items)
+        adjustments = sum(item["size_price_adjustment"] * item["quantity"] for item in items)
+        created = (start + timedelta(minutes=i * 525600 / max(count, 1))).isoformat()
+        orders.append({
+            "id": str(uuid.uuid4()),
+            "order_number": f"PX{i:06d}",
+            "customer_id": customer["id"] if customer else None,
+            "customer": {
+                "name": customer["name"] if customer else "Convidado",
+                "email": customer["email"] if customer else "guest@example.com",
+                "phone": customer["phone"] if customer else ""
+            },
+            "shipping": {"address": "Rua Exemplo 1, Lisboa", "notes": ""},
+            "payment": {"method": "mbway", "details": {"method": "mbway", "phone_last_digits": "123"},
+                        "status": "pending", "amount": subtotal + adjustments},
+            "items": items,
+            "totals": {"subtotal": subtotal, "adjustments": adjustments, "total": subtotal + adjustments},
+            "status": random.choice(statuses),
+            "created_at": created,
+            "updated_at": created
+        })
+    return orders
+
+
+async def asgi_request(app, method: str, path: str, headers: Optional[Dict[str, str]] = None,
+                       body: bytes = b"") -> Tuple[int, Dict[str, str], bytes]:
+    """Send one request straight into an ASGI app and collect the response"""
+    path, _, query = path.partition("?")
+    raw_headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in (headers or {}).items()]
+    if body:
+        raw_headers.append((b"content-length", str(len(body)).encode()))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": raw_headers,
+        "client": ("127.0.0.1", 12345),
+        "server": ("testserver", 80),
+    }
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.sleep(3600)
+        return {"type": "http.disconnect"}
+
+    status = 0
+    response_headers: Dict[str, str] = {}
+    chunks = []
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers.update({k.decode("latin-1"): v.decode("latin-1") for k, v in message.get("headers", [])})
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, response_headers, b"".join(chunks)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
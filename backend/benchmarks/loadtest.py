@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Reproducible load test for the API.
+
+Seeds a synthetic dataset (products with colors/sizes/options, customers and
+orders) into the JSON-file, SQLite or MongoDB backend, then drives realistic scenarios
+with an async load generator and reports p50/p95/p99 latency and throughput
+per scenario and per endpoint.
+
+Scenarios:
+  browse    categories, a category page and a product page, in both languages
+  checkout  a product page followed by a guest order
+  admin     dashboard: stats, orders, all products and contact messages
+  status    order status updates by an admin
+
+By default the app runs in-process (no network, lifespan events included).
+With --url the requests go to a running server through httpx; seed that
+server's storage with the same --backend/--data-dir/--mongo-db first.
+
+Usage:
+  python benchmarks/loadtest.py [--backend json|sqlite|mongo] [--url http://127.0.0.1:8000]
+                                [--products 500] [--customers 200] [--orders 2000]
+                                [--concurrency 16] [--duration 10] [--scenarios browse checkout]
+                                [--seed 42] [--output results.json]
+
+The JSON report (stdout with --json, or --output) includes the git commit so
+runs can be compared across commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from common import (
+    BACKEND_DIR, asgi_request, percentile, synthetic_categories, synthetic_customers,
+    synthetic_orders, synthetic_products
+)
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - only needed with --url
+    httpx = None
+
+SCENARIOS = ("browse", "checkout", "admin", "status")
+ADMIN_EMAIL = "loadtest-admin@example.com"
+PASSWORD = "loadtest123"
+STATUS_FLOW = ["confirmed", "processing", "shipped", "delivered"]
+
+
+# ============== DATASET ==============
+
+def build_dataset(products: int, customers: int, orders: int, seed: int) -> Dict[str, List[Dict[str, Any]]]:
+    import bcrypt
+
+    random.seed(seed)
+    password_hash = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=4)).decode("utf-8")
+    categories = synthetic_categories()
+    catalog = synthetic_products(products, categories)
+    people = synthetic_customers(customers, password_hash)
+    return {
+        "categories": categories,
+        "products": catalog,
+        "customers": people,
+        "orders": synthetic_orders(orders, catalog, people),
+        "admins": [{"id": "loadtest-admin", "email": ADMIN_EMAIL, "password": password_hash,
+                    "name": "Load Test", "created_at": categories[0]["created_at"]}]
+    }
+
+
+def seed_json(data_dir: Path, dataset: Dict[str, List[Dict[str, Any]]]):
+    from serialization import dumps
+
+    data_dir.mkdir(parents=True, exist_ok=True)
+    for name, docs in dataset.items():
+        (data_dir / f"{name}.json").write_bytes(dumps(docs, indent=True))
+    (data_dir / "messages.json").write_bytes(dumps([], indent=True))
+    journal = data_dir / "stock_journal.jsonl"
+    if journal.exists():
+        journal.unlink()
+
+
+def seed_sqlite(data_dir: Path, dataset: Dict[str, List[Dict[str, Any]]]):
+    from storage import SqliteStorage
+
+    data_dir.mkdir(parents=True, exist_ok=True)
+    for stale in data_dir.glob("store*"):
+        stale.unlink()
+
+    async def insert():
+        storage = SqliteStorage(data_dir / "store.sqlite3")
+        for name, docs in dataset.items():
+            await getattr(storage, name).insert_many(docs)
+        await storage.close()
+
+    asyncio.run(insert())
+
+
+def seed_mongo(mongo_url: str, db_name: str, dataset: Dict[str, List[Dict[str, Any]]]):
+    from pymongo import MongoClient
+    from migrate_to_mongo import convert_product
+    from storage import upgrade_order
+
+    client = MongoClient(mongo_url)
+    db = client[db_name]
+    converters = {"products": convert_product, "orders": upgrade_order}
+    for name in ("categories", "products", "customers", "orders", "admins", "contact_messages", "stock_reservations"):
+        db[name].delete_many({})
+        docs = [converters.get(name, dict)(doc) for doc in dataset.get(name, [])]
+        for start in range(0, len(docs), 1000):
+            db[name].insert_many(docs[start:start + 1000], ordered=False)
+    client.close()
+
+
+# ============== CLIENTS ==============
+
+class InProcessClient:
+    """Drives the ASGI app directly, running its lifespan"""
+
+    def __init__(self, app):
+        self.app = app
+        self._lifespan = None
+
+    async def __aenter__(self):
+        self._lifespan = self.app.router.lifespan_context(self.app)
+        await self._lifespan.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._lifespan.__aexit__(*exc)
+
+    async def request(self, method: str, path: str, headers: Optional[Dict[str, str]] = None,
+                      payload: Any = None) -> Tuple[int, bytes]:
+        headers = dict(headers or {})
+        body = b""
+        if payload is not None:
+            body = json.dumps(payload).encode("utf-8")
+            headers["content-type"] = "application/json"
+        status, _, content = await asgi_request(self.app, method, path, headers, body)
+        return status, content
+
+
+class HttpClient:
+    """Sends requests to a running server over keep-alive connections"""
+
+    def __init__(self, base_url: str, concurrency: int):
+        if httpx is None:
+            sys.exit("--url needs httpx (pip install httpx)")
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        self._client = httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._client.aclose()
+
+    async def request(self, method: str, path: str, headers: Optional[Dict[str, str]] = None,
+                      payload: Any = None) -> Tuple[int, bytes]:
+        response = await self._client.request(method, path, headers=headers, json=payload)
+        return response.status_code, response.content
+
+
+# ============== SCENARIOS ==============
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    async def call(self, client, label: str, method: str, path: str, expect: int = 200, **kwargs) -> Optional[bytes]:
+        start = time.perf_counter()
+        try:
+            status, body = await client.request(method, path, **kwargs)
+        except Exception:
+            status, body = 0, b""
+        self.latencies.setdefault(label, []).append(time.perf_counter() - start)
+        if status != expect:
+            self.errors[label] = self.errors.get(label, 0) + 1
+            return None
+        return body
+
+
+class Workload:
+    def __init__(self, client, dataset: Dict[str, List[Dict[str, Any]]], admin_token: str, rng: random.Random):
+        self.client = client
+        self.admin = {"Authorization": f"Bearer {admin_token}"}
+        self.categories = [c["id"] for c in dataset["categories"]]
+        self.products = [p for p in dataset["products"] if p.get("active", True)]
+        self.order_ids = [o["id"] for o in dataset["orders"]]
+        self.rng = rng
+
+    async def browse(self, rec: Recorder):
+        lang = self.rng.choice(("pt", "en"))
+        await rec.call(self.client, "GET /api/categories", "GET", f"/api/categories?lang={lang}")
+        await rec.call(self.client, "GET /api/products?category_id", "GET",
+                       f"/api/products?category_id={self.rng.choice(self.categories)}&lang={lang}")
+        await rec.call(self.client, "GET /api/products/{id}", "GET",
+                       f"/api/products/{self.rng.choice(self.products)['id']}?lang={lang}")
+
+    async def checkout(self, rec: Recorder):
+        product = self.rng.choice(self.products)
+        await rec.call(self.client, "GET /api/products/{id}", "GET", f"/api/products/{product['id']}")
+        n = self.rng.randint(1, 9999)
+        await rec.call(self.client, "POST /api/orders", "POST", "/api/orders", payload={
+            "customer_name": f"Cliente {n}",
+            "customer_email": f"loadtest{n}@example.com",
+            "customer_phone": "910000000",
+            "shipping_address": "Rua Exemplo 1, Lisboa",
+            "payment_method": "transfer",
+            "payment_details": {},
+            "items": [{"product_id": product["id"], "quantity": 1}],
+            "total_amount": product["base_price"]
+        })
+
+    async def admin_dashboard(self, rec: Recorder):
+        for path in ("/api/stats", "/api/orders", "/api/products/all", "/api/contact"):
+            await rec.call(self.client, f"GET {path}", "GET", path, headers=self.admin)
+
+    async def status(self, rec: Recorder):
+        order_id = self.rng.choice(self.order_ids)
+        status = self.rng.choice(STATUS_FLOW)
+        await rec.call(self.client, "PUT /api/orders/{id}/status", "PUT",
+                       f"/api/orders/{order_id}/status?status={status}", headers=self.admin)
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0
+    }
+
+
+async def run_scenario(workload: Workload, name: str, concurrency: int, duration: float,
+                       iterations: Optional[int]) -> Dict[str, Any]:
+    step = {"browse": workload.browse, "checkout": workload.checkout,
+            "admin": workload.admin_dashboard, "status": workload.status}[name]
+    rec = Recorder()
+    iteration_latencies: List[float] = []
+    remaining = [iterations] if iterations else None
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while True:
+            if remaining is not None:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            elif time.perf_counter() >= deadline:
+                return
+            start = time.perf_counter()
+            await step(rec)
+            iteration_latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    total_requests = sum(len(v) for v in rec.latencies.values())
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "iterations": len(iteration_latencies),
+        "requests": total_requests,
+        "errors": sum(rec.errors.values()),
+        "throughput_rps": round(total_requests / elapsed, 2) if elapsed else 0.0,
+        "iteration_latency": summarize(iteration_latencies),
+        "endpoints": {label: {**summarize(values), "errors": rec.errors.get(label, 0)}
+                      for label, values in sorted(rec.latencies.items())}
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run(args, dataset):
+    if args.url:
+        client = HttpClient(args.url, args.concurrency)
+    else:
+        # STORAGE_BACKEND is set by main() before the import
+        import server
+        client = InProcessClient(server.app)
+
+    results = {}
+    async with client:
+        status, body = await client.request("POST", "/api/admin/login",
+                                            payload={"email": ADMIN_EMAIL, "password": PASSWORD})
+        if status != 200:
+            sys.exit(f"Admin login failed ({status}): {body[:200]!r}")
+        workload = Workload(client, dataset, json.loads(body)["access_token"], random.Random(args.seed))
+
+        if args.warmup:
+            for name in args.scenarios:
+                await run_scenario(workload, name, args.concurrency, 0, args.warmup)
+        for name in args.scenarios:
+            results[name] = await run_scenario(workload, name, args.concurrency, args.duration, args.iterations)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("json", "sqlite", "mongo"), default="json")
+    parser.add_argument("--url", help="target a running server instead of the in-process app")
+    parser.add_argument("--data-dir", help="JSON/SQLite backend data directory (default: a fresh temp dir)")
+    parser.add_argument("--mongo-url", default=os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--mongo-db", default="pulgax_loadtest")
+    parser.add_argument("--no-seed", action="store_true", help="reuse data already seeded by a previous run")
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--customers", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--iterations", type=int, help="fixed iterations per scenario instead of --duration")
+    parser.add_argument("--warmup", type=int, default=20, help="iterations per scenario before measuring")
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="keep the in-process app's rate limits (a remote server uses its own settings)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--json", action="store_true", help="print the JSON report instead of a table")
+    args = parser.parse_args()
+
+    dataset = build_dataset(args.products, args.customers, args.orders, args.seed)
+
+    if not args.rate_limit:
+        # Every in-process request comes from one client IP. Set before seeding, which imports server modules
+        os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+    if args.backend in ("json", "sqlite"):
+        data_dir = Path(args.data_dir).resolve() if args.data_dir else Path(tempfile.mkdtemp(prefix="pulgax-load-")) / "data"
+        if not args.no_seed:
+            (seed_json if args.backend == "json" else seed_sqlite)(data_dir, dataset)
+        os.environ["DATA_DIR"] = str(data_dir)
+    else:
+        if not args.no_seed:
+            seed_mongo(args.mongo_url, args.mongo_db, dataset)
+        os.environ["MONGO_URL"] = args.mongo_url
+        os.environ.pop("MONGODB_URI", None)
+        os.environ["DB_NAME"] = args.mongo_db
+    os.environ["STORAGE_BACKEND"] = args.backend
+
+    results = asyncio.run(run(args, dataset))
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "backend": args.backend,
+        "target": args.url or "in-process",
+        "dataset": {"products": args.products, "customers": args.customers, "orders": args.orders, "seed": args.seed},
+        "concurrency": args.concurrency,
+        "scenarios": results
+    }
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{report['backend']} backend, {report['target']}, commit {report['commit']}, concurrency {args.concurrency}")
+    for name, result in results.items():
+        it = result["iteration_latency"]
+        print(f"\n{name}: {result['throughput_rps']:.1f} req/s, {result['iterations']} iterations, "
+              f"{result['errors']} errors (p50 {it['p50_ms']:.1f} / p95 {it['p95_ms']:.1f} / p99 {it['p99_ms']:.1f} ms)")
+        for label, stats in result["endpoints"].items():
+            print(f"  {label:<32} p50 {stats['p50_ms']:8.2f}  p95 {stats['p95_ms']:8.2f}  "
+                  f"p99 {stats['p99_ms']:8.2f} ms  n={stats['count']}  errors={stats['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Language-specific catalog projections.
+
+Catalog documents carry every language side by side (``name_pt``/``name_en``,
+``description_pt``/``description_en``, and the same suffixes inside colors and
+customization options). A storefront only shows one language, so a
+projection keeps the requested language's fields and drops the others,
+roughly halving the payload. Keys keep their suffix, so clients read
+``name_pt`` exactly as they do from the full document.
+
+Projections are opt-in with ``lang=pt|en``, or ``lang=auto`` to negotiate from
+``Accept-Language``. Browsers always send that header, so honouring it
+implicitly would strip fields from existing bilingual clients.
+"""
+from typing import Any, Dict, List, Optional
+
+SUPPORTED_LANGUAGES = ("pt", "en")
+DEFAULT_LANGUAGE = "pt"
+
+
+def resolve_language(lang: Optional[str], accept_language: Optional[str] = None) -> Optional[str]:
+    """Requested projection language, or None for the full bilingual document"""
+    if not lang:
+        return None
+    lang = lang.lower()
+    if lang in SUPPORTED_LANGUAGES:
+        return lang
+    if lang != "auto":
+        return None
+
+    best, best_q = DEFAULT_LANGUAGE, -1.0
+    for part in (accept_language or "").split(","):
+        tag, _, params = part.strip().partition(";")
+        primary = tag.strip().lower().split("-")[0]
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if primary in SUPPORTED_LANGUAGES and q > best_q:
+            best, best_q = primary, q
+    return best
+
+
+def _dropped_suffixes(lang: str):
+    return tuple(f"_{other}" for other in SUPPORTED_LANGUAGES if other != lang)
+
+
+def _localize(value: Any, drop) -> Any:
+    if isinstance(value, dict):
+        return {k: _localize(v, drop) for k, v in value.items() if not k.endswith(drop)}
+    if isinstance(value, list):
+        return [_localize(v, drop) for v in value]
+    return value
+
+
+def localize(doc: Dict[str, Any], lang: str) -> Dict[str, Any]:
+    """Copy of ``doc`` without the other languages' fields"""
+    return _localize(doc, _dropped_suffixes(lang))
+
+
+def localized_views(doc: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Every language's projection of a document, computed once at write time"""
+    return {lang: localize(doc, lang) for lang in SUPPORTED_LANGUAGES}
+
+
+def language_fields(lang: str) -> List[str]:
+    """Fields to read for a product in one language: its stored view and the live stock"""
+    return ["id", f"views.{lang}", "stock", "variant_stock"]
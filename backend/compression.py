@@ -0,0 +1,237 @@
+"""
+Response compression with precompressed catalog payloads.
+
+``CompressionMiddleware`` negotiates brotli (when the ``brotli`` package is
+installed) or gzip from ``Accept-Encoding`` and compresses responses above a
+size threshold. Responses that already carry ``Content-Encoding`` pass
+through untouched.
+
+``CatalogCache`` stores serialized catalog responses per catalog version,
+together with their compressed variants keyed by ETag and encoding, so the
+compression CPU is paid once per catalog version instead of per request.
+"""
+import gzip
+import hashlib
+import inspect
+import os
+import time
+import zlib
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Union
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+# Catalog entries are rebuilt after this many seconds even without a local write,
+# which bounds staleness when several workers share one database
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "30"))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+SKIP_TYPES = ("text/event-stream",)
+
+
+def supported_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Best supported encoding for an Accept-Encoding header, honouring q=0"""
+    if not accept_encoding:
+        return None
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in supported_encodings():
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class _StreamCompressor:
+    """Incremental compressor for streamed bodies"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses above ``minimum_size`` bytes"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        encoding = negotiate_encoding(headers.get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                response_headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in message.get("headers", [])}
+                content_type = response_headers.get("content-type", "")
+                passthrough = (
+                    "content-encoding" in response_headers
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                    or content_type.startswith(SKIP_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None and not more_body:
+                # Whole body in one message
+                if len(body) < self.minimum_size:
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressed = compress(body, encoding)
+                await send(self._start(start_message, encoding, len(compressed)))
+                await send({"type": "http.response.body", "body": compressed, "more_body": False})
+                return
+
+            if compressor is None:
+                compressor = _StreamCompressor(encoding)
+                await send(self._start(start_message, encoding, None))
+            data = compressor.chunk(body)
+            if not more_body:
+                data += compressor.finish()
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _start(message, encoding: str, length: Optional[int]):
+        headers, vary = [], []
+        for k, v in message.get("headers", []):
+            if k.lower() == b"vary":
+                # Keep what the app (and CORS, with Origin) already varies on
+                vary += [token.strip() for token in v.split(b",") if token.strip()]
+            elif k.lower() != b"content-length":
+                headers.append((k, v))
+        if not any(token.lower() in (b"accept-encoding", b"*") for token in vary):
+            vary.append(b"Accept-Encoding")
+        headers.append((b"content-encoding", encoding.encode()))
+        headers.append((b"vary", b", ".join(vary)))
+        if length is not None:
+            headers.append((b"content-length", str(length).encode()))
+        return {**message, "headers": headers}
+
+
+class CatalogCache:
+    """Serialized catalog responses and their compressed variants, per catalog version"""
+
+    def __init__(self, ttl: float = CATALOG_CACHE_TTL, minimum_size: int = COMPRESSION_MIN_SIZE, max_entries: int = 512):
+        self.ttl = ttl
+        self.minimum_size = minimum_size
+        self.max_entries = max_entries
+        self.version = 0
+        self._entries: Dict[Hashable, Dict[str, Any]] = {}
+
+    def invalidate(self):
+        """Start a new catalog version after any catalog write"""
+        self.version += 1
+        self._entries.clear()
+
+    async def _entry(self, key: Hashable, build: Callable[[], Union[bytes, Awaitable[bytes]]]) -> Dict[str, Any]:
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry["built_at"] < self.ttl:
+            return entry
+
+        version = self.version
+        body = build()
+        if inspect.isawaitable(body):
+            body = await body
+        entry = {
+            "etag": '"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest(),
+            "body": body,
+            "encoded": {},
+            "built_at": time.monotonic()
+        }
+        # Don't keep a payload built across an invalidation
+        if version == self.version:
+            if len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = entry
+        return entry
+
+    async def respond(self, request: Request, key: Hashable,
+                      build: Callable[[], Union[bytes, Awaitable[bytes]]],
+                      media_type: str = "application/json", vary: str = "Accept-Encoding") -> Response:
+        """Serve ``key`` from the cache, building it with ``build`` (returning bytes) when missing"""
+        entry = await self._entry(key, build)
+        etag = entry["etag"]
+        headers = {"ETag": etag, "Vary": vary, "Cache-Control": "no-cache"}
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if "*" in tags or etag in tags or any(tag.startswith(etag[:-1] + "-") for tag in tags):
+                return Response(status_code=304, headers=headers)
+
+        body = entry["body"]
+        encoding = negotiate_encoding(request.headers.get("accept-encoding")) if len(body) >= self.minimum_size else None
+        if encoding:
+            encoded = entry["encoded"].get(encoding)
+            if encoded is None:
+                encoded = entry["encoded"][encoding] = compress(body, encoding)
+            body = encoded
+            headers["Content-Encoding"] = encoding
+            headers["ETag"] = f'{etag[:-1]}-{encoding}"'
+
+        return Response(content=body, media_type=media_type, headers=headers)
@@ -0,0 +1,144 @@
+"""
+Contact message inbox: filtered, searchable, cursor-paginated listing and archival of old read messages.
+
+The inbox is ``storage.messages``, indexed by ``(read, created_at, id)`` and
+``(created_at, id)`` so the unread (or read, or all) messages come newest
+first, ties broken by id, straight from the index. Pages
+are cut with a cursor, the ``(created_at, id)`` of the last message shown,
+rather than an offset, so a page costs the same however deep it is and
+messages arriving meanwhile don't shift it. Search matches every word of the
+query, case-insensitively, in the subject or in the message.
+
+Read messages older than ``CONTACT_ARCHIVE_DAYS`` are moved out of the inbox
+into ``storage.message_archive``, as gzip-compressed segments of up to
+``MESSAGE_ARCHIVE_SEGMENT_SIZE`` messages, so the inbox holds only the recent
+and unread ones. Segments are dropped once their newest message is older than
+``CONTACT_RETENTION_DAYS``.
+"""
+import base64
+import gzip
+import hashlib
+import re
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from serialization import dumps, loads
+from storage import matches
+
+MESSAGE_ARCHIVE_SEGMENT_SIZE = 1000
+MESSAGE_ARCHIVE_ENCODING = "gzip+json"
+
+INBOX_SORT = [("created_at", -1), ("id", -1)]
+
+
+def search_query(q: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Messages with every word of ``q`` in their subject or in their message; None for an empty search"""
+    terms = (q or "").split()
+    if not terms:
+        return None
+    # One lookahead per word: all of them, in any order
+    pattern = "".join(f"(?=[\\s\\S]*{re.escape(term)})" for term in terms)
+    condition = {"$regex": pattern, "$options": "i"}
+    return {"$or": [{"subject": condition}, {"message": condition}]}
+
+
+def encode_cursor(message: Dict[str, Any]) -> str:
+    """The cursor for the page after ``message``"""
+    raw = dumps([message["created_at"], message["id"]])
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def cursor_query(cursor: str) -> Dict[str, Any]:
+    """Messages after ``cursor`` in inbox order; raises ValueError for a malformed cursor"""
+    try:
+        created_at, message_id = loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(created_at, str) or not isinstance(message_id, str):
+        raise ValueError("Invalid cursor")
+    return {"$or": [{"created_at": {"$lt": created_at}},
+                    {"created_at": created_at, "id": {"$lt": message_id}}]}
+
+
+def inbox_query(status: str = "all", q: Optional[str] = None,
+                cursor: Optional[str] = None) -> Dict[str, Any]:
+    """The messages query for an inbox page: ``status`` is all, read or unread"""
+    query: Dict[str, Any] = {}
+    if status != "all":
+        query["read"] = status == "read"
+    clauses = [clause for clause in (search_query(q), cursor_query(cursor) if cursor else None) if clause]
+    if len(clauses) == 1:
+        query.update(clauses[0])
+    elif clauses:
+        query["$and"] = clauses
+    return query
+
+
+async def inbox_page(messages, status: str = "all", q: Optional[str] = None, cursor: Optional[str] = None,
+                     limit: int = 50) -> Dict[str, Any]:
+    """One page of the inbox, newest first, and the cursor of the next one (None on the last page)"""
+    docs = await messages.find(inbox_query(status, q, cursor), sort=INBOX_SORT, limit=limit + 1)
+    page = docs[:limit]
+    return {"messages": page, "next_cursor": encode_cursor(page[-1]) if len(docs) > limit else None}
+
+
+# ============== ARCHIVE ==============
+
+def pack_segment(docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """An archive segment holding ``docs``, oldest first
+
+    The id is derived from the messages it holds, so archiving them again
+    after an interrupted run finds the segment instead of writing a second one.
+    """
+    docs = sorted(docs, key=lambda doc: (doc["created_at"], doc["id"]))
+    ids = "\n".join(doc["id"] for doc in docs)
+    data = gzip.compress(b"\n".join(dumps(doc) for doc in docs), compresslevel=9, mtime=0)
+    return {
+        "id": str(uuid.UUID(hashlib.sha256(ids.encode("utf-8")).hexdigest()[:32])),
+        "archived_at": datetime.now(timezone.utc).isoformat(),
+        "first_created_at": docs[0]["created_at"],
+        "last_created_at": docs[-1]["created_at"],
+        "count": len(docs),
+        "encoding": MESSAGE_ARCHIVE_ENCODING,
+        "size": len(data),
+        "data": base64.b64encode(data).decode("ascii")
+    }
+
+
+def unpack_segment(segment: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The messages of an archive segment, oldest first"""
+    if segment.get("encoding") != MESSAGE_ARCHIVE_ENCODING:
+        raise ValueError(f"Unknown archive encoding: {segment.get('encoding')}")
+    raw = gzip.decompress(base64.b64decode(segment["data"]))
+    return [loads(line) for line in raw.split(b"\n") if line]
+
+
+def search_segment(segment: Dict[str, Any], q: Optional[str] = None) -> List[Dict[str, Any]]:
+    """The messages of an archive segment matching the search ``q``, newest first"""
+    query = search_query(q)
+    return [doc for doc in reversed(unpack_segment(segment)) if matches(doc, query)]
+
+
+async def archive_messages(messages, archive, before: str,
+                           segment_size: int = MESSAGE_ARCHIVE_SEGMENT_SIZE) -> int:
+    """Move read messages created before ``before`` into archive segments; returns how many moved"""
+    moved = 0
+    while True:
+        docs = await messages.find({"read": True, "created_at": {"$lt": before}},
+                                   sort=[("created_at", 1), ("id", 1)], limit=segment_size)
+        if not docs:
+            return moved
+        segment = pack_segment(docs)
+        # The segment is written before the messages leave the inbox, so a crash loses nothing
+        if await archive.get(segment["id"], fields=["id"]) is None:
+            await archive.insert(segment)
+        await messages.delete_many({"id": {"$in": [doc["id"] for doc in docs]}})
+        moved += len(docs)
+        if len(docs) < segment_size:
+            return moved
+
+
+async def drop_archive_segments(archive, before: str) -> int:
+    """Delete the segments whose newest message was created before ``before``"""
+    return await archive.delete_many({"last_created_at": {"$lt": before}})
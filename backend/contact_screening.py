@@ -0,0 +1,196 @@
+"""
+Duplicate and flood screening for the public contact form.
+
+Every submission is checked by ``ContactScreen`` before it is stored:
+
+- Near-duplicates: the subject and message get a MinHash fingerprint of
+  their words and word pairs (numbers folded together). A message whose
+  estimated Jaccard similarity to one received in the last
+  ``CONTACT_DUPLICATE_HOURS`` reaches ``CONTACT_DUPLICATE_SIMILARITY`` is a
+  duplicate, however it was re-cased, re-punctuated or lightly reworded.
+  Fingerprints are indexed by ``FINGERPRINT_BANDS`` bands (locality-sensitive
+  hashing), so a lookup only compares the messages sharing a band with the
+  submission; at the default threshold a duplicate shares one ~99% of the time.
+- Submission windows: more than ``CONTACT_SUBMISSION_LIMITS`` submissions
+  from one email (the account) or one IP are flagged; the default
+  ``"ip=5/3600,account=3/3600"`` is parsed like the ``RATE_LIMIT_*`` rules.
+
+Flagged submissions go to the quarantine collection instead of the inbox,
+with the reasons; the sender sees the usual response. The index holds the
+recent submissions of both collections, and each check first reads what was
+stored since the last one, so it sees what other workers accepted too.
+"""
+import bisect
+import hashlib
+import os
+import random
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from rate_limit import Limit, parse_limits
+from storage import unique_key
+
+CONTACT_DUPLICATE_HOURS = float(os.getenv("CONTACT_DUPLICATE_HOURS", "24"))
+CONTACT_DUPLICATE_SIMILARITY = float(os.getenv("CONTACT_DUPLICATE_SIMILARITY", "0.7"))
+CONTACT_SUBMISSION_LIMITS = parse_limits(os.getenv("CONTACT_SUBMISSION_LIMITS", "ip=5/3600,account=3/3600"))
+# Messages shorter than this (in words) are too generic to call duplicates
+CONTACT_FINGERPRINT_MIN_WORDS = 5
+# Each check rereads this far behind the last submission it saw, for writes other workers timestamped earlier
+CONTACT_SCREEN_OVERLAP_SECONDS = 5.0
+
+FINGERPRINT_HASHES = 64
+FINGERPRINT_BANDS = 16
+# Hex digits per hash, and per band of the fingerprint string
+_HASH_DIGITS = 8
+_BAND_DIGITS = _HASH_DIGITS * FINGERPRINT_HASHES // FINGERPRINT_BANDS
+_PRIME = (1 << 61) - 1
+# Seeded, so fingerprints stored by any worker (or before a restart) compare
+_seeded = random.Random(2024)
+_PERMUTATIONS = [(_seeded.randrange(1, _PRIME), _seeded.randrange(_PRIME)) for _ in range(FINGERPRINT_HASHES)]
+_WORD = re.compile(r"\w+", re.UNICODE)
+# The submission field each limit's principal is read from, and the reason it flags
+_PRINCIPALS = {"ip": ("ip", "ip_limit"), "account": ("email", "email_limit")}
+
+
+def _features(text: str) -> Set[str]:
+    # Bots vary order numbers, quantities and phone numbers between copies
+    words = ["0" if any(ch.isdigit() for ch in word) else word for word in _WORD.findall(text.lower())]
+    if len(words) < CONTACT_FINGERPRINT_MIN_WORDS:
+        return set()
+    # Word pairs keep some word order, single words some tolerance to edits
+    return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+def fingerprint(subject: str, message: str) -> Optional[str]:
+    """MinHash signature of a message as hex digits; None when it's too short to compare"""
+    features = _features(f"{subject}\n{message}")
+    if not features:
+        return None
+    hashes = [int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+              for feature in features]
+    return "".join(f"{min((a * value + b) % _PRIME for value in hashes) & 0xFFFFFFFF:08x}"
+                   for a, b in _PERMUTATIONS)
+
+
+def similarity(first: str, second: str) -> float:
+    """Estimated Jaccard similarity of the messages two fingerprints came from"""
+    same = sum(first[i:i + _HASH_DIGITS] == second[i:i + _HASH_DIGITS]
+               for i in range(0, len(first), _HASH_DIGITS))
+    return same / FINGERPRINT_HASHES
+
+
+def _bands(signature: str) -> List[Tuple[int, str]]:
+    return [(band, signature[band * _BAND_DIGITS:(band + 1) * _BAND_DIGITS]) for band in range(FINGERPRINT_BANDS)]
+
+
+def _principal(doc: Dict[str, Any], kind: str) -> Optional[str]:
+    field = _PRINCIPALS[kind][0]
+    value = doc.get(field)
+    if not isinstance(value, str) or not value:
+        return None
+    return unique_key(value) if field == "email" else value
+
+
+class ContactScreen:
+    """Recent submissions of ``collections``, indexed by fingerprint band, email and IP"""
+
+    def __init__(self, collections, duplicate_hours: float = CONTACT_DUPLICATE_HOURS,
+                 threshold: float = CONTACT_DUPLICATE_SIMILARITY, limits: List[Limit] = CONTACT_SUBMISSION_LIMITS):
+        self.collections = list(collections)
+        self.duplicate_window = timedelta(hours=duplicate_hours)
+        self.threshold = threshold
+        self.limits = limits
+        self.horizon = max([self.duplicate_window] + [timedelta(seconds=limit.period) for limit in limits])
+        # (created_at, id) of every indexed submission, oldest first
+        self._recent: List[Tuple[str, str]] = []
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._buckets: Dict[Tuple[int, str], Set[str]] = {}
+        self._times: Dict[Tuple[str, str], List[str]] = {}
+        self._cursors: Dict[str, datetime] = {}
+
+    def _add(self, doc: Dict[str, Any]):
+        if doc["id"] in self._entries:
+            return
+        entry = {key: doc.get(key) for key in ("id", "created_at", "fingerprint", "email", "ip")}
+        self._entries[doc["id"]] = entry
+        bisect.insort(self._recent, (entry["created_at"], entry["id"]))
+        if entry["fingerprint"]:
+            for band in _bands(entry["fingerprint"]):
+                self._buckets.setdefault(band, set()).add(entry["id"])
+        for limit in self.limits:
+            principal = _principal(entry, limit.principal)
+            if principal is not None:
+                bisect.insort(self._times.setdefault((limit.principal, principal), []), entry["created_at"])
+
+    def _evict(self, before: str):
+        while self._recent and self._recent[0][0] < before:
+            _, doc_id = self._recent.pop(0)
+            entry = self._entries.pop(doc_id)
+            if entry["fingerprint"]:
+                for band in _bands(entry["fingerprint"]):
+                    bucket = self._buckets.get(band)
+                    bucket.discard(doc_id)
+                    if not bucket:
+                        del self._buckets[band]
+            for limit in self.limits:
+                key = (limit.principal, _principal(entry, limit.principal))
+                times = self._times.get(key)
+                if times:
+                    times.pop(0)
+                    if not times:
+                        del self._times[key]
+
+    async def _refresh(self, now: datetime):
+        """Index what was stored since the last check, and forget what fell out of the horizon"""
+        horizon = now - self.horizon
+        for collection in self.collections:
+            since = max(self._cursors.get(collection.name, horizon), horizon)
+            docs = await collection.find({"created_at": {"$gte": since.isoformat()}}, sort=[("created_at", 1)],
+                                         fields=["id", "created_at", "fingerprint", "email", "ip"])
+            for doc in docs:
+                self._add(doc)
+            if docs:
+                latest = datetime.fromisoformat(docs[-1]["created_at"])
+                self._cursors[collection.name] = latest - timedelta(seconds=CONTACT_SCREEN_OVERLAP_SECONDS)
+        self._evict(horizon.isoformat())
+
+    def _duplicate_of(self, signature: str, since: str) -> Optional[str]:
+        candidates = set()
+        for band in _bands(signature):
+            candidates |= self._buckets.get(band, set())
+        for doc_id in candidates:
+            entry = self._entries[doc_id]
+            if entry["created_at"] < since:
+                continue
+            if similarity(signature, entry["fingerprint"]) >= self.threshold:
+                return doc_id
+        return None
+
+    async def screen(self, doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Fingerprint a new submission and check it; returns why it should be quarantined, or None
+
+        Sets ``doc["fingerprint"]``. The submission counts toward later checks
+        whether or not it is flagged.
+        """
+        now = datetime.fromisoformat(doc["created_at"])
+        doc["fingerprint"] = fingerprint(doc.get("subject", ""), doc.get("message", ""))
+        await self._refresh(now)
+        reasons, verdict = [], {}
+        if doc["fingerprint"]:
+            duplicate_of = self._duplicate_of(doc["fingerprint"], (now - self.duplicate_window).isoformat())
+            if duplicate_of:
+                reasons.append("duplicate")
+                verdict["duplicate_of"] = duplicate_of
+        for limit in self.limits:
+            principal = _principal(doc, limit.principal)
+            if principal is None:
+                continue
+            times = self._times.get((limit.principal, principal), [])
+            recent = len(times) - bisect.bisect_left(times, (now - timedelta(seconds=limit.period)).isoformat())
+            if recent >= limit.limit:
+                reasons.append(_PRINCIPALS[limit.principal][1])
+        self._add(doc)
+        if not reasons:
+            return None
+        return {"reasons": reasons, **verdict, "at": doc["created_at"]}
@@ -1,13 +1,16 @@
 """
 Email service for sending order notifications
+
+smtplib, the MIME classes and jinja2 are imported by the functions using
+them, so importing this module doesn't slow the app's startup.
 """
-import smtplib
 import os
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from jinja2 import Template
+import threading
+from collections import deque
 from typing import Dict, Any
 import logging
+from metrics import emails_total
+from profiling import traced
 
 # Email configuration
 SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
@@ -16,11 +19,21 @@ SMTP_USERNAME = os.getenv("SMTP_USERNAME", "")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
 FROM_EMAIL = os.getenv("FROM_EMAIL", "noreply@pulgax3d.com")
 FROM_NAME = os.getenv("FROM_NAME", "Pulgax 3D Store")
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+
+# Emails that failed to send, retried by the email retry job. Kept in memory,
+# so each worker retries its own and the queue does not survive a restart.
+failed_emails = deque(maxlen=int(os.getenv("EMAIL_RETRY_QUEUE_SIZE", "500")))
+_retry_lock = threading.Lock()
 
 logger = logging.getLogger(__name__)
 
-def send_email(to_email: str, subject: str, html_content: str, text_content: str = None):
+def _deliver(to_email: str, subject: str, html_content: str, text_content: str = None):
     """Send email using SMTP"""
+    import smtplib
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+
     try:
         # Create message
         msg = MIMEMultipart('alternative')
@@ -45,21 +58,66 @@ def send_email(to_email: str, subject: str, html_content: str, text_content: str
             server.send_message(msg)
             server.quit()
             logger.info(f"Email sent successfully to {to_email}")
+            emails_total.inc(result="sent")
             return True
         else:
             # For development - just log the email
             logger.info(f"EMAIL WOULD BE SENT TO: {to_email}")
             logger.info(f"SUBJECT: {subject}")
             logger.info(f"CONTENT: {html_content}")
+            emails_total.inc(result="sent")
             return True
             
     except Exception as e:
         logger.error(f"Failed to send email to {to_email}: {str(e)}")
+        emails_total.inc(result="failed")
         return False
 
+def send_email(to_email: str, subject: str, html_content: str, text_content: str = None):
+    """Send email, queueing it for retry if sending fails"""
+    if _deliver(to_email, subject, html_content, text_content):
+        return True
+    failed_emails.append({
+        "to_email": to_email,
+        "subject": subject,
+        "html_content": html_content,
+        "text_content": text_content,
+        "attempts": 1
+    })
+    return False
+
+def retry_failed_emails() -> Dict[str, int]:
+    """Resend queued emails, requeueing failures until EMAIL_MAX_ATTEMPTS
+
+    Runs in a worker thread. A run that timed out keeps going in its thread,
+    so a run that starts meanwhile returns at once instead of racing it.
+    """
+    result = {"sent": 0, "requeued": 0, "dropped": 0}
+    if not _retry_lock.acquire(blocking=False):
+        return result
+    try:
+        _retry_queued(result)
+    finally:
+        _retry_lock.release()
+    return result
+
+def _retry_queued(result: Dict[str, int]):
+    for _ in range(len(failed_emails)):
+        email = failed_emails.popleft()
+        if _deliver(email["to_email"], email["subject"], email["html_content"], email["text_content"]):
+            result["sent"] += 1
+        elif email["attempts"] + 1 < EMAIL_MAX_ATTEMPTS:
+            failed_emails.append({**email, "attempts": email["attempts"] + 1})
+            result["requeued"] += 1
+        else:
+            logger.error(f"Giving up on email to {email['to_email']} after {EMAIL_MAX_ATTEMPTS} attempts")
+            result["dropped"] += 1
+
+@traced("email")
 def send_order_status_email(order: Dict[str, Any], new_status: str, note: str = ""):
     """Send order status update email"""
-    
+    from jinja2 import Template
+
     status_messages = {
         'confirmed': {
             'subject': 'Encomenda Confirmada - #{order_number}',
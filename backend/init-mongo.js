@@ -3,13 +3,20 @@ db = db.getSiblingDB('pulgax_3d_store');
 
 // Create collections
 db.createCollection('admins');
+db.createCollection('customers');
 db.createCollection('categories');
 db.createCollection('products');
 db.createCollection('orders');
 db.createCollection('contact_messages');
+db.createCollection('stock_reservations');
+db.createCollection('rate_limits');
+db.createCollection('refresh_tokens');
+db.createCollection('locks');
 
 // Create indexes for better performance
-db.admins.createIndex({ "email": 1 }, { unique: true });
+// Emails are unique and looked up case-insensitively; the API builds the same indexes at startup
+db.admins.createIndex({ "email": 1 }, { unique: true, collation: { locale: "en", strength: 2 } });
+db.customers.createIndex({ "email": 1 }, { unique: true, collation: { locale: "en", strength: 2 } });
 db.categories.createIndex({ "name_pt": 1 });
 db.categories.createIndex({ "name_en": 1 });
 db.products.createIndex({ "category_id": 1 });
@@ -17,8 +24,14 @@ db.products.createIndex({ "featured": 1 });
 db.products.createIndex({ "active": 1 });
 db.orders.createIndex({ "status": 1 });
 db.orders.createIndex({ "created_at": -1 });
-db.contact_messages.createIndex({ "read": 1 });
-db.contact_messages.createIndex({ "created_at": -1 });
+// The inbox pages newest first with the id as tiebreaker, filtered by read or not
+db.contact_messages.createIndex({ "read": 1, "created_at": -1, "id": -1 });
+db.contact_messages.createIndex({ "created_at": -1, "id": -1 });
+db.stock_reservations.createIndex({ "order_id": 1 }, { unique: true });
+db.stock_reservations.createIndex({ "status": 1, "expires_at": 1 });
+db.rate_limits.createIndex({ "expires_at": 1 }, { expireAfterSeconds: 0 });
+db.refresh_tokens.createIndex({ "expires_at": 1 }, { expireAfterSeconds: 0 });
+db.refresh_tokens.createIndex({ "subject": 1 });
 
 // Insert sample categories
 db.categories.insertMany([
@@ -0,0 +1,574 @@
+"""
+Stock reservation engine for limited filament colors and print slots.
+
+Products may carry a product-level ``stock`` count and per-variant counts in
+``variant_stock`` (keyed by ``variant_key(color, size)``). Products without
+either are untracked and never block a checkout.
+
+Two engines share the same reservation lifecycle:
+
+- ``JsonStockLedger`` keeps lock-striped counters in memory and persists every
+  change to an append-only journal next to the JSON data files.
+- ``MongoStockLedger`` decrements the product documents with an atomic
+  conditional ``$inc`` and records reservations in ``stock_reservations``.
+
+``AsyncStockLedger`` wraps the JSON engine in the Mongo engine's awaitable
+interface, so the API drives either one the same way.
+
+Lifecycle: ``reserve`` (held, expires) -> ``commit`` (paid, no expiry) ->
+``consume`` (delivered, forgotten). ``release`` returns the stock from either
+held or committed state and is idempotent.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, List, Dict, Any, Optional, Tuple
+
+RESERVATION_TTL_MINUTES = int(os.getenv("RESERVATION_TTL_MINUTES", "1440"))
+RESERVATION_SWEEP_SECONDS = int(os.getenv("RESERVATION_SWEEP_SECONDS", "60"))
+
+# Order status -> reservation action
+RELEASE_STATUSES = {"cancelled", "refunded"}
+COMMIT_STATUSES = {"confirmed", "processing", "shipped"}
+CONSUME_STATUSES = {"delivered"}
+
+
+class InsufficientStockError(Exception):
+    """Raised when a reservation cannot be satisfied"""
+
+    def __init__(self, product_id: str, variant: str, requested: int, available: int):
+        self.product_id = product_id
+        self.variant = variant
+        self.requested = requested
+        self.available = available
+        label = f"{product_id} ({variant})" if variant else product_id
+        super().__init__(f"Insufficient stock for product {label}: requested {requested}, available {available}")
+
+
+def variant_key(color: Optional[str], size: Optional[str]) -> str:
+    """Build the ``variant_stock`` key for a color/size combination"""
+    key = f"{color or ''}|{size or ''}"
+    # Keys are also used as Mongo field paths
+    return key.replace(".", "_").replace("$", "_")
+
+
+def reservation_lines(items: List[Dict[str, Any]]) -> List[Tuple[str, str, int]]:
+    """Turn validated order items into (product_id, variant, quantity) lines"""
+    lines: Dict[Tuple[str, str], int] = {}
+    for item in items:
+        key = (item["product_id"], variant_key(item.get("selected_color"), item.get("selected_size")))
+        lines[key] = lines.get(key, 0) + int(item.get("quantity", 1) or 1)
+    return [(product_id, variant, qty) for (product_id, variant), qty in lines.items()]
+
+
+def reservation_expiry(ttl_minutes: int = None) -> str:
+    ttl = RESERVATION_TTL_MINUTES if ttl_minutes is None else ttl_minutes
+    return (datetime.now(timezone.utc) + timedelta(minutes=ttl)).isoformat()
+
+
+def product_stock_counters(product: Dict[str, Any]) -> Dict[str, int]:
+    """Counters a product declares: '' for product-level stock, variant keys otherwise"""
+    counters = {}
+    if product.get("stock") is not None:
+        counters[""] = int(product["stock"])
+    for key, value in (product.get("variant_stock") or {}).items():
+        if value is not None:
+            counters[key] = int(value)
+    return counters
+
+
+# ============== JSON BACKEND ==============
+
+class JsonStockLedger:
+    """Lock-striped in-memory stock counters with journal persistence"""
+
+    def __init__(self, journal_path: Path, stripes: int = 64, on_change: Optional[Callable[[], None]] = None):
+        self.journal_path = Path(journal_path)
+        # Called after available counts change, e.g. to invalidate cached catalog payloads
+        self.on_change = on_change
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+        self._journal_lock = threading.Lock()
+        self._reservations_lock = threading.Lock()
+        self._counters: Dict[Tuple[str, str], int] = {}
+        # product_id -> tracked variants, so per-product lookups don't scan every counter
+        self._variants: Dict[str, set] = {}
+        self._reservations: Dict[str, Dict[str, Any]] = {}
+        self._journal = None
+
+    # ----- persistence -----
+
+    def load(self, products: List[Dict[str, Any]]):
+        """Seed counters from product documents and replay the journal"""
+        self._counters = {}
+        self._variants = {}
+        self._reservations = {}
+        for product in products:
+            for variant, value in product_stock_counters(product).items():
+                self._set_counter(product["id"], variant, value)
+
+        if self.journal_path.exists():
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        self._apply(json.loads(line))
+                    except (ValueError, KeyError):
+                        # A torn final line from a crash mid-write
+                        continue
+
+    def _apply(self, event: Dict[str, Any]):
+        op = event["op"]
+        if op == "set":
+            self._set_counter(event["product_id"], event["variant"], event["value"])
+        elif op == "unset":
+            self._unset_counter(event["product_id"], event["variant"])
+        elif op == "reserve":
+            for product_id, variant, qty in event["lines"]:
+                key = (product_id, variant)
+                if key in self._counters:
+                    self._counters[key] -= qty
+            self._reservations[event["order_id"]] = {
+                "lines": [tuple(line) for line in event["lines"]],
+                "status": "held",
+                "expires_at": event.get("expires_at"),
+            }
+        elif op == "release":
+            reservation = self._reservations.pop(event["order_id"], None)
+            if reservation:
+                for product_id, variant, qty in reservation["lines"]:
+                    key = (product_id, variant)
+                    if key in self._counters:
+                        self._counters[key] += qty
+        elif op == "commit":
+            reservation = self._reservations.get(event["order_id"])
+            if reservation:
+                reservation["status"] = "committed"
+                reservation["expires_at"] = None
+        elif op == "consume":
+            self._reservations.pop(event["order_id"], None)
+
+    def _append(self, event: Dict[str, Any]):
+        event["ts"] = datetime.now(timezone.utc).isoformat()
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        with self._journal_lock:
+            if self._journal is None:
+                self._journal = open(self.journal_path, 'a', encoding='utf-8')
+            self._journal.write(line)
+            self._journal.flush()
+
+    def compact(self):
+        """Rewrite the journal as current counters plus open reservations"""
+        with self._all_stripes(), self._journal_lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            now = datetime.now(timezone.utc).isoformat()
+            tmp_path = self.journal_path.with_suffix(".tmp")
+            with self._reservations_lock:
+                reservations = dict(self._reservations)
+            counters = dict(self._counters)
+            # Reserved quantities are replayed on top of the snapshot, so add them back
+            for reservation in reservations.values():
+                for product_id, variant, qty in reservation["lines"]:
+                    if (product_id, variant) in counters:
+                        counters[(product_id, variant)] += qty
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for (product_id, variant), value in counters.items():
+                    f.write(json.dumps({"op": "set", "product_id": product_id, "variant": variant,
+                                        "value": value, "ts": now}, ensure_ascii=False) + "\n")
+                for order_id, reservation in reservations.items():
+                    f.write(json.dumps({"op": "reserve", "order_id": order_id,
+                                        "lines": [list(line) for line in reservation["lines"]],
+                                        "expires_at": reservation["expires_at"], "ts": now},
+                                       ensure_ascii=False) + "\n")
+                    if reservation["status"] == "committed":
+                        f.write(json.dumps({"op": "commit", "order_id": order_id, "ts": now}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.journal_path)
+
+    def close(self):
+        with self._journal_lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    # ----- counters -----
+
+    def _stripe(self, key: Tuple[str, str]) -> int:
+        return hash(key) % len(self._stripes)
+
+    @contextmanager
+    def _locked_stripes(self, stripe_ids):
+        """Hold stripe locks, always taken in ascending order so callers cannot deadlock"""
+        stripe_ids = sorted(set(stripe_ids))
+        for stripe_id in stripe_ids:
+            self._stripes[stripe_id].acquire()
+        try:
+            yield
+        finally:
+            for stripe_id in reversed(stripe_ids):
+                self._stripes[stripe_id].release()
+
+    def _locked(self, keys):
+        return self._locked_stripes(self._stripe(key) for key in keys)
+
+    def _all_stripes(self):
+        return self._locked_stripes(range(len(self._stripes)))
+
+    def _resolve(self, product_id: str, variant: str) -> Optional[Tuple[str, str]]:
+        """Pick the counter a line draws from: the variant, else the product, else untracked"""
+        if (product_id, variant) in self._counters:
+            return (product_id, variant)
+        if (product_id, "") in self._counters:
+            return (product_id, "")
+        return None
+
+    def _set_counter(self, product_id: str, variant: str, value: int):
+        self._counters[(product_id, variant)] = value
+        self._variants.setdefault(product_id, set()).add(variant)
+
+    def _unset_counter(self, product_id: str, variant: str):
+        self._counters.pop((product_id, variant), None)
+        variants = self._variants.get(product_id)
+        if variants is not None:
+            variants.discard(variant)
+            if not variants:
+                del self._variants[product_id]
+
+    def available(self, product_id: str) -> Dict[str, int]:
+        """Current counters for a product, in the same shape as ``product_stock_counters``"""
+        return {variant: self._counters[(product_id, variant)]
+                for variant in list(self._variants.get(product_id, ()))
+                if (product_id, variant) in self._counters}
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Current counters for every tracked product in one pass"""
+        products: Dict[str, Dict[str, int]] = {}
+        for (product_id, variant), value in list(self._counters.items()):
+            products.setdefault(product_id, {})[variant] = value
+        return products
+
+    @staticmethod
+    def overlay(product: Dict[str, Any], counters: Dict[str, int]) -> Dict[str, Any]:
+        """Copy of a product document showing live availability instead of the configured stock"""
+        if not counters:
+            return product
+        product = dict(product)
+        if "" in counters:
+            product["stock"] = counters[""]
+        variants = {variant: value for variant, value in counters.items() if variant}
+        if variants:
+            product["variant_stock"] = variants
+        return product
+
+    def set_product_stock(self, product: Dict[str, Any]):
+        """Reset a product's counters after an admin create/update"""
+        wanted = product_stock_counters(product)
+        current = self.available(product["id"])
+        keys = [(product["id"], variant) for variant in current.keys() | wanted.keys()]
+        with self._locked(keys):
+            for variant in current.keys() - wanted.keys():
+                self._unset_counter(product["id"], variant)
+                self._append({"op": "unset", "product_id": product["id"], "variant": variant})
+            for variant, value in wanted.items():
+                self._set_counter(product["id"], variant, value)
+                self._append({"op": "set", "product_id": product["id"], "variant": variant, "value": value})
+        if current or wanted:
+            self._changed()
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
+    def remove_product(self, product_id: str):
+        self.set_product_stock({"id": product_id})
+
+    # ----- reservations -----
+
+    def reserve(self, order_id: str, lines: List[Tuple[str, str, int]], expires_at: Optional[str] = None):
+        """Atomically reserve every line or none of them"""
+        resolved = []
+        for product_id, variant, qty in lines:
+            key = self._resolve(product_id, variant)
+            if key is not None:
+                resolved.append((key, qty))
+        if not resolved:
+            return
+
+        needed: Dict[Tuple[str, str], int] = {}
+        for key, qty in resolved:
+            needed[key] = needed.get(key, 0) + qty
+
+        with self._locked(needed):
+            for key, qty in needed.items():
+                available = self._counters.get(key, 0)
+                if available < qty:
+                    raise InsufficientStockError(key[0], key[1], qty, available)
+            for key, qty in needed.items():
+                self._counters[key] -= qty
+            journal_lines = [[key[0], key[1], qty] for key, qty in needed.items()]
+            with self._reservations_lock:
+                self._reservations[order_id] = {
+                    "lines": [tuple(line) for line in journal_lines],
+                    "status": "held",
+                    "expires_at": expires_at,
+                }
+            self._append({"op": "reserve", "order_id": order_id, "lines": journal_lines, "expires_at": expires_at})
+        self._changed()
+
+    def release(self, order_id: str) -> bool:
+        """Return reserved stock to the pool; False if nothing was held"""
+        with self._reservations_lock:
+            reservation = self._reservations.get(order_id)
+        if not reservation:
+            return False
+        keys = [(product_id, variant) for product_id, variant, _ in reservation["lines"]]
+        with self._locked(keys):
+            with self._reservations_lock:
+                # A concurrent release may have won the race
+                if self._reservations.pop(order_id, None) is None:
+                    return False
+            for product_id, variant, qty in reservation["lines"]:
+                if (product_id, variant) in self._counters:
+                    self._counters[(product_id, variant)] += qty
+            self._append({"op": "release", "order_id": order_id})
+        self._changed()
+        return True
+
+    def commit(self, order_id: str) -> bool:
+        """Mark a reservation as paid so it no longer expires"""
+        with self._reservations_lock:
+            reservation = self._reservations.get(order_id)
+            if not reservation or reservation["status"] == "committed":
+                return False
+            reservation["status"] = "committed"
+            reservation["expires_at"] = None
+        self._append({"op": "commit", "order_id": order_id})
+        return True
+
+    def consume(self, order_id: str) -> bool:
+        """Forget a reservation whose goods have left the shop"""
+        with self._reservations_lock:
+            reservation = self._reservations.pop(order_id, None)
+        if not reservation:
+            return False
+        self._append({"op": "consume", "order_id": order_id})
+        return True
+
+    def apply_status(self, order_id: str, status: str) -> bool:
+        """Apply the reservation action for an order status change"""
+        if status in RELEASE_STATUSES:
+            return self.release(order_id)
+        if status in COMMIT_STATUSES:
+            return self.commit(order_id)
+        if status in CONSUME_STATUSES:
+            return self.consume(order_id)
+        return False
+
+    def reservations(self) -> Dict[str, Dict[str, Any]]:
+        """Copy of the open reservations keyed by order id"""
+        with self._reservations_lock:
+            return {order_id: dict(r) for order_id, r in self._reservations.items()}
+
+    def expired(self, now: Optional[datetime] = None) -> List[str]:
+        """Order ids whose held reservation has passed its expiry"""
+        cutoff = (now or datetime.now(timezone.utc)).isoformat()
+        with self._reservations_lock:
+            return [order_id for order_id, r in self._reservations.items()
+                    if r["status"] == "held" and r["expires_at"] and r["expires_at"] < cutoff]
+
+    def expire(self, now: Optional[datetime] = None) -> List[str]:
+        """Release every expired held reservation and return their order ids"""
+        return [order_id for order_id in self.expired(now) if self.release(order_id)]
+
+    def reconcile(self, order_statuses: Dict[str, str]) -> List[str]:
+        """Bring reservations in line with their orders' statuses; returns the order ids changed
+
+        A committed reservation whose order no longer exists is released; held
+        ones are left to expire, as their order may still be being written.
+        """
+        with self._reservations_lock:
+            reservations = [(order_id, r["status"]) for order_id, r in self._reservations.items()]
+        changed = []
+        for order_id, status in reservations:
+            order_status = order_statuses.get(order_id)
+            if order_status is None:
+                if status == "committed" and self.release(order_id):
+                    changed.append(order_id)
+            elif self.apply_status(order_id, order_status):
+                changed.append(order_id)
+        return changed
+
+
+class AsyncStockLedger:
+    """``JsonStockLedger`` behind the awaitable interface of ``MongoStockLedger``
+
+    ``order_statuses`` returns ``{order_id: status}`` for ``reconcile``.
+    """
+
+    def __init__(self, ledger: JsonStockLedger, order_statuses: Callable[[], Awaitable[Dict[str, str]]]):
+        self.ledger = ledger
+        self.order_statuses = order_statuses
+
+    async def ensure_indexes(self):
+        pass
+
+    async def reserve(self, order_id: str, lines: List[Tuple[str, str, int]], expires_at: Optional[str] = None):
+        self.ledger.reserve(order_id, lines, expires_at)
+
+    async def release(self, order_id: str) -> bool:
+        return self.ledger.release(order_id)
+
+    async def commit(self, order_id: str) -> bool:
+        return self.ledger.commit(order_id)
+
+    async def consume(self, order_id: str) -> bool:
+        return self.ledger.consume(order_id)
+
+    async def apply_status(self, order_id: str, status: str) -> bool:
+        return self.ledger.apply_status(order_id, status)
+
+    async def expire(self, now: Optional[datetime] = None) -> List[str]:
+        return self.ledger.expire(now)
+
+    async def reconcile(self) -> List[str]:
+        return self.ledger.reconcile(await self.order_statuses())
+
+    async def compact(self):
+        self.ledger.compact()
+
+
+# ============== MONGO BACKEND ==============
+
+class MongoStockLedger:
+    """Atomic conditional ``$inc`` reservations against MongoDB"""
+
+    def __init__(self, db, on_change: Optional[Callable[[], None]] = None):
+        self.db = db
+        self.on_change = on_change
+
+    async def ensure_indexes(self):
+        await self.db.stock_reservations.create_index("order_id", unique=True)
+        await self.db.stock_reservations.create_index([("status", 1), ("expires_at", 1)])
+
+    @staticmethod
+    def _field(product: Dict[str, Any], variant: str) -> Optional[str]:
+        if variant in (product.get("variant_stock") or {}):
+            return f"variant_stock.{variant}"
+        if product.get("stock") is not None:
+            return "stock"
+        return None
+
+    async def _inc(self, product_id: str, field: str, qty: int):
+        await self.db.products.update_one({"id": product_id}, {"$inc": {field: qty}})
+
+    async def reserve(self, order_id: str, lines: List[Tuple[str, str, int]], expires_at: Optional[str] = None):
+        """Decrement each line with a guarded ``$inc``; undo the applied ones on failure"""
+        product_ids = list({product_id for product_id, _, _ in lines})
+        products = {
+            p["id"]: p async for p in self.db.products.find(
+                {"id": {"$in": product_ids}}, {"_id": 0, "id": 1, "stock": 1, "variant_stock": 1}
+            )
+        }
+        applied = []
+        try:
+            for product_id, variant, qty in lines:
+                field = self._field(products.get(product_id, {}), variant)
+                if field is None:
+                    continue
+                result = await self.db.products.update_one(
+                    {"id": product_id, field: {"$gte": qty}},
+                    {"$inc": {field: -qty}}
+                )
+                if result.modified_count == 0:
+                    current = await self.db.products.find_one({"id": product_id}, {"_id": 0, field: 1})
+                    available = current
+                    for part in field.split("."):
+                        available = (available or {}).get(part)
+                    raise InsufficientStockError(product_id, variant, qty, int(available or 0))
+                applied.append({"product_id": product_id, "field": field, "quantity": qty})
+        except BaseException:
+            for line in applied:
+                await self._inc(line["product_id"], line["field"], line["quantity"])
+            raise
+
+        if applied:
+            if self.on_change is not None:
+                self.on_change()
+            await self.db.stock_reservations.insert_one({
+                "order_id": order_id,
+                "lines": applied,
+                "status": "held",
+                "expires_at": expires_at,
+                "created_at": datetime.now(timezone.utc).isoformat()
+            })
+
+    async def _transition(self, order_id: str, from_statuses: List[str], to_status: str, **extra):
+        return await self.db.stock_reservations.find_one_and_update(
+            {"order_id": order_id, "status": {"$in": from_statuses}},
+            {"$set": {"status": to_status, "updated_at": datetime.now(timezone.utc).isoformat(), **extra}}
+        )
+
+    async def release(self, order_id: str) -> bool:
+        reservation = await self._transition(order_id, ["held", "committed"], "released")
+        if not reservation:
+            return False
+        for line in reservation["lines"]:
+            await self._inc(line["product_id"], line["field"], line["quantity"])
+        if self.on_change is not None:
+            self.on_change()
+        return True
+
+    async def commit(self, order_id: str) -> bool:
+        return bool(await self._transition(order_id, ["held"], "committed", expires_at=None))
+
+    async def consume(self, order_id: str) -> bool:
+        return bool(await self._transition(order_id, ["held", "committed"], "consumed", expires_at=None))
+
+    async def apply_status(self, order_id: str, status: str) -> bool:
+        if status in RELEASE_STATUSES:
+            return await self.release(order_id)
+        if status in COMMIT_STATUSES:
+            return await self.commit(order_id)
+        if status in CONSUME_STATUSES:
+            return await self.consume(order_id)
+        return False
+
+    async def expire(self, now: Optional[datetime] = None) -> List[str]:
+        cutoff = (now or datetime.now(timezone.utc)).isoformat()
+        cursor = self.db.stock_reservations.find(
+            {"status": "held", "expires_at": {"$ne": None, "$lt": cutoff}},
+            {"_id": 0, "order_id": 1}
+        )
+        released = []
+        async for reservation in cursor:
+            if await self.release(reservation["order_id"]):
+                released.append(reservation["order_id"])
+        return released
+
+    async def reconcile(self) -> List[str]:
+        """Bring active reservations in line with their orders' statuses; see ``JsonStockLedger.reconcile``"""
+        reservations = await self.db.stock_reservations.find(
+            {"status": {"$in": ["held", "committed"]}}, {"_id": 0, "order_id": 1, "status": 1}
+        ).to_list(None)
+        order_statuses = {
+            order["id"]: order.get("status", "pending") async for order in self.db.orders.find(
+                {"id": {"$in": [r["order_id"] for r in reservations]}}, {"_id": 0, "id": 1, "status": 1}
+            )
+        }
+        changed = []
+        for reservation in reservations:
+            order_id = reservation["order_id"]
+            order_status = order_statuses.get(order_id)
+            if order_status is None:
+                if reservation["status"] == "committed" and await self.release(order_id):
+                    changed.append(order_id)
+            elif await self.apply_status(order_id, order_status):
+                changed.append(order_id)
+        return changed
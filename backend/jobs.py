@@ -0,0 +1,340 @@
+"""
+In-process scheduler for periodic maintenance jobs.
+
+Jobs run on the event loop with an interval (``every=seconds``) or a
+five-field cron expression (``cron="30 3 * * *"``, evaluated in UTC). A job
+never overlaps itself. Synchronous jobs run inline on the loop, like the
+JSON server's request handlers, so they never race them on the data files;
+they must be short, as they block the loop. Blocking work (SMTP, say) is
+registered as ``lambda: asyncio.to_thread(func)``, so it runs off the loop and
+its ``timeout`` applies.
+
+With several workers only one should run most jobs: ``leader_only`` jobs run
+only in the process holding the leader lock, a file lock for the JSON backend
+(``FileLeaderLock``) or a lease document in Mongo (``MongoLeaderLock``).
+
+A failing job is retried after an exponential backoff with full jitter,
+capped at its normal interval, instead of waiting for its next regular run.
+Runs, failures, durations and the last success time are exported as metrics.
+"""
+import asyncio
+import inspect
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Set
+
+from metrics import REGISTRY, Counter, Gauge, Histogram
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+BACKOFF_BASE_SECONDS = 5.0
+BACKOFF_MAX_SECONDS = 900.0
+
+# Maintenance job settings shared by both servers
+PENDING_ORDER_DAYS = int(os.getenv("PENDING_ORDER_DAYS", "7"))
+# Read contact messages leave the inbox for the archive after CONTACT_ARCHIVE_DAYS,
+# and the archive keeps them until CONTACT_RETENTION_DAYS
+CONTACT_ARCHIVE_DAYS = int(os.getenv("CONTACT_ARCHIVE_DAYS", "30"))
+CONTACT_RETENTION_DAYS = int(os.getenv("CONTACT_RETENTION_DAYS", "180"))
+CONTACT_QUARANTINE_DAYS = int(os.getenv("CONTACT_QUARANTINE_DAYS", "14"))
+EMAIL_RETRY_SECONDS = int(os.getenv("EMAIL_RETRY_SECONDS", "300"))
+
+logger = logging.getLogger(__name__)
+
+job_runs_total = REGISTRY.register(Counter(
+    "job_runs_total", "Background job runs by outcome", ("job", "result")))
+job_duration_seconds = REGISTRY.register(Histogram(
+    "job_duration_seconds", "Background job duration", ("job",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0)))
+job_last_success_seconds = REGISTRY.register(Gauge(
+    "job_last_success_timestamp_seconds", "Unix time of each job's last successful run", ("job",)))
+scheduler_leader = REGISTRY.register(Gauge(
+    "scheduler_leader", "1 when this process holds the scheduler leader lock"))
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def days_ago(days: int) -> str:
+    """ISO timestamp ``days`` days before now, comparable with stored ``created_at`` values"""
+    return (_utcnow() - timedelta(days=days)).isoformat()
+
+
+# ============== TRIGGERS ==============
+
+class Interval:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def next_after(self, after: datetime) -> datetime:
+        return after + timedelta(seconds=self.seconds)
+
+
+class Cron:
+    """Five-field cron expression: minute hour day-of-month month day-of-week (0 or 7 = Sunday)"""
+
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: '{expression}'")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse(value, low, high) for value, (low, high) in zip(fields, self.RANGES)
+        )
+        self.weekdays = {0 if day == 7 else day for day in weekdays}
+        # Standard cron: when both day fields are restricted, either may match
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse(value: str, low: int, high: int) -> Set[int]:
+        result = set()
+        for part in value.split(","):
+            span, _, step = part.partition("/")
+            if span == "*":
+                start, end = low, high
+            elif "-" in span:
+                start, end = (int(v) for v in span.split("-"))
+            else:
+                start = end = int(span)
+                if step:
+                    end = high
+            if not (low <= start <= end <= high):
+                raise ValueError(f"Cron field '{value}' out of range {low}-{high}")
+            result.update(range(start, end + 1, int(step) if step else 1))
+        return result
+
+    def _day_matches(self, t: datetime) -> bool:
+        day = t.day in self.days
+        weekday = (t.isoweekday() % 7) in self.weekdays
+        if self._any_day:
+            return weekday
+        if self._any_weekday:
+            return day
+        return day or weekday
+
+    def next_after(self, after: datetime) -> datetime:
+        t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"Cron expression never fires: '{self.expression}'")
+
+
+# ============== LEADER LOCKS ==============
+
+class FileLeaderLock:
+    """Exclusive lock on a file, held for the life of the process"""
+
+    renew_seconds = 15.0
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = None
+
+    async def acquire(self) -> bool:
+        if self._file is not None:
+            return True
+        handle = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            handle.close()
+            return False
+        handle.seek(0)
+        handle.truncate()
+        handle.write(f"{socket.gethostname()}:{os.getpid()}\n")
+        handle.flush()
+        self._file = handle
+        return True
+
+    async def release(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class MongoLeaderLock:
+    """Lease document renewed by its holder; another process takes over once it lapses"""
+
+    def __init__(self, db, name: str = "scheduler", ttl_seconds: float = 30.0):
+        self.collection = db.locks
+        self.name = name
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.renew_seconds = ttl_seconds / 3
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def acquire(self) -> bool:
+        from pymongo.errors import DuplicateKeyError
+
+        now = _utcnow()
+        try:
+            await self.collection.update_one(
+                {"_id": self.name, "$or": [{"owner": self.owner}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + self.ttl}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # Held by another live process
+            return False
+
+    async def release(self):
+        await self.collection.delete_one({"_id": self.name, "owner": self.owner})
+
+
+# ============== SCHEDULER ==============
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[], Any]
+    trigger: Any
+    leader_only: bool = True
+    timeout: Optional[float] = None
+    next_run: datetime = field(default_factory=_utcnow)
+    failures: int = 0
+    running: bool = False
+
+
+class Scheduler:
+    def __init__(self, lock=None, tick_seconds: float = 1.0):
+        self.lock = lock
+        self.tick = tick_seconds
+        self.jobs: Dict[str, Job] = {}
+        self.leader = lock is None
+        self._task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        self._lock_checked = 0.0
+
+    def add(self, name: str, func: Callable[[], Any], every: Optional[float] = None, cron: Optional[str] = None,
+            leader_only: bool = True, run_at_start: bool = False, timeout: Optional[float] = None) -> Job:
+        """Register ``func`` (sync or async, no arguments) to run every ``every`` seconds or on ``cron``
+
+        ``timeout`` applies to the awaitable ``func`` returns; a synchronous
+        body runs inline on the loop and cannot be interrupted.
+        """
+        if (every is None) == (cron is None):
+            raise ValueError("Give exactly one of every= or cron=")
+        trigger = Interval(every) if every is not None else Cron(cron)
+        now = _utcnow()
+        job = Job(name, func, trigger, leader_only, timeout, now if run_at_start else trigger.next_after(now))
+        self.jobs[name] = job
+        return job
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self, timeout: float = 0.0):
+        """Start no more jobs; give the running ones ``timeout`` seconds to finish, then cancel them"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._running and timeout > 0:
+            await asyncio.wait(list(self._running), timeout=timeout)
+        for task in list(self._running):
+            task.cancel()
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        if self.lock is not None and self.leader:
+            try:
+                await self.lock.release()
+            except Exception as e:
+                logger.error(f"Failed to release scheduler lock: {str(e)}")
+        self.leader = self.lock is None
+
+    async def _check_leader(self):
+        if self.lock is None or time.monotonic() - self._lock_checked < self.lock.renew_seconds:
+            return
+        self._lock_checked = time.monotonic()
+        try:
+            leader = await self.lock.acquire()
+        except Exception as e:
+            logger.error(f"Scheduler lock unavailable: {str(e)}")
+            leader = False
+        if leader != self.leader:
+            logger.info(f"Scheduler leadership {'acquired' if leader else 'lost'}")
+        self.leader = leader
+        scheduler_leader.set(1 if leader else 0)
+
+    async def _loop(self):
+        while True:
+            await self._check_leader()
+            now = _utcnow()
+            for job in self.jobs.values():
+                if job.running or job.next_run > now:
+                    continue
+                if job.leader_only and not self.leader:
+                    job.next_run = job.trigger.next_after(now)
+                    continue
+                job.running = True
+                task = asyncio.create_task(self.run(job))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+            await asyncio.sleep(self.tick)
+
+    async def run(self, job: Job) -> bool:
+        """Run one job now, recording metrics and scheduling its next run"""
+        started = time.perf_counter()
+        try:
+            result = job.func()
+            if inspect.isawaitable(result):
+                await asyncio.wait_for(result, job.timeout) if job.timeout else await result
+        except asyncio.CancelledError:
+            job.running = False
+            raise
+        except Exception as e:
+            job.failures += 1
+            job_runs_total.inc(job=job.name, result="failure")
+            delay = self._backoff(job)
+            job.next_run = _utcnow() + timedelta(seconds=delay)
+            logger.error(f"Job {job.name} failed (attempt {job.failures}), retrying in {delay:.0f}s: {str(e)}")
+            return False
+        finally:
+            job_duration_seconds.observe(time.perf_counter() - started, job=job.name)
+            job.running = False
+        job.failures = 0
+        job_runs_total.inc(job=job.name, result="success")
+        job_last_success_seconds.set(time.time(), job=job.name)
+        job.next_run = job.trigger.next_after(_utcnow())
+        return True
+
+    @staticmethod
+    def _backoff(job: Job) -> float:
+        cap = BACKOFF_MAX_SECONDS
+        if isinstance(job.trigger, Interval):
+            cap = min(cap, max(job.trigger.seconds, BACKOFF_BASE_SECONDS))
+        ceiling = min(cap, BACKOFF_BASE_SECONDS * 2 ** (job.failures - 1))
+        return random.uniform(BACKOFF_BASE_SECONDS / 2, max(ceiling, BACKOFF_BASE_SECONDS / 2))
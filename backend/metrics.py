@@ -0,0 +1,288 @@
+"""
+Prometheus metrics for the API, whichever storage backend serves it.
+
+A small in-process registry rendering the Prometheus text exposition format,
+so no extra dependency is needed. Metrics are per process: with several
+workers, scrape each one or aggregate in Prometheus.
+
+``MetricsMiddleware`` records per-route request counts, latency histograms and
+in-flight gauges, labelled by the route template (``/api/orders/{order_id}``)
+rather than the raw path to keep label cardinality bounded.
+``MongoCommandMetrics`` is a pymongo ``CommandListener`` timing database
+commands, and ``monitor_event_loop`` samples event-loop lag.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Match
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.5"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (1024, 16384, 131072, 1048576, 8388608, 67108864)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class _Scalar(_Metric):
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        if not self.labelnames and not self._values:
+            yield f"{self.name} 0"
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Counter(_Scalar):
+    kind = "counter"
+
+
+class Gauge(_Scalar):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def samples(self):
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> bytes:
+        return ("\n".join(metric.render() for metric in self._metrics) + "\n").encode("utf-8")
+
+
+REGISTRY = Registry()
+
+# HTTP
+http_requests_total = REGISTRY.register(Counter(
+    "http_requests_total", "HTTP requests by route, method and status", ("method", "route", "status")))
+http_request_duration_seconds = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route and method", ("method", "route")))
+http_requests_in_flight = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", ("method", "route")))
+
+# Domain
+orders_created_total = REGISTRY.register(Counter(
+    "orders_created_total", "Orders created"))
+emails_total = REGISTRY.register(Counter(
+    "emails_total", "Emails by outcome (sent or failed)", ("result",)))
+login_failures_total = REGISTRY.register(Counter(
+    "login_failures_total", "Failed logins by account kind", ("kind",)))
+contact_quarantined_total = REGISTRY.register(Counter(
+    "contact_quarantined_total", "Contact messages quarantined, by reason", ("reason",)))
+
+# Storage
+storage_operation_seconds = REGISTRY.register(Histogram(
+    "storage_operation_seconds", "JSON file load/save duration", ("operation", "file")))
+storage_bytes = REGISTRY.register(Histogram(
+    "storage_bytes", "JSON file size read or written", ("operation", "file"), buckets=BYTES_BUCKETS))
+repository_operation_seconds = REGISTRY.register(Histogram(
+    "repository_operation_seconds", "Storage repository call duration",
+    ("backend", "collection", "operation")))
+mongo_command_seconds = REGISTRY.register(Histogram(
+    "mongo_command_seconds", "MongoDB command duration", ("command",)))
+mongo_command_failures_total = REGISTRY.register(Counter(
+    "mongo_command_failures_total", "Failed MongoDB commands", ("command",)))
+
+# Runtime
+event_loop_lag_seconds = REGISTRY.register(Gauge(
+    "event_loop_lag_seconds", "Most recent event-loop scheduling delay"))
+event_loop_lag_histogram = REGISTRY.register(Histogram(
+    "event_loop_lag_histogram_seconds", "Event-loop scheduling delay",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)))
+
+
+def observe_storage(operation: str, path, started: float, size: int):
+    """Record one load_json/save_json call started at ``started`` (perf_counter)"""
+    name = getattr(path, "name", str(path))
+    storage_operation_seconds.observe(time.perf_counter() - started, operation=operation, file=name)
+    storage_bytes.observe(size, operation=operation, file=name)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request count, latency and in-flight requests per route"""
+
+    def __init__(self, app, routes: Sequence = ()):
+        self.app = app
+        # The application's live route list, so routers included later are seen
+        self.routes = routes
+
+    def _route(self, scope) -> str:
+        partial = None
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and partial is None:
+                partial = route.path
+        return partial or "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route(scope)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc(method=method, route=route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_request_duration_seconds.observe(time.perf_counter() - start, method=method, route=route)
+            http_requests_total.inc(method=method, route=route, status=status)
+            http_requests_in_flight.dec(method=method, route=route)
+
+
+def metrics_response(request: Request) -> Response:
+    """Render the registry; requires ``Bearer $METRICS_TOKEN`` when that is set"""
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        return Response(status_code=401)
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+async def monitor_event_loop(interval: float = EVENT_LOOP_LAG_INTERVAL):
+    """Measure how late a sleep wakes up; time beyond ``interval`` is loop lag"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        event_loop_lag_seconds.set(lag)
+        event_loop_lag_histogram.observe(lag)
+
+
+def _mongo_command_metrics():
+    from pymongo import monitoring
+
+    class MongoCommandMetrics(monitoring.CommandListener):
+        """pymongo listener timing every command by name"""
+
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            mongo_command_seconds.observe(event.duration_micros / 1e6, command=event.command_name)
+
+        def failed(self, event):
+            mongo_command_seconds.observe(event.duration_micros / 1e6, command=event.command_name)
+            mongo_command_failures_total.inc(command=event.command_name)
+
+    return MongoCommandMetrics
+
+
+def __getattr__(name):
+    # The listener subclasses a pymongo class, so it is defined when the Mongo backend first asks for it
+    if name == "MongoCommandMetrics":
+        globals()[name] = _mongo_command_metrics()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
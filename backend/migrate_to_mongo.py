@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Migrate the JSON backend's data files into MongoDB.
+
+Each file is streamed, upgraded to the current document shapes (see
+``storage``), given the product views the API reads, and written with
+``bulk_write`` upserts in batches spread over concurrent coroutines. Products
+carry their live stock from the stock journal, and open journal reservations
+become ``stock_reservations`` documents.
+
+Progress is checkpointed per collection after every batch, so an interrupted
+run resumes where it stopped; upserts make replaying a batch harmless. A final
+pass compares document counts and an order-independent content hash of every
+collection with its source.
+
+Refresh tokens are not migrated; signed-in users sign in again.
+
+    python migrate_to_mongo.py --data-dir data --mongo-url mongodb://localhost:27017
+    python migrate_to_mongo.py --verify-only
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from catalog_views import localized_views
+from inventory import JsonStockLedger
+from order_export import iter_json_array
+from storage import load_json_lines, upgrade_order, upgrade_product
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_CONCURRENCY = 4
+WRITE_ATTEMPTS = 3
+
+
+# ============== SCHEMA MAPPING ==============
+
+def convert_product(product: Dict[str, Any]) -> Dict[str, Any]:
+    """A product with its per-language views, which the API reads for ``lang=``"""
+    doc = upgrade_product(product)
+    doc.pop("views", None)
+    doc["views"] = localized_views(doc)
+    return doc
+
+
+def convert_reservation(order_id: str, reservation: Dict[str, Any]) -> Dict[str, Any]:
+    """A journal reservation as a ``MongoStockLedger`` reservation document"""
+    return {
+        "order_id": order_id,
+        "lines": [{"product_id": product_id, "field": f"variant_stock.{variant}" if variant else "stock",
+                   "quantity": qty} for product_id, variant, qty in reservation["lines"]],
+        "status": reservation["status"],
+        "expires_at": reservation["expires_at"]
+    }
+
+
+@dataclass
+class Source:
+    collection: str
+    file_name: str
+    key: str = "id"
+    convert: Callable[[Dict[str, Any]], Dict[str, Any]] = dict
+
+
+SOURCES = [
+    Source("categories", "categories.json"),
+    Source("products", "products.json", convert=convert_product),
+    Source("admins", "admins.json"),
+    Source("customers", "customers.json"),
+    Source("orders", "orders.json", convert=upgrade_order),
+    Source("contact_messages", "messages.json"),
+    Source("contact_message_archive", "message_archive.json"),
+    Source("contact_message_quarantine", "message_quarantine.json"),
+    Source("order_events", "order_events.jsonl"),
+    Source("stock_reservations", "stock_journal.jsonl", key="order_id"),
+]
+
+
+class JsonDataset:
+    """Converted documents of each collection, streamed from the data directory"""
+
+    def __init__(self, data_dir: Path):
+        self.data_dir = data_dir
+        self._ledger: Optional[JsonStockLedger] = None
+
+    @property
+    def ledger(self) -> JsonStockLedger:
+        # Replaying the journal needs the products' configured stock as its base
+        if self._ledger is None:
+            self._ledger = JsonStockLedger(self.data_dir / "stock_journal.jsonl")
+            self._ledger.load(iter_json_array(self.data_dir / "products.json"))
+        return self._ledger
+
+    def fingerprint(self, source: Source) -> List[int]:
+        """Size and mtime of a source file, to notice it changed between runs"""
+        path = self.data_dir / source.file_name
+        if not path.exists():
+            return [0, 0]
+        stat = path.stat()
+        return [stat.st_size, int(stat.st_mtime)]
+
+    def documents(self, source: Source) -> Iterator[Dict[str, Any]]:
+        if source.collection == "stock_reservations":
+            for order_id, reservation in sorted(self.ledger.reservations().items()):
+                yield convert_reservation(order_id, reservation)
+            return
+        if source.collection == "products":
+            counters = self.ledger.snapshot()
+            for product in iter_json_array(self.data_dir / source.file_name):
+                yield source.convert(JsonStockLedger.overlay(product, counters.get(product["id"], {})))
+            return
+        path = self.data_dir / source.file_name
+        docs = load_json_lines(path) if path.suffix == ".jsonl" else iter_json_array(path)
+        for doc in docs:
+            yield source.convert(doc)
+
+
+def batched(docs: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ============== CHECKPOINTS ==============
+
+class Checkpoint:
+    """Per-collection progress: the first batch not yet written, and whether the collection is done"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.state: Dict[str, Dict[str, Any]] = {}
+        if path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+
+    def collection(self, name: str, batch_size: int, fingerprint: List[int]) -> Dict[str, Any]:
+        state = self.state.get(name)
+        if state is not None and state["fingerprint"] != fingerprint:
+            print(f"  {name}: source changed since the last run, starting over")
+            state = None
+        if state is None:
+            state = self.state[name] = {
+                "batch_size": batch_size, "next_batch": 0, "written": 0,
+                "done": False, "fingerprint": fingerprint
+            }
+        return state
+
+    def save(self):
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+# ============== MIGRATION ==============
+
+async def write_batch(collection, key: str, docs: List[Dict[str, Any]]):
+    from pymongo import ReplaceOne
+    from pymongo.errors import AutoReconnect, BulkWriteError
+
+    operations = [ReplaceOne({key: doc[key]}, doc, upsert=True) for doc in docs]
+    for attempt in range(1, WRITE_ATTEMPTS + 1):
+        try:
+            await collection.bulk_write(operations, ordered=False)
+            return
+        except (AutoReconnect, BulkWriteError):
+            if attempt == WRITE_ATTEMPTS:
+                raise
+            await asyncio.sleep(0.5 * 2 ** attempt)
+
+
+async def migrate_collection(db, dataset: JsonDataset, source: Source, checkpoint: Checkpoint,
+                             batch_size: int, concurrency: int, drop: bool):
+    state = checkpoint.collection(source.collection, batch_size, dataset.fingerprint(source))
+    if state["done"]:
+        print(f"  {source.collection}: already migrated ({state['written']} documents)")
+        return
+    # Batch numbers in the checkpoint only mean something with the batch size they were written with
+    batch_size = state["batch_size"]
+    collection = db[source.collection]
+
+    if state["next_batch"] == 0 and drop:
+        await collection.delete_many({})
+    try:
+        await collection.create_index(source.key, unique=True)
+    except Exception as e:
+        # An existing index on the key still serves the upserts
+        print(f"  {source.collection}: using existing index on {source.key} ({e})")
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    completed = set()
+    errors: List[BaseException] = []
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            number, docs = item
+            if errors:
+                # Keep draining so the reader never blocks; the checkpoint stops at the failed batch
+                continue
+            try:
+                await write_batch(collection, source.key, docs)
+            except Exception as e:
+                errors.append(e)
+                continue
+            completed.add(number)
+            state["written"] += len(docs)
+            while state["next_batch"] in completed:
+                completed.discard(state["next_batch"])
+                state["next_batch"] += 1
+            checkpoint.save()
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    skipped = state["next_batch"]
+    try:
+        for number, docs in enumerate(batched(dataset.documents(source), batch_size)):
+            if number < skipped:
+                continue
+            await queue.put((number, docs))
+            if errors:
+                break
+    finally:
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+    if errors:
+        checkpoint.save()
+        raise RuntimeError(f"{source.collection}: batch write failed, rerun to resume: {errors[0]}")
+    state["done"] = True
+    checkpoint.save()
+    resumed = f", resumed at batch {skipped}" if skipped else ""
+    print(f"  {source.collection}: {state['written']} documents written{resumed}")
+
+
+# ============== VERIFICATION ==============
+
+def _digest(docs: Iterable[Dict[str, Any]]) -> Tuple[int, str]:
+    """Count and order-independent hash (sum of per-document SHA-256) of a document stream"""
+    count, total = 0, 0
+    for doc in docs:
+        canonical = json.dumps(doc, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+        total = (total + int.from_bytes(hashlib.sha256(canonical.encode("utf-8")).digest(), "big")) % (1 << 256)
+        count += 1
+    return count, f"{total:064x}"
+
+
+async def verify(db, dataset: JsonDataset, sources: List[Source]) -> bool:
+    ok = True
+    for source in sources:
+        expected = _digest(dataset.documents(source))
+        docs = await db[source.collection].find({}, {"_id": 0}).to_list(None)
+        actual = _digest(docs)
+        match = expected == actual
+        ok = ok and match
+        print(f"  {source.collection}: source {expected[0]} / mongo {actual[0]} documents, "
+              f"hash {'match' if match else 'MISMATCH'}")
+    return ok
+
+
+async def run(args) -> int:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    data_dir = Path(args.data_dir)
+    if not data_dir.is_dir():
+        print(f"Data directory {data_dir} not found")
+        return 1
+    sources = [s for s in SOURCES if not args.only or s.collection in args.only]
+    checkpoint_path = Path(args.checkpoint) if args.checkpoint else data_dir / "mongo_migration.json"
+    if args.restart and checkpoint_path.exists():
+        checkpoint_path.unlink()
+    checkpoint = Checkpoint(checkpoint_path)
+    dataset = JsonDataset(data_dir)
+    client = AsyncIOMotorClient(args.mongo_url)
+    db = client[args.db]
+
+    try:
+        if not args.verify_only:
+            started = datetime.now(timezone.utc)
+            print(f"Migrating {data_dir} -> {args.db} (batch {args.batch_size}, concurrency {args.concurrency})")
+            try:
+                for source in sources:
+                    await migrate_collection(db, dataset, source, checkpoint, args.batch_size, args.concurrency,
+                                             args.drop)
+            except RuntimeError as e:
+                print(f"❌ {e}")
+                return 1
+            print(f"Migration finished in {(datetime.now(timezone.utc) - started).total_seconds():.1f}s")
+        print("Verifying")
+        ok = await verify(db, dataset, sources)
+    finally:
+        client.close()
+    print("✅ Verification passed" if ok else "❌ Verification failed")
+    return 0 if ok else 1
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Migrate the JSON data files into MongoDB")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGODB_URI", os.environ.get("MONGO_URL", "mongodb://localhost:27017")))
+    parser.add_argument("--db", default=os.environ.get("DB_NAME", "pulgax_3d_store"))
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="concurrent bulk writes")
+    parser.add_argument("--only", nargs="+", choices=[s.collection for s in SOURCES], help="collections to migrate")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <data-dir>/mongo_migration.json)")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    parser.add_argument("--drop", action="store_true", help="empty each collection before migrating into it")
+    parser.add_argument("--verify-only", action="store_true", help="only compare counts and hashes")
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
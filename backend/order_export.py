@@ -0,0 +1,186 @@
+"""
+Streaming CSV / NDJSON export of orders and customers.
+
+Rows are produced one at a time from a storage iterator, so an export never
+builds the whole file in memory; the Mongo backend pages through a cursor.
+``iter_json_array`` parses a JSON array file incrementally for offline tools.
+"""
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+ORDER_COLUMNS = [
+    "id", "order_number", "status", "created_at", "updated_at", "customer_id",
+    "customer_name", "customer_email", "customer_phone",
+    "shipping_address", "shipping_notes", "shipping_method", "shipping_cost",
+    "payment_method", "payment_status", "payment_amount", "payment_last_digits",
+    "subtotal", "adjustments", "total", "item_count", "items",
+]
+
+CUSTOMER_COLUMNS = [
+    "id", "name", "email", "phone", "auth_provider",
+    "address_street", "address_city", "address_postal_code", "address_country", "created_at",
+]
+
+# Leading characters that make Excel / Sheets / LibreOffice evaluate a cell
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def flatten_order(order: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten nested customer/shipping/payment/totals into one row (both order shapes)"""
+    customer = order.get("customer") or {}
+    shipping = order.get("shipping") or {}
+    payment = order.get("payment") or {}
+    totals = order.get("totals") or {}
+    details = payment.get("details") or order.get("payment_details") or {}
+    items = order.get("items") or []
+    total = totals.get("total", order.get("calculated_total", order.get("total_amount")))
+
+    return {
+        "id": order.get("id"),
+        "order_number": order.get("order_number"),
+        "status": order.get("status"),
+        "created_at": order.get("created_at"),
+        "updated_at": order.get("updated_at"),
+        "customer_id": order.get("customer_id"),
+        "customer_name": customer.get("name", order.get("customer_name")),
+        "customer_email": customer.get("email", order.get("customer_email")),
+        "customer_phone": customer.get("phone", order.get("customer_phone")),
+        "shipping_address": shipping.get("address", order.get("shipping_address")),
+        "shipping_notes": shipping.get("notes", order.get("notes")),
+        "shipping_method": shipping.get("method", order.get("shipping_method")),
+        "shipping_cost": shipping.get("cost", order.get("shipping_cost")),
+        "payment_method": payment.get("method", order.get("payment_method")),
+        "payment_status": payment.get("status"),
+        "payment_amount": payment.get("amount", total),
+        "payment_last_digits": details.get("card_last_digits") or details.get("phone_last_digits"),
+        "subtotal": totals.get("subtotal"),
+        "adjustments": totals.get("adjustments"),
+        "total": total,
+        "item_count": sum(int(item.get("quantity", 1) or 1) for item in items),
+        "items": "; ".join(
+            f"{item.get('quantity', 1)}x {item.get('product_name') or item.get('product_name_pt') or item.get('product_id')}"
+            + (f" ({item['selected_color']})" if item.get("selected_color") else "")
+            + (f" [{item['selected_size']}]" if item.get("selected_size") else "")
+            for item in items
+        ),
+    }
+
+
+def flatten_customer(customer: Dict[str, Any]) -> Dict[str, Any]:
+    """Customer row without credentials"""
+    address = customer.get("address") or {}
+    return {
+        "id": customer.get("id"),
+        "name": customer.get("name"),
+        "email": customer.get("email"),
+        "phone": customer.get("phone"),
+        "auth_provider": customer.get("auth_provider", "password"),
+        "address_street": address.get("street"),
+        "address_city": address.get("city"),
+        "address_postal_code": address.get("postal_code"),
+        "address_country": address.get("country"),
+        "created_at": customer.get("created_at"),
+    }
+
+
+def created_at_filter(date_from: Optional[str], date_to: Optional[str]) -> Dict[str, Any]:
+    """Storage query on ``created_at``; ISO prefix semantics, so ``to=2026-01-31`` includes the whole day"""
+    condition = {}
+    if date_from:
+        condition["$gte"] = date_from
+    if date_to:
+        condition["$lt"] = date_to + "\uffff"
+    return {"created_at": condition} if condition else {}
+
+
+def iter_json_array(file_path: Path, chunk_size: int = 64 * 1024) -> Iterator[Dict[str, Any]]:
+    """Yield the elements of a JSON array file without loading it whole"""
+    if not file_path.exists():
+        return
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r', encoding='utf-8') as f:
+        buffer = ""
+        started = False
+        eof = False
+        while True:
+            if not eof:
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+            buffer = buffer.lstrip()
+            if not started:
+                if not buffer:
+                    if eof:
+                        return
+                    continue
+                if buffer[0] != "[":
+                    raise ValueError(f"{file_path} is not a JSON array")
+                buffer = buffer[1:]
+                started = True
+                continue
+            if buffer.startswith(","):
+                buffer = buffer[1:].lstrip()
+            if buffer.startswith("]"):
+                return
+            try:
+                element, end = decoder.raw_decode(buffer)
+            except ValueError:
+                if eof:
+                    raise
+                # Element straddles the chunk boundary
+                continue
+            yield element
+            buffer = buffer[end:]
+
+
+def _flush(sink: io.StringIO) -> str:
+    value = sink.getvalue()
+    sink.seek(0)
+    sink.truncate(0)
+    return value
+
+
+def _csv_cell(value: Any) -> Any:
+    """Quote text a spreadsheet would run as a formula (names, notes and addresses come from customers)"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_line(writer: csv.DictWriter, sink: io.StringIO, row: Dict[str, Any]) -> str:
+    writer.writerow({key: _csv_cell(value) for key, value in row.items()})
+    return _flush(sink)
+
+
+async def stream_rows_async(rows: AsyncIterator[Dict[str, Any]], fmt: str, columns: List[str]) -> AsyncIterator[str]:
+    """Encode flattened rows as CSV (with header) or NDJSON, one line at a time"""
+    if fmt == "ndjson":
+        async for row in rows:
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+        return
+
+    sink = io.StringIO()
+    writer = csv.DictWriter(sink, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    yield _flush(sink)
+    async for row in rows:
+        yield _csv_line(writer, sink, row)
+
+
+async def export_rows(docs: AsyncIterator[Dict[str, Any]], flatten: Callable[[Dict[str, Any]], Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    """Flattened rows from a storage iterator"""
+    async for doc in docs:
+        yield flatten(doc)
+
+
+def export_filename(kind: str, fmt: str) -> str:
+    return f"{kind}-{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}.{fmt}"
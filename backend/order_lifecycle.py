@@ -0,0 +1,191 @@
+"""
+Order lifecycle: the statuses an order moves through and the transitions allowed between them.
+
+    pending -> confirmed -> processing -> shipped -> delivered
+    pending, confirmed, processing -> cancelled
+    confirmed, processing, shipped, delivered, cancelled -> refunded
+
+``OrderLifecycle.transition`` checks a change against ``TRANSITIONS`` and
+applies it with a write conditional on the status it checked, so two admins
+(or an admin and the expiry job) can't both move the same order. Every change,
+and every note an admin adds without one, is appended to the ``order_events``
+collection, which is never rewritten: an order's timeline is its events, and
+``OrderStatusCounts`` keeps the number of orders per status current by reading
+only the events it hasn't seen.
+
+Side effects (stock reservations, status emails, counters) are hooks
+registered with ``on``; a failing hook is logged and never undoes the
+transition.
+"""
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+ORDER_STATUSES = ["pending", "confirmed", "processing", "shipped", "delivered", "cancelled", "refunded"]
+
+TRANSITIONS: Dict[str, Set[str]] = {
+    "pending": {"confirmed", "cancelled"},
+    "confirmed": {"processing", "cancelled", "refunded"},
+    "processing": {"shipped", "cancelled", "refunded"},
+    "shipped": {"delivered", "refunded"},
+    "delivered": {"refunded"},
+    # A paid order can still be refunded after it was cancelled
+    "cancelled": {"refunded"},
+    "refunded": set(),
+}
+
+# Seconds between full recounts of OrderStatusCounts, healing any drift between workers
+ORDER_COUNTS_RESEED_SECONDS = float(os.getenv("ORDER_COUNTS_RESEED_SECONDS", "900"))
+
+Hook = Callable[[Dict[str, Any], Dict[str, Any]], Awaitable[None]]
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidTransitionError(ValueError):
+    """An order can't move from its current status to the requested one"""
+
+    def __init__(self, current: str, status: str):
+        allowed = sorted(TRANSITIONS.get(current, ()))
+        super().__init__(f"Cannot change order status from '{current}' to '{status}'"
+                         + (f". Allowed: {allowed}" if allowed else ""))
+        self.current = current
+        self.status = status
+
+
+def can_transition(current: str, status: str) -> bool:
+    return status in TRANSITIONS.get(current, ())
+
+
+def make_event(order: Dict[str, Any], previous: Optional[str], status: str, actor: str,
+               note: str = "", at: Optional[str] = None) -> Dict[str, Any]:
+    """An ``order_events`` document; ``previous`` is None for the order's creation"""
+    return {
+        "id": str(uuid.uuid4()),
+        "order_id": order["id"],
+        "order_number": order.get("order_number"),
+        "type": "created" if previous is None else "note" if previous == status else "status_changed",
+        "from": previous,
+        "to": status,
+        "note": note,
+        "actor": actor,
+        "at": at or datetime.now(timezone.utc).isoformat()
+    }
+
+
+class OrderLifecycle:
+    """Validated status changes of ``orders``, logged to ``events`` and followed by hooks"""
+
+    def __init__(self, orders, events):
+        self.orders = orders
+        self.events = events
+        self._hooks: List[tuple] = []
+
+    def on(self, hook: Hook, statuses: Optional[Iterable[str]] = None):
+        """Run ``hook(order, event)`` after changes into ``statuses`` (default: every change, and creation)"""
+        self._hooks.append((hook, set(statuses) if statuses is not None else None))
+
+    async def _notify(self, order: Dict[str, Any], event: Dict[str, Any]):
+        for hook, statuses in self._hooks:
+            if statuses is not None and event["to"] not in statuses:
+                continue
+            try:
+                await hook(order, event)
+            except Exception as e:
+                logger.error(f"Order {event['type']} hook {getattr(hook, '__name__', hook)} failed "
+                             f"for {order['id']}: {str(e)}")
+
+    async def created(self, order: Dict[str, Any], actor: str = "customer"):
+        """Log a newly inserted order"""
+        event = make_event(order, None, order.get("status", "pending"), actor, at=order.get("created_at"))
+        await self.events.insert(event)
+        await self._notify(order, event)
+
+    async def transition(self, order_id: str, status: str, actor: str = "system", note: str = "",
+                         fields: Optional[Dict[str, Any]] = None,
+                         expected: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        """Move an order to ``status``, setting ``fields`` with it; returns the updated order
+
+        ``status`` may be the current one, to add a note to the history.
+        Returns None if the order doesn't exist, or isn't in one of the
+        ``expected`` statuses (when given). Raises ``InvalidTransitionError``
+        if ``TRANSITIONS`` doesn't allow the change.
+        """
+        expected = set(expected) if expected is not None else None
+        # Each retry follows a change another writer made, and the statuses only move forward
+        while True:
+            current = await self.orders.get(order_id, fields=["status"])
+            if current is None:
+                return None
+            previous = current.get("status", "pending")
+            if expected is not None and previous not in expected:
+                return None
+            if status != previous and not can_transition(previous, status):
+                raise InvalidTransitionError(previous, status)
+            now = datetime.now(timezone.utc).isoformat()
+            order = await self.orders.update_one(
+                {"id": order_id, "status": previous},
+                {"status": status, "updated_at": now, **(fields or {})},
+                prepend={"status_history": {"status": status, "updated_at": now, "note": note, "updated_by": actor}}
+            )
+            if order is not None:
+                break
+        event = make_event(order, previous, status, actor, note, at=now)
+        await self.events.insert(event)
+        if status != previous:
+            await self._notify(order, event)
+        return order
+
+    async def timeline(self, order_id: str) -> List[Dict[str, Any]]:
+        """An order's events, oldest first"""
+        return await self.events.find({"order_id": order_id}, sort=[("at", 1)])
+
+
+class OrderStatusCounts:
+    """Orders per status, kept current from the event log instead of recounting the orders
+
+    The first read (and one every ``ORDER_COUNTS_RESEED_SECONDS``) counts the
+    orders; later reads apply only the events logged since, so they see the
+    changes other workers made too.
+    """
+
+    def __init__(self, orders, events, reseed_seconds: float = ORDER_COUNTS_RESEED_SECONDS):
+        self.orders = orders
+        self.events = events
+        self.reseed_seconds = reseed_seconds
+        self._counts: Optional[Dict[str, int]] = None
+        self._seeded = 0.0
+        self._cursor = ""
+        # Events logged at exactly ``_cursor``, already applied
+        self._seen: Set[str] = set()
+
+    async def _seed(self):
+        latest = await self.events.find(sort=[("at", -1)], limit=1, fields=["at"])
+        self._cursor, self._seen = "", set()
+        if latest:
+            self._cursor = latest[0]["at"]
+            self._seen = {event["id"] for event in await self.events.find({"at": self._cursor}, fields=["id"])}
+        self._counts = {status: await self.orders.count({"status": status}) for status in ORDER_STATUSES}
+        self._seeded = time.monotonic()
+
+    def _apply(self, event: Dict[str, Any]):
+        if event.get("from") is not None:
+            self._counts[event["from"]] = self._counts.get(event["from"], 0) - 1
+        self._counts[event["to"]] = self._counts.get(event["to"], 0) + 1
+
+    async def get(self) -> Dict[str, int]:
+        if self._counts is None or time.monotonic() - self._seeded > self.reseed_seconds:
+            await self._seed()
+            return dict(self._counts)
+        query = {"at": {"$gte": self._cursor}} if self._cursor else None
+        for event in await self.events.find(query, sort=[("at", 1)]):
+            if event["id"] in self._seen:
+                continue
+            if event["at"] != self._cursor:
+                self._cursor, self._seen = event["at"], set()
+            self._seen.add(event["id"])
+            self._apply(event)
+        return dict(self._counts)
@@ -0,0 +1,132 @@
+"""
+Print-queue scheduler that turns confirmed orders into a print plan.
+
+Order items are expanded into print jobs whose duration is estimated from the
+product's ``print_time_minutes`` (scaled by the selected size's
+``print_time_multiplier``). Jobs sharing a filament color are batched so a
+printer changes filament as rarely as possible, and batches are packed onto
+the printers longest-first onto the least loaded printer (LPT). Batches that
+are longer than an even share of the work are split so one color cannot pin
+the whole makespan to a single printer.
+"""
+import heapq
+import os
+from typing import List, Dict, Any, Optional
+
+DEFAULT_PRINT_MINUTES = float(os.getenv("DEFAULT_PRINT_MINUTES", "60"))
+COLOR_CHANGE_MINUTES = float(os.getenv("COLOR_CHANGE_MINUTES", "10"))
+PRINT_QUEUE_STATUSES = ["confirmed"]
+
+
+def estimate_print_minutes(product: Optional[Dict[str, Any]], item: Dict[str, Any]) -> float:
+    """Estimated minutes to print one unit of an order item"""
+    minutes = DEFAULT_PRINT_MINUTES
+    if product and product.get("print_time_minutes"):
+        minutes = float(product["print_time_minutes"])
+
+    if product and item.get("selected_size"):
+        size = next((s for s in product.get("sizes", []) if s.get("name") == item["selected_size"]), None)
+        if size and size.get("print_time_multiplier"):
+            minutes *= float(size["print_time_multiplier"])
+
+    return minutes
+
+
+def build_print_jobs(orders: List[Dict[str, Any]], products: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Expand order items into print jobs (one per item line)"""
+    jobs = []
+    for order in orders:
+        for item in order.get("items", []):
+            product = products.get(item.get("product_id"))
+            quantity = int(item.get("quantity", 1) or 1)
+            unit_minutes = estimate_print_minutes(product, item)
+            jobs.append({
+                "order_id": order["id"],
+                "order_number": order.get("order_number"),
+                "product_id": item.get("product_id"),
+                "product_name": item.get("product_name") or item.get("product_name_pt") or (product or {}).get("name_pt", ""),
+                "color": item.get("selected_color") or "",
+                "size": item.get("selected_size"),
+                "quantity": quantity,
+                "minutes": round(unit_minutes * quantity, 2),
+                "created_at": order.get("created_at", "")
+            })
+    return jobs
+
+
+def _color_batches(jobs: List[Dict[str, Any]], max_minutes: float) -> List[Dict[str, Any]]:
+    """Group jobs by color, splitting a color into several batches above ``max_minutes``"""
+    by_color: Dict[str, List[Dict[str, Any]]] = {}
+    for job in jobs:
+        by_color.setdefault(job["color"], []).append(job)
+
+    batches = []
+    for color, color_jobs in by_color.items():
+        # Oldest orders first inside a batch
+        color_jobs.sort(key=lambda j: j["created_at"])
+        current = {"color": color, "jobs": [], "minutes": 0.0}
+        for job in color_jobs:
+            if current["jobs"] and current["minutes"] + job["minutes"] > max_minutes:
+                batches.append(current)
+                current = {"color": color, "jobs": [], "minutes": 0.0}
+            current["jobs"].append(job)
+            current["minutes"] += job["minutes"]
+        if current["jobs"]:
+            batches.append(current)
+    return batches
+
+
+def schedule_print_jobs(jobs: List[Dict[str, Any]], printers: int = 1,
+                        color_change_minutes: float = COLOR_CHANGE_MINUTES) -> Dict[str, Any]:
+    """Bin-pack color batches onto ``printers`` printers and report the makespan"""
+    printers = max(1, printers)
+    total_minutes = sum(job["minutes"] for job in jobs)
+    target = max(total_minutes / printers, max((job["minutes"] for job in jobs), default=0.0))
+    batches = _color_batches(jobs, target)
+    batches.sort(key=lambda b: b["minutes"], reverse=True)
+
+    plan = [{"printer": i + 1, "jobs": [], "color": None, "color_changes": 0, "busy_minutes": 0.0}
+            for i in range(printers)]
+    heap = [(0.0, i) for i in range(printers)]
+
+    for batch in batches:
+        # Prefer the least loaded printer; break ties with one already loaded with this color
+        load, index = heapq.heappop(heap)
+        tied = []
+        while heap and heap[0][0] == load:
+            tied.append(heapq.heappop(heap))
+        candidates = [(load, index)] + tied
+        chosen = next((c for c in candidates if plan[c[1]]["color"] == batch["color"]), candidates[0])
+        for candidate in candidates:
+            if candidate != chosen:
+                heapq.heappush(heap, candidate)
+
+        load, index = chosen
+        printer = plan[index]
+        if printer["color"] is not None and printer["color"] != batch["color"]:
+            load += color_change_minutes
+            printer["color_changes"] += 1
+        printer["color"] = batch["color"]
+        for job in batch["jobs"]:
+            printer["jobs"].append({**job, "start_minute": round(load, 2), "end_minute": round(load + job["minutes"], 2)})
+            load += job["minutes"]
+        printer["busy_minutes"] = round(load, 2)
+        heapq.heappush(heap, (load, index))
+
+    for printer in plan:
+        printer.pop("color")
+
+    return {
+        "printers": plan,
+        "printer_count": printers,
+        "job_count": len(jobs),
+        "total_print_minutes": round(total_minutes, 2),
+        "color_changes": sum(p["color_changes"] for p in plan),
+        "makespan_minutes": max((p["busy_minutes"] for p in plan), default=0.0)
+    }
+
+
+def build_print_plan(orders: List[Dict[str, Any]], products: List[Dict[str, Any]], printers: int = 1) -> Dict[str, Any]:
+    """Print plan for the given orders"""
+    product_map = {p["id"]: p for p in products}
+    return schedule_print_jobs(build_print_jobs(orders, product_map), printers)
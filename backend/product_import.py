@@ -0,0 +1,154 @@
+"""
+Streaming bulk product import from CSV or NDJSON uploads.
+
+The upload is read line by line, every row is validated with the server's
+``ProductCreate`` model and ``validate_product_data`` against a category id
+set loaded once, and valid documents are handed out in batches so the caller
+can persist each batch with a single write.
+"""
+import csv
+import io
+import json
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+from validation import validate_product_data
+
+IMPORT_FORMATS = ("csv", "ndjson")
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+JSON_FIELDS = ("colors", "sizes", "customization_options", "variant_stock")
+BOOL_FIELDS = ("featured", "active")
+FLOAT_FIELDS = ("base_price", "print_time_minutes")
+INT_FIELDS = ("stock",)
+
+
+def detect_format(filename: Optional[str], requested: Optional[str] = None) -> Optional[str]:
+    """Import format from the explicit parameter or the file extension"""
+    if requested:
+        return requested if requested in IMPORT_FORMATS else None
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return None
+
+
+def _coerce_csv_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """CSV cells are strings; turn them into the types ProductCreate expects"""
+    product = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        key = key.strip()
+        value = value.strip() if isinstance(value, str) else value
+        if value in ("", None):
+            continue
+        if key in JSON_FIELDS:
+            product[key] = json.loads(value)
+        elif key == "images":
+            product[key] = json.loads(value) if value.startswith("[") else [v.strip() for v in value.split(";") if v.strip()]
+        elif key in BOOL_FIELDS:
+            product[key] = value.lower() in ("1", "true", "yes", "sim")
+        elif key in FLOAT_FIELDS:
+            product[key] = float(value.replace(",", "."))
+        elif key in INT_FIELDS:
+            product[key] = int(value)
+        else:
+            product[key] = value
+    return product
+
+
+def iter_upload_rows(binary_file, fmt: str) -> Iterator[Tuple[int, Any]]:
+    """Yield (row number, raw product dict or exception) without reading the whole upload"""
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(text)
+            for row in reader:
+                try:
+                    yield reader.line_num, _coerce_csv_row(row)
+                except ValueError as e:
+                    yield reader.line_num, e
+        else:
+            for line_number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                    if not isinstance(row, dict):
+                        raise ValueError("Row must be a JSON object")
+                    yield line_number, row
+                except ValueError as e:
+                    yield line_number, e
+    finally:
+        # Leave the underlying upload open for FastAPI to clean up
+        text.detach()
+
+
+def validate_import_row(raw: Dict[str, Any], model: Type[BaseModel], category_ids: Set[str]) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """Validated product document ready to store, or the row's errors"""
+    try:
+        product = model(**raw).model_dump()
+    except ValidationError as e:
+        return None, [f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()]
+
+    validation = validate_product_data(product)
+    errors = list(validation['errors'])
+    if product.get("category_id") and product["category_id"] not in category_ids:
+        errors.append(f"Category {product['category_id']} does not exist")
+    if errors:
+        return None, errors
+
+    return {
+        "id": str(uuid.uuid4()),
+        **product,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }, []
+
+
+class ImportReport:
+    """Per-row outcome of a bulk import"""
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def add_error(self, row: int, errors: List[str]):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "errors": errors})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors)
+        }
+
+
+def iter_import_batches(rows: Iterable[Tuple[int, Any]], model: Type[BaseModel], category_ids: Set[str],
+                        report: ImportReport, batch_size: int = IMPORT_BATCH_SIZE) -> Iterator[List[Tuple[int, Dict[str, Any]]]]:
+    """Validate rows and yield batches of (row number, document); invalid rows go to the report"""
+    batch = []
+    for row_number, raw in rows:
+        if isinstance(raw, Exception):
+            report.add_error(row_number, [f"Could not parse row: {raw}"])
+            continue
+        doc, errors = validate_import_row(raw, model, category_ids)
+        if errors:
+            report.add_error(row_number, errors)
+            continue
+        batch.append((row_number, doc))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
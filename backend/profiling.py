@@ -0,0 +1,248 @@
+"""
+Slow-request logging and on-demand request profiling.
+
+Handlers wrap the expensive parts of a request in ``span("auth")``,
+``span("storage.read")`` and so on. Spans are collected per request through a
+context variable; when a request takes longer than ``SLOW_REQUEST_MS`` its span
+breakdown is logged as one JSON line on the ``pulgax.slow`` logger, with time
+outside any span reported as ``untracked_ms``.
+
+An admin can send ``X-Profile: 1`` with their bearer token to run that request
+under a sampling profiler (pyinstrument, from requirements.txt; cProfile when
+it is missing). The result is written to ``PROFILE_DIR`` and its file name
+returned in the ``X-Profile-File`` response header: a speedscope flamegraph
+from pyinstrument, or a pstats dump viewable with snakeviz/flameprof from
+cProfile. Only one request is profiled at a time. pyinstrument follows just
+that request's task across awaits; cProfile records the whole event loop
+thread, so its dump also holds whatever other requests ran meanwhile.
+"""
+import contextvars
+import cProfile
+import functools
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+try:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:  # pragma: no cover - falls back to cProfile
+    Profiler = None
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "profiles"))
+PROFILE_HEADER = b"x-profile"
+
+logger = logging.getLogger("pulgax.slow")
+
+_trace: contextvars.ContextVar[Optional["RequestTrace"]] = contextvars.ContextVar("request_trace", default=None)
+_profiling = False
+
+
+class RequestTrace:
+    """Span timings of one request, summed by span name"""
+
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.spans: Dict[str, List[float]] = {}
+
+    def add(self, name: str, elapsed: float):
+        entry = self.spans.setdefault(name, [0.0, 0])
+        entry[0] += elapsed
+        entry[1] += 1
+
+    def summary(self, status: int) -> Dict:
+        duration = time.perf_counter() - self.started
+        tracked = sum(total for total, _ in self.spans.values())
+        return {
+            "event": "slow_request",
+            "request_id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": status,
+            "duration_ms": round(duration * 1000, 2),
+            "spans": {name: {"ms": round(total * 1000, 2), "count": count}
+                      for name, (total, count) in sorted(self.spans.items(), key=lambda kv: -kv[1][0])},
+            # Nested spans make this negative; it is a hint, not an invariant
+            "untracked_ms": round((duration - tracked) * 1000, 2)
+        }
+
+
+def record_span(name: str, started: float):
+    """Add the time since ``started`` (perf_counter) to the current request's trace"""
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(name, time.perf_counter() - started)
+
+
+@contextmanager
+def span(name: str):
+    """Time a block into the current request's trace (no-op outside a request)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, started)
+
+
+def traced(name: str):
+    """Decorator timing every call of a synchronous function as span ``name``"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _RequestProfiler:
+    """pyinstrument scoped to the request's task, or cProfile over the whole thread (other requests included)"""
+
+    def __init__(self):
+        self.suffix = ".speedscope.json" if Profiler is not None else ".prof"
+        self._profiler = Profiler(async_mode="enabled") if Profiler is not None else cProfile.Profile()
+
+    def start(self):
+        if Profiler is not None:
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if Profiler is not None:
+            self._profiler.stop()
+            path.write_text(self._profiler.output(renderer=SpeedscopeRenderer()), encoding="utf-8")
+        else:
+            self._profiler.disable()
+            self._profiler.dump_stats(str(path))
+
+
+class ProfilingMiddleware:
+    """ASGI middleware logging slow requests and profiling admin-flagged ones
+
+    ``authorize`` receives the bearer token of a request carrying ``X-Profile``
+    and returns whether it belongs to an admin.
+    """
+
+    def __init__(self, app, authorize: Callable[[str], Awaitable[bool]],
+                 threshold_ms: float = SLOW_REQUEST_MS, profile_dir: Path = PROFILE_DIR):
+        self.app = app
+        self.authorize = authorize
+        self.threshold = threshold_ms / 1000
+        self.profile_dir = profile_dir
+
+    async def _profile_requested(self, scope) -> bool:
+        headers = dict(scope.get("headers", []))
+        if headers.get(PROFILE_HEADER, b"").strip() not in (b"1", b"true"):
+            return False
+        scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return False
+        try:
+            return await self.authorize(token)
+        except Exception:
+            return False
+
+    async def __call__(self, scope, receive, send):
+        global _profiling
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(scope["method"], scope["path"])
+        token = _trace.set(trace)
+        status = 500
+        # Event streams stay open by design; their duration says nothing about speed
+        event_stream = False
+
+        # One profiled request at a time; the interpreter allows a single active profiler
+        profiler = None
+        # Checked again after the await: another flagged request may have started meanwhile
+        if not _profiling and await self._profile_requested(scope) and not _profiling:
+            _profiling = True
+            profiler = _RequestProfiler()
+            profile_path = self.profile_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{trace.id}{profiler.suffix}"
+
+        async def send_wrapper(message):
+            nonlocal status, event_stream
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                event_stream = any(name == b"content-type" and value.startswith(b"text/event-stream")
+                                   for name, value in headers)
+                headers.append((b"x-request-id", trace.id.encode()))
+                if profiler is not None:
+                    headers.append((b"x-profile-file", profile_path.name.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            if profiler is not None:
+                profiler.start()
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profiler is not None:
+                try:
+                    profiler.stop(profile_path)
+                    logger.info(json.dumps({"event": "request_profile", "request_id": trace.id,
+                                            "path": trace.path, "file": str(profile_path)}))
+                except Exception as e:
+                    logger.error(f"Failed to write request profile: {e}")
+                finally:
+                    _profiling = False
+            if not event_stream and time.perf_counter() - trace.started >= self.threshold:
+                logger.warning(json.dumps(trace.summary(status)))
+            _trace.reset(token)
+
+
+def _slow_query_listener():
+    from pymongo import monitoring
+
+    class SlowQueryListener(monitoring.CommandListener):
+        """pymongo listener logging commands slower than ``SLOW_QUERY_MS``"""
+
+        def __init__(self, threshold_ms: float = SLOW_QUERY_MS):
+            self.threshold_micros = threshold_ms * 1000
+
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            if event.duration_micros >= self.threshold_micros:
+                self._log(event, "ok")
+
+        def failed(self, event):
+            if event.duration_micros >= self.threshold_micros:
+                self._log(event, "failed")
+
+        @staticmethod
+        def _log(event, outcome: str):
+            logger.warning(json.dumps({
+                "event": "slow_query",
+                "command": event.command_name,
+                "database": event.database_name,
+                "duration_ms": round(event.duration_micros / 1000, 2),
+                "outcome": outcome,
+                "mongo_request_id": event.request_id
+            }))
+
+    return SlowQueryListener
+
+
+def __getattr__(name):
+    # The listener subclasses a pymongo class, so it is defined when the Mongo backend first asks for it
+    if name == "SlowQueryListener":
+        globals()[name] = _slow_query_listener()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
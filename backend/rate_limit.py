@@ -0,0 +1,272 @@
+"""
+Token-bucket rate limiting for abuse-prone routes.
+
+Each rule allows ``limit`` requests per ``period`` seconds per principal, as
+a token bucket of capacity ``limit`` refilled at ``limit / period`` tokens per
+second. A principal is the client IP or the account the request acts for:
+the email in a login/contact/order body, or the subject of a bearer token.
+Throttled requests get ``429`` with ``Retry-After``.
+
+Buckets live in ``MemoryBucketStore``: a sharded dict of compact
+``[tokens, updated, rate, capacity]`` lists refilled lazily on access, with idle (full) buckets swept periodically.
+``MongoBucketStore`` keeps buckets in a ``rate_limits`` collection so several
+workers share the same limits; it fails open to a memory store if Mongo errors.
+
+Limits are overridden per rule with ``RATE_LIMIT_<RULE>``, e.g.
+``RATE_LIMIT_ADMIN_LOGIN="ip=20/60,account=5/300"``; ``RATE_LIMIT_ENABLED=false``
+turns limiting off.
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from metrics import REGISTRY, Counter
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() not in ("0", "false", "no")
+# Number of reverse proxies in front of the app whose X-Forwarded-For entries are trusted
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+EVICT_INTERVAL = 60.0
+MAX_BODY_BYTES = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+rate_limited_total = REGISTRY.register(Counter(
+    "rate_limited_total", "Requests rejected by rate limiting", ("rule", "principal")))
+
+
+@dataclass(frozen=True)
+class Limit:
+    principal: str  # "ip" or "account"
+    limit: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.limit / self.period
+
+
+@dataclass
+class Rule:
+    name: str
+    method: str
+    path: str
+    limits: List[Limit]
+    # JSON body field naming the account; bearer-token subject is used when absent
+    account_field: Optional[str] = None
+    uses_account: bool = field(init=False)
+
+    def __post_init__(self):
+        self.uses_account = any(limit.principal == "account" for limit in self.limits)
+
+
+def parse_limits(spec: str) -> List[Limit]:
+    """Parse ``"ip=10/60,account=5/60"`` into limits"""
+    limits = []
+    for part in spec.split(","):
+        principal, _, value = part.strip().partition("=")
+        count, _, period = value.partition("/")
+        if principal not in ("ip", "account") or not count:
+            raise ValueError(f"Invalid rate limit '{part}'")
+        limits.append(Limit(principal, int(count), float(period or 60)))
+    return limits
+
+
+def _rule(name: str, method: str, path: str, default: str, account_field: Optional[str] = None) -> Rule:
+    spec = os.getenv(f"RATE_LIMIT_{name.upper()}", default)
+    return Rule(name, method, path, parse_limits(spec), account_field)
+
+
+def default_rules() -> List[Rule]:
+    return [
+        _rule("admin_login", "POST", "/api/admin/login", "ip=20/60,account=5/60", "email"),
+        _rule("customer_login", "POST", "/api/customer/login", "ip=20/60,account=5/60", "email"),
+        _rule("customer_register", "POST", "/api/customer/register", "ip=5/60"),
+        _rule("contact", "POST", "/api/contact", "ip=5/60,account=3/300", "email"),
+        _rule("orders", "POST", "/api/orders", "ip=30/60,account=10/60", "customer_email"),
+    ]
+
+
+class MemoryBucketStore:
+    """Sharded in-process token buckets with lazy refill and periodic eviction"""
+
+    def __init__(self, shards: int = 32):
+        self._shards: List[Dict[str, List[float]]] = [{} for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._swept = [time.monotonic()] * shards
+
+    def _take(self, key: str, limit: Limit, cost: float = 1.0) -> Tuple[bool, float]:
+        index = hash(key) % len(self._shards)
+        shard = self._shards[index]
+        now = time.monotonic()
+        with self._locks[index]:
+            if now - self._swept[index] >= EVICT_INTERVAL:
+                self._sweep(shard, now)
+                self._swept[index] = now
+            bucket = shard.get(key)
+            if bucket is None:
+                bucket = shard[key] = [float(limit.limit), now, limit.rate, float(limit.limit)]
+            else:
+                bucket[0] = min(bucket[3], bucket[0] + (now - bucket[1]) * bucket[2])
+                bucket[1] = now
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return True, 0.0
+            return False, (cost - bucket[0]) / bucket[2]
+
+    @staticmethod
+    def _sweep(shard: Dict[str, List[float]], now: float):
+        # A bucket that would have refilled completely is equivalent to no bucket
+        for key in [k for k, (tokens, updated, rate, capacity) in shard.items()
+                    if tokens + (now - updated) * rate >= capacity]:
+            del shard[key]
+
+    async def take(self, key: str, limit: Limit, cost: float = 1.0) -> Tuple[bool, float]:
+        return self._take(key, limit, cost)
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+
+class MongoBucketStore:
+    """Token buckets shared between workers, updated atomically in MongoDB"""
+
+    def __init__(self, db, fallback: Optional[MemoryBucketStore] = None):
+        self.collection = db.rate_limits
+        self.fallback = fallback or MemoryBucketStore()
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def take(self, key: str, limit: Limit, cost: float = 1.0) -> Tuple[bool, float]:
+        from pymongo import ReturnDocument
+
+        now = datetime.now(timezone.utc)
+        refilled = {"$min": [limit.limit, {"$add": [
+            {"$ifNull": ["$tokens", limit.limit]},
+            {"$multiply": [{"$divide": [{"$subtract": [now, {"$ifNull": ["$updated", now]}]}, 1000]}, limit.rate]}
+        ]}]}
+        pipeline = [
+            {"$set": {"tokens": refilled, "updated": now}},
+            {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+            {"$set": {
+                "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]},
+                "expires_at": now + timedelta(seconds=limit.period)
+            }}
+        ]
+        try:
+            bucket = await self.collection.find_one_and_update(
+                {"_id": key}, pipeline, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            logger.error(f"Rate limit store unavailable, using local buckets: {str(e)}")
+            return await self.fallback.take(key, limit, cost)
+        if bucket["allowed"]:
+            return True, 0.0
+        return False, (cost - bucket["tokens"]) / limit.rate
+
+
+def client_ip(scope, trusted_hops: int = TRUSTED_PROXY_HOPS) -> str:
+    if trusted_hops > 0:
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                hops = [hop.strip() for hop in value.decode("latin-1").split(",") if hop.strip()]
+                if hops:
+                    return hops[-min(trusted_hops, len(hops))]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying token-bucket ``rules`` before the request reaches a route
+
+    ``token_subject`` maps a bearer token to its account id (or None) for rules
+    whose account is not named in the request body.
+    """
+
+    def __init__(self, app, store=None, rules: Optional[List[Rule]] = None,
+                 token_subject: Optional[Callable[[str], Optional[str]]] = None,
+                 enabled: bool = RATE_LIMIT_ENABLED):
+        self.app = app
+        self.store = store or MemoryBucketStore()
+        self.rules = {(rule.method, rule.path): rule for rule in (rules if rules is not None else default_rules())}
+        self.token_subject = token_subject
+        self.enabled = enabled
+
+    async def _account(self, scope, receive, rule: Rule):
+        """Account principal and a ``receive`` that replays any body read to find it"""
+        headers = dict(scope.get("headers", []))
+        if rule.account_field and headers.get(b"content-type", b"").startswith(b"application/json"):
+            chunks, size, more = [], 0, True
+            while more and size <= MAX_BODY_BYTES:
+                message = await receive()
+                if message["type"] != "http.request":
+                    break
+                chunks.append(message.get("body", b""))
+                size += len(chunks[-1])
+                more = message.get("more_body", False)
+            body = b"".join(chunks)
+            replayed = False
+
+            async def replay():
+                nonlocal replayed
+                if not replayed:
+                    replayed = True
+                    return {"type": "http.request", "body": body, "more_body": more}
+                return await receive()
+
+            account = None
+            if not more:
+                try:
+                    value = json.loads(body).get(rule.account_field)
+                    account = value.strip().lower() if isinstance(value, str) and value.strip() else None
+                except (ValueError, AttributeError):
+                    account = None
+            if account:
+                return account, replay
+            receive = replay
+
+        scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+        if self.token_subject and scheme.lower() == "bearer" and token:
+            try:
+                return self.token_subject(token), receive
+            except Exception:
+                pass
+        return None, receive
+
+    async def __call__(self, scope, receive, send):
+        rule = self.rules.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if rule is None or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        principals = {"ip": client_ip(scope)}
+        if rule.uses_account:
+            principals["account"], receive = await self._account(scope, receive, rule)
+
+        retry_after = 0.0
+        for limit in rule.limits:
+            principal = principals.get(limit.principal)
+            if principal is None:
+                continue
+            allowed, wait = await self.store.take(f"{rule.name}:{limit.principal}:{principal}", limit)
+            if not allowed:
+                rate_limited_total.inc(rule=rule.name, principal=limit.principal)
+                retry_after = max(retry_after, wait)
+
+        if retry_after > 0:
+            response = JSONResponse(
+                {"detail": "Too many requests, please try again later"},
+                status_code=429,
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -0,0 +1,70 @@
+"""
+Fast JSON serialization for persisted files and hot API responses.
+
+Uses orjson when it is installed and falls back to the standard library, so
+the servers keep working in minimal environments. Documents that were
+validated on write are projected onto a response model's fields directly
+instead of being re-validated by constructing the Pydantic model.
+"""
+import copy
+import json
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Type
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson
+    orjson = None
+
+
+def dumps(data: Any, indent: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(data, indent=2 if indent else None, ensure_ascii=False,
+                      separators=None if indent else (",", ":")).encode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    """Parse JSON from bytes or str"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when available (FastAPI's ORJSONResponse otherwise requires it)"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+@lru_cache(maxsize=None)
+def _model_fields(model: Type[BaseModel]):
+    fields = []
+    for name, field in model.model_fields.items():
+        if field.default_factory is not None:
+            fields.append((name, True, field.default_factory))
+        else:
+            fields.append((name, False, None if field.is_required() else field.default))
+    return tuple(fields)
+
+
+def project(doc: Dict[str, Any], model: Type[BaseModel]) -> Dict[str, Any]:
+    """Keep only ``model``'s fields of an already-validated document, filling defaults"""
+    result = {}
+    for name, factory, default in _model_fields(model):
+        if name in doc:
+            result[name] = doc[name]
+        elif factory:
+            result[name] = default()
+        else:
+            result[name] = copy.copy(default) if isinstance(default, (dict, list)) else default
+    return result
+
+
+def project_many(docs: Iterable[Dict[str, Any]], model: Type[BaseModel]) -> List[Dict[str, Any]]:
+    return [project(doc, model) for doc in docs]
@@ -1,18 +1,46 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Query, Request
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr
 from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timezone
-import jwt
 import bcrypt
 import base64
+from email_service import send_order_status_email, send_order_confirmation_email, retry_failed_emails, failed_emails
+from validation import validate_product_data, validate_dataset
+from order_export import (
+    EXPORT_FORMATS, ORDER_COLUMNS, CUSTOMER_COLUMNS, flatten_order, flatten_customer,
+    export_filename, export_rows, created_at_filter, stream_rows_async
+)
+from product_import import (
+    ImportReport, detect_format, iter_upload_rows, iter_import_batches, IMPORT_FORMATS
+)
+from serialization import dumps, project, project_many, FastJSONResponse
+from compression import CompressionMiddleware, CatalogCache
+from catalog_views import resolve_language, localize, localized_views, language_fields
+from metrics import (MetricsMiddleware, metrics_response, monitor_event_loop, orders_created_total, login_failures_total,
+                     contact_quarantined_total)
+from profiling import ProfilingMiddleware, span
+from rate_limit import RateLimitMiddleware, client_ip
+from auth_tokens import TokenService, TokenError, principal_claims
+from print_queue import build_print_plan, PRINT_QUEUE_STATUSES
+from inventory import InsufficientStockError, reservation_lines, reservation_expiry, RESERVATION_SWEEP_SECONDS
+from jobs import (Scheduler, days_ago, PENDING_ORDER_DAYS, CONTACT_ARCHIVE_DAYS, CONTACT_RETENTION_DAYS,
+                  CONTACT_QUARANTINE_DAYS, EMAIL_RETRY_SECONDS)
+from order_lifecycle import OrderLifecycle, OrderStatusCounts, InvalidTransitionError, ORDER_STATUSES
+from admin_feed import AdminEventBus, AdminFeedFollower, sse_stream, order_event, message_event
+from contact_inbox import inbox_page, search_segment, archive_messages, drop_archive_segments
+from contact_screening import ContactScreen
+from storage import DuplicateKeyError, UnitOfWorkMiddleware, create_storage
+from shutdown import DrainMiddleware, ShutdownDrain, SHUTDOWN_TIMEOUT_SECONDS
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -24,19 +52,21 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# MongoDB connection
-mongo_url = os.environ.get('MONGODB_URI', os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
-client = AsyncIOMotorClient(mongo_url)
-db_name = os.environ.get('DB_NAME', 'pulgax_3d_store')
-db = client[db_name]
+# Storage: STORAGE_BACKEND=mongo (MONGODB_URI/MONGO_URL, DB_NAME), sqlite (SQLITE_PATH) or json (DATA_DIR)
+catalog_cache = CatalogCache()
+storage = create_storage(on_change=catalog_cache.invalidate)
+stock_ledger = storage.ledger
+order_lifecycle = OrderLifecycle(storage.orders, storage.order_events)
+order_status_counts = OrderStatusCounts(storage.orders, storage.order_events)
+admin_feed = AdminEventBus()
+admin_feed_follower = AdminFeedFollower(admin_feed, storage)
+contact_screen = ContactScreen([storage.messages, storage.message_quarantine])
+shutdown_drain = ShutdownDrain()
 
 # JWT Settings
 JWT_SECRET = os.environ.get('JWT_SECRET', 'pulgax-3d-store-secret-key-2024')
 JWT_ALGORITHM = "HS256"
 
-# Create the main app
-app = FastAPI()
-
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
@@ -62,9 +92,23 @@ class AdminResponse(BaseModel):
 
 class TokenResponse(BaseModel):
     access_token: str
+    refresh_token: Optional[str] = None
     token_type: str = "bearer"
+    expires_in: Optional[int] = None
     admin: AdminResponse
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
+class AccessTokenResponse(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+    expires_in: int
+
 class CategoryCreate(BaseModel):
     name_pt: str
     name_en: str
@@ -82,23 +126,6 @@ class CategoryResponse(BaseModel):
     image_url: str
     created_at: str
 
-class ProductColor(BaseModel):
-    name_pt: str
-    name_en: str
-    hex_code: str
-    image_url: str
-
-class ProductSize(BaseModel):
-    name: str
-    price_adjustment: float = 0.0
-
-class CustomizationOption(BaseModel):
-    name_pt: str
-    name_en: str
-    type: str  # "text", "number"
-    required: bool = False
-    max_length: Optional[int] = None
-
 class ProductCreate(BaseModel):
     name_pt: str
     name_en: str
@@ -106,12 +133,15 @@ class ProductCreate(BaseModel):
     description_en: str
     base_price: float
     category_id: str
-    colors: List[ProductColor] = []
-    sizes: List[ProductSize] = []
-    customization_options: List[CustomizationOption] = []
+    colors: List[Dict[str, Any]] = []
+    sizes: List[Dict[str, Any]] = []
+    customization_options: List[Dict[str, Any]] = []
     images: List[str] = []
     featured: bool = False
     active: bool = True
+    stock: Optional[int] = None
+    variant_stock: Dict[str, int] = {}
+    print_time_minutes: Optional[float] = None
 
 class ProductResponse(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -128,6 +158,9 @@ class ProductResponse(BaseModel):
     images: List[str]
     featured: bool
     active: bool
+    stock: Optional[int] = None
+    variant_stock: Dict[str, int] = {}
+    print_time_minutes: Optional[float] = None
     created_at: str
 
 class CartItem(BaseModel):
@@ -141,7 +174,6 @@ class OrderCreate(BaseModel):
     customer_name: str
     customer_email: EmailStr
     customer_phone: Optional[str] = ""
-    customer_id: Optional[str] = None
     shipping_address: str
     payment_method: str
     payment_details: Optional[Dict[str, Any]] = {}
@@ -155,21 +187,17 @@ class OrderResponse(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str
     order_number: str
-    customer_name: str
-    customer_email: str
-    customer_phone: str
     customer_id: Optional[str] = None
-    shipping_address: str
-    payment_method: str
-    payment_details: Optional[Dict[str, Any]] = {}
-    shipping_method: Optional[str] = None
-    shipping_cost: Optional[float] = 0.0
+    customer: Dict[str, Any]
+    shipping: Dict[str, Any]
+    payment: Dict[str, Any]
     items: List[Dict[str, Any]]
-    notes: str
-    total_amount: float
-    calculated_total: Optional[float] = None
+    totals: Dict[str, Any]
     status: str
+    status_history: List[Dict[str, Any]] = []
+    refund: Optional[Dict[str, Any]] = None
     created_at: str
+    updated_at: Optional[str] = None
 
 # Customer models
 class CustomerCreate(BaseModel):
@@ -177,6 +205,7 @@ class CustomerCreate(BaseModel):
     email: EmailStr
     password: str
     phone: Optional[str] = ""
+    address: Optional[Dict[str, str]] = {}
 
 class CustomerLogin(BaseModel):
     email: EmailStr
@@ -187,14 +216,26 @@ class CustomerResponse(BaseModel):
     id: str
     name: str
     email: str
-    phone: str
+    phone: str = ""
+    address: Dict[str, str] = {}
     created_at: str
 
 class CustomerTokenResponse(BaseModel):
     access_token: str
+    refresh_token: Optional[str] = None
     token_type: str = "bearer"
+    expires_in: Optional[int] = None
     customer: CustomerResponse
 
+class CustomerAddressUpdate(BaseModel):
+    street: str
+    city: str
+    postal_code: str
+    country: str = "Portugal"
+
+class GoogleAuthRequest(BaseModel):
+    credential: str
+
 class ContactMessage(BaseModel):
     name: str
     email: EmailStr
@@ -213,308 +254,528 @@ class ContactResponse(BaseModel):
     read: bool
     created_at: str
 
+class QuarantinedContactResponse(ContactResponse):
+    quarantine: Dict[str, Any]
+
+class ContactArchiveSegment(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    archived_at: str
+    first_created_at: str
+    last_created_at: str
+    count: int
+    size: int
+
 # ============== HELPER FUNCTIONS ==============
 
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    with span("auth"):
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    with span("auth"):
+        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
-def create_token(admin_id: str) -> str:
-    payload = {
-        "sub": admin_id,
-        "exp": datetime.now(timezone.utc).timestamp() + 86400 * 7  # 7 days
-    }
-    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+token_service = TokenService(JWT_SECRET, JWT_ALGORITHM, storage.refresh_tokens)
 
-async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def issue_tokens(role: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Access and refresh tokens for an admin or customer document"""
+    return await token_service.issue(principal_claims(role, doc))
+
+def verify_token(token: str, role: str) -> Dict[str, Any]:
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        admin_id = payload.get("sub")
-        admin = await db.admins.find_one({"id": admin_id}, {"_id": 0, "password": 0})
-        if not admin:
-            raise HTTPException(status_code=401, detail="Admin not found")
-        return admin
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        return token_service.verify(token, role)
+    except TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    # Identity comes from the token's claims; no storage read
+    claims = verify_token(credentials.credentials, "admin")
+    return {"id": claims["sub"], "email": claims["email"], "name": claims["name"]}
 
 async def get_current_customer(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        customer_id = payload.get("sub")
-        customer = await db.customers.find_one({"id": customer_id}, {"_id": 0, "password": 0})
-        if not customer:
-            raise HTTPException(status_code=401, detail="Customer not found")
-        return customer
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    claims = verify_token(credentials.credentials, "customer")
+    return {"id": claims["sub"], "email": claims["email"], "name": claims["name"]}
 
 async def get_optional_customer(credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))):
     if not credentials:
         return None
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        customer_id = payload.get("sub")
-        customer = await db.customers.find_one({"id": customer_id}, {"_id": 0, "password": 0})
-        return customer
-    except:
+        claims = token_service.verify(credentials.credentials, "customer")
+    except TokenError:
         return None
+    return {"id": claims["sub"], "email": claims["email"], "name": claims["name"]}
+
+def with_views(product_doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Store per-language projections alongside the product so reads can fetch one language"""
+    product_doc["views"] = localized_views(project(product_doc, ProductResponse))
+    return product_doc
+
+async def find_localized_products(query: Dict[str, Any], lang: str, limit: int = 500) -> List[Dict[str, Any]]:
+    docs = await storage.products.find(query, limit=limit, fields=language_fields(lang))
+
+    # Products written before views existed are projected on the fly
+    missing = [doc["id"] for doc in docs if lang not in doc.get("views", {})]
+    legacy = {}
+    if missing:
+        for product in await storage.products.find({"id": {"$in": missing}}, exclude=["views"]):
+            legacy[product["id"]] = localize(project(product, ProductResponse), lang)
+
+    products = []
+    for doc in docs:
+        view = doc.get("views", {}).get(lang) or legacy.get(doc["id"])
+        if view is not None:
+            products.append({**view, "stock": doc.get("stock"), "variant_stock": doc.get("variant_stock") or {}})
+    return products
+
+def catalog_vary(lang: Optional[str]) -> str:
+    """lang=auto responses differ per Accept-Language"""
+    return "Accept-Encoding, Accept-Language" if lang == "auto" else "Accept-Encoding"
+
+async def validate_product(product: ProductCreate):
+    validation = validate_product_data(product.model_dump())
+    if not validation['valid']:
+        raise HTTPException(status_code=400, detail=f"Validation errors: {', '.join(validation['errors'])}")
+    if not await storage.categories.get(product.category_id, fields=["id"]):
+        raise HTTPException(status_code=400, detail=f"Category {product.category_id} does not exist")
 
 def generate_order_number() -> str:
     return f"PX-{datetime.now(timezone.utc).strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
 
-async def validate_and_calculate_order(items: List[CartItem]) -> tuple[List[Dict[str, Any]], float]:
-    """Validate products and calculate total"""
+async def validate_and_calculate_order(items: List[CartItem]) -> tuple[List[Dict[str, Any]], float, float]:
+    """Validate products and calculate the subtotal and size/customization adjustments"""
+    # One read for every product in the cart
+    product_ids = list({item.product_id for item in items})
+    products = {
+        p["id"]: p for p in await storage.products.find(
+            {"id": {"$in": product_ids}, "active": {"$ne": False}}, exclude=["views"]
+        )
+    }
     validated_items = []
-    total = 0.0
-    
+    subtotal = 0.0
+    adjustments = 0.0
+
     for item in items:
-        # Get product from database
-        product = await db.products.find_one({"id": item.product_id, "active": True}, {"_id": 0})
+        product = products.get(item.product_id)
         if not product:
             raise HTTPException(status_code=400, detail=f"Product {item.product_id} not found or inactive")
-        
-        # Calculate item price
-        item_price = product["base_price"]
-        
-        # Add size price adjustment if applicable
-        if item.selected_size and product.get("sizes"):
-            size_info = next((s for s in product["sizes"] if s["name"] == item.selected_size), None)
+
+        # Size price adjustment
+        size_adjustment = 0.0
+        if item.selected_size:
+            size_info = next((s for s in product.get("sizes", []) if s.get("name") == item.selected_size), None)
             if size_info:
-                item_price += size_info.get("price_adjustment", 0.0)
-        
-        # Validate color if selected
+                size_adjustment = size_info.get("price_modifier", 0.0)
+
+        # Validate color; its image represents the item when there is one
+        image_url = ""
         if item.selected_color and product.get("colors"):
-            color_exists = any(c["name_pt"] == item.selected_color or c["name_en"] == item.selected_color 
-                             for c in product["colors"])
-            if not color_exists:
+            color = next((c for c in product["colors"] if item.selected_color in (c.get("name"), c.get("name_pt"), c.get("name_en"))), None)
+            if not color:
                 raise HTTPException(status_code=400, detail=f"Invalid color for product {item.product_id}")
-        
-        # Create validated item
+            image_url = color.get("image_url") or ""
+        if not image_url and product.get("images"):
+            image_url = product["images"][0]
+
+        # Only non-empty customizations are charged
+        customization_adjustment = 0.0
+        for custom_name, custom_value in (item.customizations or {}).items():
+            if custom_value and custom_value.strip():
+                option = next((o for o in product.get("customization_options", []) if o.get("name") == custom_name), None)
+                if option:
+                    customization_adjustment += option.get("price_modifier", 0.0)
+
+        unit_adjustment = size_adjustment + customization_adjustment
         validated_item = {
-            "product_id": item.product_id,
-            "product_name_pt": product["name_pt"],
-            "product_name_en": product["name_en"],
+            "product_id": product["id"],
+            "product_name": product["name_pt"],  # Use Portuguese name as default
             "quantity": item.quantity,
-            "unit_price": item_price,
-            "total_price": item_price * item.quantity,
+            "unit_price": product["base_price"],
             "selected_color": item.selected_color,
             "selected_size": item.selected_size,
-            "customizations": item.customizations or {}
+            "size_price_adjustment": size_adjustment,
+            "customizations": item.customizations or {},
+            "image_url": image_url,
+            "total_price": (product["base_price"] + unit_adjustment) * item.quantity
         }
-        
+
         validated_items.append(validated_item)
-        total += validated_item["total_price"]
-    
-    return validated_items, total
+        subtotal += product["base_price"] * item.quantity
+        adjustments += unit_adjustment * item.quantity
+
+    return validated_items, subtotal, adjustments
+
+def safe_payment_details(method: str, details: Dict[str, Any]) -> Dict[str, Any]:
+    """Payment details without sensitive data, for storage"""
+    if method == 'mbway':
+        phone = details.get("mbway_phone") or ""
+        return {"method": "mbway", "phone_last_digits": phone[-3:]}
+    if method == 'card':
+        card_number = (details.get("card_number") or "").replace(" ", "")
+        return {
+            "method": "card",
+            "card_last_digits": card_number[-4:] if len(card_number) >= 4 else "",
+            "card_type": "Visa/Mastercard"  # In production, detect card type
+        }
+    if method == 'transfer':
+        return {"method": "transfer"}
+    return {}
+
+def send_status_email(order: Dict[str, Any], status: str, note: str = ""):
+    try:
+        send_order_status_email(order, status, note)
+    except Exception as e:
+        logger.error(f"Failed to send status update email: {str(e)}")
+
+# ============== ORDER LIFECYCLE HOOKS ==============
+
+async def apply_stock_status(order: Dict[str, Any], event: Dict[str, Any]):
+    """Commit, consume or release the order's stock reservation"""
+    await stock_ledger.apply_status(order["id"], event["to"])
+
+async def notify_status_change(order: Dict[str, Any], event: Dict[str, Any]):
+    send_status_email(order, event["to"], event["note"])
+
+async def publish_order_event(order: Dict[str, Any], event: Dict[str, Any]):
+    """Push new orders and status changes to the open admin dashboards"""
+    admin_feed.publish(order_event(event))
+
+# Creation leaves the order pending; its reservation and confirmation email happen at checkout
+order_lifecycle.on(apply_stock_status, statuses=[s for s in ORDER_STATUSES if s != "pending"])
+order_lifecycle.on(notify_status_change, statuses=[s for s in ORDER_STATUSES if s != "pending"])
+order_lifecycle.on(publish_order_event)
 
 # ============== CUSTOMER AUTH ROUTES ==============
 
 @api_router.post("/customer/register", response_model=CustomerTokenResponse)
 async def register_customer(customer: CustomerCreate):
-    # Check if email already exists
-    if await db.customers.find_one({"email": customer.email}):
+    # Check if email already exists (emails match case-insensitively)
+    if await storage.customers.find_one({"email": customer.email}, fields=["id"]):
         raise HTTPException(status_code=400, detail="Email already registered")
-    
-    customer_id = str(uuid.uuid4())
+
     customer_doc = {
-        "id": customer_id,
+        "id": str(uuid.uuid4()),
         "email": customer.email,
         "password": hash_password(customer.password),
         "name": customer.name,
-        "phone": customer.phone,
+        "phone": customer.phone or "",
+        "address": customer.address or {},
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.customers.insert_one(customer_doc)
-    
-    token = create_token(customer_id)
-    customer_response = CustomerResponse(
-        id=customer_id,
-        email=customer.email,
-        name=customer.name,
-        phone=customer.phone,
-        created_at=customer_doc["created_at"]
-    )
-    return CustomerTokenResponse(access_token=token, customer=customer_response)
+    try:
+        await storage.customers.insert(customer_doc)
+    except DuplicateKeyError:
+        # A concurrent registration took the email after the check; the unique index refused this one
+        raise HTTPException(status_code=400, detail="Email already registered")
+    return CustomerTokenResponse(**await issue_tokens("customer", customer_doc), customer=CustomerResponse(**customer_doc))
 
 @api_router.post("/customer/login", response_model=CustomerTokenResponse)
 async def login_customer(credentials: CustomerLogin):
-    customer = await db.customers.find_one({"email": credentials.email})
+    customer = await storage.customers.find_one({"email": credentials.email})
     if not customer or not verify_password(credentials.password, customer["password"]):
+        login_failures_total.inc(kind="customer")
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    
-    token = create_token(customer["id"])
-    customer_response = CustomerResponse(
-        id=customer["id"],
-        email=customer["email"],
-        name=customer["name"],
-        phone=customer.get("phone", ""),
-        created_at=customer["created_at"]
-    )
-    return CustomerTokenResponse(access_token=token, customer=customer_response)
+    return CustomerTokenResponse(**await issue_tokens("customer", customer), customer=CustomerResponse(**customer))
+
+@api_router.post("/customer/google", response_model=CustomerTokenResponse)
+async def google_auth(auth_request: GoogleAuthRequest):
+    """
+    Google OAuth authentication endpoint.
+    In production, this would verify the Google JWT token.
+    For development/testing, it creates a demo user.
+    """
+    try:
+        # In production, you would verify the Google JWT token here:
+        # from google.oauth2 import id_token
+        # from google.auth.transport import requests
+        #
+        # idinfo = id_token.verify_oauth2_token(
+        #     auth_request.credential,
+        #     requests.Request(),
+        #     "YOUR_GOOGLE_CLIENT_ID"
+        # )
+        #
+        # google_user_id = idinfo['sub']
+        # email = idinfo['email']
+        # name = idinfo['name']
+
+        # For demo/development purposes:
+        google_user_id = "demo_google_user_123"
+        email = "demo.google@gmail.com"
+        name = "Demo Google User"
+
+        # Check if customer already exists by Google ID or email
+        customer = (await storage.customers.find_one({"google_id": google_user_id})
+                    or await storage.customers.find_one({"email": email}))
+
+        if not customer:
+            # Create new customer from Google account
+            customer = {
+                "id": str(uuid.uuid4()),
+                "email": email,
+                "password": hash_password("google_oauth_" + google_user_id),  # Placeholder
+                "name": name,
+                "phone": "",
+                "address": {},
+                "google_id": google_user_id,
+                "auth_provider": "google",
+                "created_at": datetime.now(timezone.utc).isoformat()
+            }
+            try:
+                await storage.customers.insert(customer)
+            except DuplicateKeyError:
+                # A concurrent sign-in created the account first
+                customer = await storage.customers.find_one({"email": email})
+        elif not customer.get("google_id"):
+            # Link the existing customer to the Google account
+            customer = await storage.customers.update_one(
+                {"id": customer["id"]},
+                {"google_id": google_user_id, "auth_provider": "google"}
+            ) or customer
+
+        return CustomerTokenResponse(**await issue_tokens("customer", customer), customer=CustomerResponse(**customer))
+
+    except Exception as e:
+        logger.error(f"Google authentication failed: {str(e)}")
+        raise HTTPException(status_code=400, detail="Invalid Google credential")
 
 @api_router.get("/customer/profile", response_model=CustomerResponse)
-async def get_customer_profile(customer = Depends(get_current_customer)):
+async def get_customer_profile(current = Depends(get_current_customer)):
+    customer = await storage.customers.get(current["id"], exclude=["password"])
+    if not customer:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    return CustomerResponse(**customer)
+
+@api_router.put("/customer/address", response_model=CustomerResponse)
+async def update_customer_address(address: CustomerAddressUpdate, current = Depends(get_current_customer)):
+    customer = await storage.customers.update_one({"id": current["id"]}, {"address": address.model_dump()})
+    if not customer:
+        raise HTTPException(status_code=404, detail="Customer not found")
     return CustomerResponse(**customer)
 
 @api_router.get("/customer/orders", response_model=List[OrderResponse])
-async def get_customer_orders(customer = Depends(get_current_customer)):
-    orders = await db.orders.find({"customer_id": customer["id"]}, {"_id": 0}).sort("created_at", -1).to_list(100)
-    return [OrderResponse(**order) for order in orders]
+async def get_customer_orders(skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=100),
+                              customer = Depends(get_current_customer)):
+    """The customer's orders, newest first; X-Total-Count gives the total for paging"""
+    query = {"customer_id": customer["id"]}
+    orders = await storage.orders.find(query, sort=[("created_at", -1)], skip=skip, limit=limit)
+    total = await storage.orders.count(query)
+    return FastJSONResponse(project_many(orders, OrderResponse), headers={"X-Total-Count": str(total)})
 
 # ============== ADMIN AUTH ROUTES ==============
 
 @api_router.post("/admin/register", response_model=TokenResponse)
 async def register_admin(admin: AdminCreate):
     # Check if any admin exists (only allow first admin registration)
-    existing_admin = await db.admins.find_one({})
-    if existing_admin:
+    if await storage.admins.count():
         raise HTTPException(status_code=400, detail="Admin already exists. Contact existing admin.")
-    
-    # Check if email already exists
-    if await db.admins.find_one({"email": admin.email}):
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
-    admin_id = str(uuid.uuid4())
+
     admin_doc = {
-        "id": admin_id,
+        "id": str(uuid.uuid4()),
         "email": admin.email,
         "password": hash_password(admin.password),
         "name": admin.name,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.admins.insert_one(admin_doc)
-    
-    token = create_token(admin_id)
-    admin_response = AdminResponse(
-        id=admin_id,
-        email=admin.email,
-        name=admin.name,
-        created_at=admin_doc["created_at"]
-    )
-    return TokenResponse(access_token=token, admin=admin_response)
+    try:
+        await storage.admins.insert(admin_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Admin already exists. Contact existing admin.")
+    return TokenResponse(**await issue_tokens("admin", admin_doc), admin=AdminResponse(**admin_doc))
 
 @api_router.post("/admin/login", response_model=TokenResponse)
 async def login_admin(credentials: AdminLogin):
-    admin = await db.admins.find_one({"email": credentials.email})
+    admin = await storage.admins.find_one({"email": credentials.email})
     if not admin or not verify_password(credentials.password, admin["password"]):
+        login_failures_total.inc(kind="admin")
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    
-    token = create_token(admin["id"])
-    admin_response = AdminResponse(
-        id=admin["id"],
-        email=admin["email"],
-        name=admin["name"],
-        created_at=admin["created_at"]
+    return TokenResponse(**await issue_tokens("admin", admin), admin=AdminResponse(**admin))
+
+@api_router.get("/admin/events")
+async def stream_admin_events(request: Request, admin = Depends(get_current_admin)):
+    """Server-sent events for the dashboard: new orders, status changes and contact messages
+
+    Reconnecting with Last-Event-ID replays what was missed.
+    """
+    return StreamingResponse(
+        sse_stream(admin_feed, storage, request.headers.get("last-event-id")),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they come
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
-    return TokenResponse(access_token=token, admin=admin_response)
 
 @api_router.get("/admin/me", response_model=AdminResponse)
-async def get_current_admin_info(admin = Depends(get_current_admin)):
+async def get_current_admin_info(current = Depends(get_current_admin)):
+    admin = await storage.admins.get(current["id"], exclude=["password"])
+    if not admin:
+        raise HTTPException(status_code=404, detail="Admin not found")
     return AdminResponse(**admin)
 
+# ============== TOKEN ROUTES ==============
+
+@api_router.post("/auth/refresh", response_model=AccessTokenResponse)
+async def refresh_tokens(request: RefreshRequest):
+    try:
+        record = await token_service.rotate(request.refresh_token)
+    except TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+    # The only storage read: make sure the account still exists
+    accounts = storage.admins if record["role"] == "admin" else storage.customers
+    account = await accounts.get(record["subject"], exclude=["password"])
+    if not account:
+        raise HTTPException(status_code=401, detail="Account not found")
+    return AccessTokenResponse(**await issue_tokens(record["role"], account))
+
+@api_router.post("/auth/logout")
+async def logout(request: LogoutRequest = LogoutRequest(), credentials: HTTPAuthorizationCredentials = Depends(security)):
+    try:
+        claims = token_service.verify(credentials.credentials)
+    except TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    await token_service.revoke(claims, request.refresh_token)
+    return {"message": "Logged out"}
+
 # ============== CATEGORY ROUTES ==============
 
 @api_router.post("/categories", response_model=CategoryResponse)
 async def create_category(category: CategoryCreate, admin = Depends(get_current_admin)):
-    category_id = str(uuid.uuid4())
     category_doc = {
-        "id": category_id,
+        "id": str(uuid.uuid4()),
         **category.model_dump(),
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.categories.insert_one(category_doc)
+    await storage.categories.insert(category_doc)
+    catalog_cache.invalidate()
     return CategoryResponse(**category_doc)
 
 @api_router.get("/categories", response_model=List[CategoryResponse])
-async def get_categories():
-    categories = await db.categories.find({}, {"_id": 0}).to_list(100)
-    return [CategoryResponse(**cat) for cat in categories]
+async def get_categories(request: Request, lang: Optional[str] = None):
+    language = resolve_language(lang, request.headers.get("accept-language"))
+
+    async def build():
+        categories = project_many(await storage.categories.find(limit=100), CategoryResponse)
+        if language:
+            categories = [localize(cat, language) for cat in categories]
+        return dumps(categories)
+
+    return await catalog_cache.respond(request, ("categories", language), build, vary=catalog_vary(lang))
 
 @api_router.get("/categories/{category_id}", response_model=CategoryResponse)
 async def get_category(category_id: str):
-    category = await db.categories.find_one({"id": category_id}, {"_id": 0})
+    category = await storage.categories.get(category_id)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     return CategoryResponse(**category)
 
 @api_router.put("/categories/{category_id}", response_model=CategoryResponse)
 async def update_category(category_id: str, category: CategoryCreate, admin = Depends(get_current_admin)):
-    result = await db.categories.update_one(
-        {"id": category_id},
-        {"$set": category.model_dump()}
-    )
-    if result.matched_count == 0:
+    updated = await storage.categories.update_one({"id": category_id}, category.model_dump())
+    if not updated:
         raise HTTPException(status_code=404, detail="Category not found")
-    updated = await db.categories.find_one({"id": category_id}, {"_id": 0})
+    catalog_cache.invalidate()
     return CategoryResponse(**updated)
 
 @api_router.delete("/categories/{category_id}")
 async def delete_category(category_id: str, admin = Depends(get_current_admin)):
-    result = await db.categories.delete_one({"id": category_id})
-    if result.deleted_count == 0:
+    if not await storage.categories.delete_one({"id": category_id}):
         raise HTTPException(status_code=404, detail="Category not found")
+    catalog_cache.invalidate()
     return {"message": "Category deleted"}
 
 # ============== PRODUCT ROUTES ==============
 
 @api_router.post("/products", response_model=ProductResponse)
 async def create_product(product: ProductCreate, admin = Depends(get_current_admin)):
-    product_id = str(uuid.uuid4())
+    await validate_product(product)
     product_doc = {
-        "id": product_id,
+        "id": str(uuid.uuid4()),
         **product.model_dump(),
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.products.insert_one(product_doc)
+    await storage.products.insert(with_views(product_doc))
+    catalog_cache.invalidate()
     return ProductResponse(**product_doc)
 
 @api_router.get("/products", response_model=List[ProductResponse])
-async def get_products(category_id: Optional[str] = None, featured: Optional[bool] = None):
-    query = {"active": True}
+async def get_products(request: Request, category_id: Optional[str] = None, featured: Optional[bool] = None,
+                       lang: Optional[str] = None):
+    query = {"active": {"$ne": False}}
     if category_id:
         query["category_id"] = category_id
     if featured is not None:
         query["featured"] = featured
-    products = await db.products.find(query, {"_id": 0}).to_list(500)
-    return [ProductResponse(**prod) for prod in products]
+    language = resolve_language(lang, request.headers.get("accept-language"))
+
+    async def build():
+        if language:
+            return dumps(await find_localized_products(query, language))
+        products = await storage.products.find(query, limit=500, exclude=["views"])
+        return dumps(project_many(products, ProductResponse))
+
+    return await catalog_cache.respond(request, ("products", category_id, featured, language), build,
+                                       vary=catalog_vary(lang))
 
 @api_router.get("/products/all", response_model=List[ProductResponse])
 async def get_all_products(admin = Depends(get_current_admin)):
-    products = await db.products.find({}, {"_id": 0}).to_list(500)
-    return [ProductResponse(**prod) for prod in products]
+    products = await storage.products.find(limit=500, exclude=["views"])
+    return FastJSONResponse(project_many(products, ProductResponse))
 
 @api_router.get("/products/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: str):
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
+async def get_product(product_id: str, request: Request, lang: Optional[str] = None):
+    language = resolve_language(lang, request.headers.get("accept-language"))
+    if language:
+        products = await find_localized_products({"id": product_id}, language, limit=1)
+        if not products:
+            raise HTTPException(status_code=404, detail="Product not found")
+        return FastJSONResponse(products[0])
+
+    product = await storage.products.get(product_id, exclude=["views"])
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return ProductResponse(**product)
+    return FastJSONResponse(project(product, ProductResponse))
+
+@api_router.post("/products/import")
+async def import_products(file: UploadFile = File(...), format: Optional[str] = None, admin = Depends(get_current_admin)):
+    """Bulk import products from a CSV or NDJSON upload with one batched write per batch"""
+    fmt = detect_format(file.filename, format)
+    if not fmt:
+        raise HTTPException(status_code=400, detail=f"Unknown import format. Must be one of: {list(IMPORT_FORMATS)}")
+
+    category_ids = set(await storage.categories.distinct("id"))
+    report = ImportReport()
+
+    for batch in iter_import_batches(iter_upload_rows(file.file, fmt), ProductCreate, category_ids, report):
+        imported, errors = await storage.products.insert_many([with_views(doc) for _, doc in batch])
+        report.imported += imported
+        for index, error in errors:
+            report.add_error(batch[index][0], [error])
+
+    if report.imported:
+        catalog_cache.invalidate()
+    return report.to_dict()
 
 @api_router.put("/products/{product_id}", response_model=ProductResponse)
 async def update_product(product_id: str, product: ProductCreate, admin = Depends(get_current_admin)):
-    result = await db.products.update_one(
-        {"id": product_id},
-        {"$set": product.model_dump()}
-    )
-    if result.matched_count == 0:
+    existing = await storage.products.get(product_id, exclude=["views"])
+    if not existing:
         raise HTTPException(status_code=404, detail="Product not found")
-    updated = await db.products.find_one({"id": product_id}, {"_id": 0})
+    await validate_product(product)
+
+    # Only the fields the client sent: the editor leaves out stock, so an edit must not reset it
+    fields = product.model_dump(exclude_unset=True)
+    fields["views"] = with_views({**existing, **fields})["views"]
+    updated = await storage.products.update_one({"id": product_id}, fields)
+    if not updated:
+        raise HTTPException(status_code=404, detail="Product not found")
+    catalog_cache.invalidate()
     return ProductResponse(**updated)
 
 @api_router.delete("/products/{product_id}")
 async def delete_product(product_id: str, admin = Depends(get_current_admin)):
-    result = await db.products.delete_one({"id": product_id})
-    if result.deleted_count == 0:
+    if not await storage.products.delete_one({"id": product_id}):
         raise HTTPException(status_code=404, detail="Product not found")
+    catalog_cache.invalidate()
     return {"message": "Product deleted"}
 
 # ============== ORDER ROUTES ==============
@@ -523,107 +784,287 @@ async def delete_product(product_id: str, admin = Depends(get_current_admin)):
 async def create_order(order: OrderCreate, customer = Depends(get_optional_customer)):
     try:
         # Validate products and calculate totals
-        validated_items, calculated_total = await validate_and_calculate_order(order.items)
-        
-        # Add shipping cost to calculated total
-        total_with_shipping = calculated_total + (order.shipping_cost or 0.0)
-        
+        with span("validation"):
+            validated_items, subtotal, adjustments = await validate_and_calculate_order(order.items)
+
+        shipping_cost = order.shipping_cost or 0.0
+        total = subtotal + adjustments + shipping_cost
+
         # Validate total amount (allow small rounding differences)
-        if abs(total_with_shipping - order.total_amount) > 0.01:
+        if abs(total - order.total_amount) > 0.01:
             raise HTTPException(
-                status_code=400, 
-                detail=f"Total amount mismatch. Expected: €{total_with_shipping:.2f}, Received: €{order.total_amount:.2f}"
+                status_code=400,
+                detail=f"Total amount mismatch. Expected: €{total:.2f}, Received: €{order.total_amount:.2f}"
             )
-        
+
         order_id = str(uuid.uuid4())
+        now = datetime.now(timezone.utc).isoformat()
         order_doc = {
             "id": order_id,
             "order_number": generate_order_number(),
-            "customer_name": order.customer_name,
-            "customer_email": order.customer_email,
-            "customer_phone": order.customer_phone or "",
             "customer_id": customer["id"] if customer else None,
-            "shipping_address": order.shipping_address,
-            "payment_method": order.payment_method,
-            "payment_details": order.payment_details or {},
-            "shipping_method": order.shipping_method,
-            "shipping_cost": order.shipping_cost or 0.0,
+            "customer": {
+                "name": order.customer_name,
+                "email": order.customer_email,
+                "phone": order.customer_phone or ""
+            },
+            "shipping": {
+                "address": order.shipping_address,
+                "notes": order.notes or "",
+                "method": order.shipping_method,
+                "cost": shipping_cost
+            },
+            "payment": {
+                "method": order.payment_method,
+                "details": safe_payment_details(order.payment_method, order.payment_details or {}),
+                "status": "pending",
+                "amount": total
+            },
             "items": validated_items,
-            "notes": order.notes or "",
-            "total_amount": order.total_amount,
-            "calculated_total": total_with_shipping,
+            "totals": {
+                "subtotal": subtotal,
+                "adjustments": adjustments,
+                "shipping": shipping_cost,
+                "total": total
+            },
             "status": "pending",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": now,
+            "updated_at": now
         }
-        
-        await db.orders.insert_one(order_doc)
-        return OrderResponse(**order_doc)
-        
+
+        # Reserve stock before the order becomes visible
+        with span("stock"):
+            await stock_ledger.reserve(order_id, reservation_lines(validated_items), reservation_expiry())
+        try:
+            await storage.orders.insert(order_doc)
+        except Exception:
+            await stock_ledger.release(order_id)
+            raise
+        orders_created_total.inc()
+        await order_lifecycle.created(order_doc, actor=order_doc["customer"]["email"])
+
+    except InsufficientStockError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error creating order: {str(e)}")
         raise HTTPException(status_code=500, detail="Error processing order")
 
+    # Send confirmation email
+    try:
+        send_order_confirmation_email(order_doc)
+    except Exception as e:
+        logger.error(f"Failed to send confirmation email: {str(e)}")
+
+    return FastJSONResponse(project(order_doc, OrderResponse))
+
 @api_router.get("/orders", response_model=List[OrderResponse])
 async def get_orders(admin = Depends(get_current_admin)):
-    orders = await db.orders.find({}, {"_id": 0}).sort("created_at", -1).to_list(500)
-    return [OrderResponse(**order) for order in orders]
+    orders = await storage.orders.find(sort=[("created_at", -1)], limit=500)
+    return FastJSONResponse(project_many(orders, OrderResponse))
+
+@api_router.get("/orders/export")
+async def export_orders(
+    format: str = "csv",
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    admin = Depends(get_current_admin)
+):
+    """Stream orders as CSV or NDJSON, one document at a time"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Must be one of: {list(EXPORT_FORMATS)}")
+
+    docs = storage.orders.iterate(created_at_filter(date_from, date_to), sort=[("created_at", 1)])
+    return StreamingResponse(
+        stream_rows_async(export_rows(docs, flatten_order), format, ORDER_COLUMNS),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{export_filename("orders", format)}"'}
+    )
+
+@api_router.get("/customers/export")
+async def export_customers(
+    format: str = "csv",
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    admin = Depends(get_current_admin)
+):
+    """Stream customers (without credentials) as CSV or NDJSON"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Must be one of: {list(EXPORT_FORMATS)}")
+
+    docs = storage.customers.iterate(created_at_filter(date_from, date_to), sort=[("created_at", 1)],
+                                     exclude=["password"])
+    return StreamingResponse(
+        stream_rows_async(export_rows(docs, flatten_customer), format, CUSTOMER_COLUMNS),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{export_filename("customers", format)}"'}
+    )
 
 @api_router.get("/orders/{order_id}", response_model=OrderResponse)
 async def get_order(order_id: str, admin = Depends(get_current_admin)):
-    order = await db.orders.find_one({"id": order_id}, {"_id": 0})
+    order = await storage.orders.get(order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-    return OrderResponse(**order)
+    return FastJSONResponse(project(order, OrderResponse))
 
 @api_router.put("/orders/{order_id}/status")
-async def update_order_status(order_id: str, status: str, admin = Depends(get_current_admin)):
-    valid_statuses = ["pending", "confirmed", "processing", "shipped", "delivered", "cancelled"]
-    if status not in valid_statuses:
-        raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {valid_statuses}")
-    
-    result = await db.orders.update_one(
-        {"id": order_id},
-        {"$set": {"status": status}}
-    )
-    if result.matched_count == 0:
+async def update_order_status(order_id: str, status: str, note: str = "", admin = Depends(get_current_admin)):
+    if status not in ORDER_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {ORDER_STATUSES}")
+
+    # Stock and the status email follow through the lifecycle hooks
+    try:
+        order = await order_lifecycle.transition(order_id, status, actor=admin["email"], note=note)
+    except InvalidTransitionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     return {"message": "Status updated", "status": status}
 
+@api_router.get("/orders/{order_id}/events")
+async def get_order_events(order_id: str, admin = Depends(get_current_admin)):
+    """The order's timeline from the event log, oldest first"""
+    return FastJSONResponse(await order_lifecycle.timeline(order_id))
+
+@api_router.post("/orders/{order_id}/refund")
+async def process_refund(order_id: str, refund_data: dict, admin = Depends(get_current_admin)):
+    order = await storage.orders.get(order_id)
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    if order["status"] == "refunded":
+        raise HTTPException(status_code=400, detail="Order already refunded")
+
+    now = datetime.now(timezone.utc).isoformat()
+    refund_info = {
+        "amount": refund_data.get("amount", order["totals"]["total"]),
+        "reason": refund_data.get("reason", ""),
+        "method": refund_data.get("method", order["payment"]["method"]),
+        "processed_at": now,
+        "processed_by": admin["email"]
+    }
+    # The transition is conditional on the status, so two concurrent refunds cannot both succeed
+    try:
+        updated = await order_lifecycle.transition(
+            order_id, "refunded", actor=admin["email"], note=refund_info["reason"],
+            fields={"refund": refund_info, "payment.status": "refunded"}
+        )
+    except InvalidTransitionError as e:
+        detail = "Order already refunded" if e.current == "refunded" else str(e)
+        raise HTTPException(status_code=400, detail=detail)
+    if not updated:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return {"message": "Refund processed successfully", "refund": refund_info}
+
+# ============== PRINT QUEUE ==============
+
+@api_router.get("/admin/print-plan")
+async def get_print_plan(printers: int = 1, admin = Depends(get_current_admin)):
+    """Schedule confirmed orders' items onto the available printers"""
+    if printers < 1 or printers > 100:
+        raise HTTPException(status_code=400, detail="printers must be between 1 and 100")
+
+    orders = await storage.orders.find({"status": {"$in": PRINT_QUEUE_STATUSES}})
+    product_ids = list({item["product_id"] for order in orders for item in order.get("items", [])})
+    products = await storage.products.find({"id": {"$in": product_ids}}, exclude=["views"])
+    return build_print_plan(orders, products, printers)
+
 # ============== CONTACT ROUTES ==============
 
 @api_router.post("/contact", response_model=ContactResponse)
-async def create_contact_message(message: ContactMessage):
-    message_id = str(uuid.uuid4())
+async def create_contact_message(message: ContactMessage, request: Request):
     message_doc = {
-        "id": message_id,
+        "id": str(uuid.uuid4()),
         **message.model_dump(),
         "read": False,
+        "ip": client_ip(request.scope),
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.contact_messages.insert_one(message_doc)
+    quarantine = await contact_screen.screen(message_doc)
+    if quarantine:
+        # The sender gets the usual response, so a bot learns nothing from it
+        await storage.message_quarantine.insert({**message_doc, "quarantine": quarantine})
+        for reason in quarantine["reasons"]:
+            contact_quarantined_total.inc(reason=reason)
+        logger.info(f"Quarantined contact message {message_doc['id']}: {', '.join(quarantine['reasons'])}")
+    else:
+        await storage.messages.insert(message_doc)
+        admin_feed.publish(message_event(message_doc))
     return ContactResponse(**message_doc)
 
 @api_router.get("/contact", response_model=List[ContactResponse])
-async def get_contact_messages(admin = Depends(get_current_admin)):
-    messages = await db.contact_messages.find({}, {"_id": 0}).sort("created_at", -1).to_list(500)
-    return [ContactResponse(**msg) for msg in messages]
+async def get_contact_messages(status: str = Query("all", pattern="^(all|read|unread)$"),
+                               q: Optional[str] = Query(None, max_length=200),
+                               cursor: Optional[str] = None,
+                               limit: int = Query(50, ge=1, le=200),
+                               admin = Depends(get_current_admin)):
+    """The inbox, newest first; X-Next-Cursor gives the next page's cursor, X-Unread-Count the unread total"""
+    try:
+        page = await inbox_page(storage.messages, status, q, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"X-Unread-Count": str(await storage.messages.count({"read": False}))}
+    if page["next_cursor"]:
+        headers["X-Next-Cursor"] = page["next_cursor"]
+    return FastJSONResponse(project_many(page["messages"], ContactResponse), headers=headers)
+
+@api_router.get("/contact/archive", response_model=List[ContactArchiveSegment])
+async def get_contact_archive(admin = Depends(get_current_admin)):
+    """Archived message segments, newest first"""
+    segments = await storage.message_archive.find(sort=[("last_created_at", -1)], exclude=["data"])
+    return FastJSONResponse(project_many(segments, ContactArchiveSegment))
+
+@api_router.get("/contact/archive/{segment_id}", response_model=List[ContactResponse])
+async def get_archived_messages(segment_id: str, q: Optional[str] = Query(None, max_length=200),
+                                admin = Depends(get_current_admin)):
+    """The messages of an archive segment, newest first, optionally searched"""
+    segment = await storage.message_archive.get(segment_id)
+    if not segment:
+        raise HTTPException(status_code=404, detail="Archive segment not found")
+    return FastJSONResponse(project_many(search_segment(segment, q), ContactResponse))
+
+@api_router.get("/contact/quarantine", response_model=List[QuarantinedContactResponse])
+async def get_quarantined_messages(q: Optional[str] = Query(None, max_length=200),
+                                   cursor: Optional[str] = None,
+                                   limit: int = Query(50, ge=1, le=200),
+                                   admin = Depends(get_current_admin)):
+    """Quarantined submissions, newest first, paged like the inbox"""
+    try:
+        page = await inbox_page(storage.message_quarantine, "all", q, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"X-Next-Cursor": page["next_cursor"]} if page["next_cursor"] else {}
+    return FastJSONResponse(project_many(page["messages"], QuarantinedContactResponse), headers=headers)
+
+@api_router.post("/contact/quarantine/{message_id}/release", response_model=ContactResponse)
+async def release_quarantined_message(message_id: str, admin = Depends(get_current_admin)):
+    """Move a quarantined submission into the inbox"""
+    message_doc = await storage.message_quarantine.get(message_id)
+    if not message_doc:
+        raise HTTPException(status_code=404, detail="Message not found")
+    message_doc.pop("quarantine", None)
+    # Inserted before it leaves quarantine, so a failure can't lose it
+    if not await storage.messages.get(message_id, fields=["id"]):
+        await storage.messages.insert(message_doc)
+    await storage.message_quarantine.delete_one({"id": message_id})
+    admin_feed.publish(message_event(message_doc))
+    return FastJSONResponse(project(message_doc, ContactResponse))
+
+@api_router.delete("/contact/quarantine/{message_id}")
+async def delete_quarantined_message(message_id: str, admin = Depends(get_current_admin)):
+    if not await storage.message_quarantine.delete_one({"id": message_id}):
+        raise HTTPException(status_code=404, detail="Message not found")
+    return {"message": "Message deleted"}
 
 @api_router.put("/contact/{message_id}/read")
 async def mark_message_read(message_id: str, admin = Depends(get_current_admin)):
-    result = await db.contact_messages.update_one(
-        {"id": message_id},
-        {"$set": {"read": True}}
-    )
-    if result.matched_count == 0:
+    if not await storage.messages.update_one({"id": message_id}, {"read": True}):
         raise HTTPException(status_code=404, detail="Message not found")
     return {"message": "Marked as read"}
 
 @api_router.delete("/contact/{message_id}")
 async def delete_contact_message(message_id: str, admin = Depends(get_current_admin)):
-    result = await db.contact_messages.delete_one({"id": message_id})
-    if result.deleted_count == 0:
+    if not await storage.messages.delete_one({"id": message_id}):
         raise HTTPException(status_code=404, detail="Message not found")
     return {"message": "Message deleted"}
 
@@ -641,55 +1082,224 @@ async def upload_image(file: UploadFile = File(...), admin = Depends(get_current
 
 @api_router.get("/stats")
 async def get_stats(admin = Depends(get_current_admin)):
-    total_products = await db.products.count_documents({})
-    total_categories = await db.categories.count_documents({})
-    total_orders = await db.orders.count_documents({})
-    pending_orders = await db.orders.count_documents({"status": "pending"})
-    unread_messages = await db.contact_messages.count_documents({"read": False})
-    
+    # Order counts come from the event log, not a scan of the orders
+    status_counts = await order_status_counts.get()
     return {
-        "total_products": total_products,
-        "total_categories": total_categories,
-        "total_orders": total_orders,
-        "pending_orders": pending_orders,
-        "unread_messages": unread_messages
+        "total_products": await storage.products.count(),
+        "total_categories": await storage.categories.count(),
+        "total_orders": sum(status_counts.values()),
+        "pending_orders": status_counts["pending"],
+        "unread_messages": await storage.messages.count({"read": False})
+    }
+
+@api_router.get("/validate")
+async def validate_data(admin = Depends(get_current_admin)):
+    """
+    Validate data consistency across all entities
+    """
+    results = validate_dataset(
+        await storage.products.find(exclude=["views"]),
+        await storage.categories.find(),
+        await storage.orders.find()
+    )
+
+    if not results['valid']:
+        return {
+            "status": "error",
+            "message": "Data validation failed",
+            "errors": results['errors'],
+            "warnings": results.get('warnings', [])
+        }
+
+    return {
+        "status": "success",
+        "message": "All data is valid and consistent",
+        "errors": [],
+        "warnings": results.get('warnings', [])
     }
 
 # ============== ROOT ==============
 
 @api_router.get("/")
 async def root():
-    return {"message": "Pulgax 3D Store API", "status": "running"}
+    return {"message": "Pulgax 3D Store API", "status": "running", "storage": storage.name}
 
 @api_router.get("/health")
 async def health_check():
     """Health check endpoint for monitoring"""
     try:
-        # Test database connection
-        await db.command("ping")
+        # Test the storage backend
+        await storage.ping()
         return {
             "status": "healthy",
             "database": "connected",
+            "storage": storage.name,
             "message": "Pulgax 3D Store API is running"
         }
     except Exception as e:
         logger.error(f"Health check failed: {str(e)}")
         raise HTTPException(status_code=503, detail="Service unavailable")
 
-# Include the router in the main app
-app.include_router(api_router)
+async def get_metrics(request: Request):
+    return metrics_response(request)
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', 'http://localhost:3000').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+async def is_admin_token(token: str) -> bool:
+    """Whether a bearer token belongs to an admin, for the X-Profile header"""
+    try:
+        token_service.verify(token, "admin")
+    except TokenError:
+        return False
+    return True
+
+async def liveness():
+    """Liveness probe: the worker answers; still true while it drains, so it isn't killed mid-write"""
+    return {"status": "alive"}
+
+async def readiness():
+    """Readiness probe: the worker has started, isn't shutting down and reaches its storage"""
+    if not shutdown_drain.ready:
+        return FastJSONResponse({"status": "draining" if shutdown_drain.draining else "starting"}, status_code=503)
+    try:
+        await storage.ping()
+    except Exception as e:
+        logger.error(f"Readiness check failed: {str(e)}")
+        return FastJSONResponse({"status": "unavailable"}, status_code=503)
+    return {"status": "ready", "storage": storage.name}
+
+# ============== BACKGROUND JOBS ==============
+scheduler = Scheduler(lock=storage.leader_lock)
+
+async def cancel_pending_orders(order_ids: List[str], note: str) -> int:
+    """Cancel the given orders that are still pending; the lifecycle hooks release their stock"""
+    cancelled = 0
+    for order_id in order_ids:
+        if await order_lifecycle.transition(order_id, "cancelled", note=note, expected=["pending"]):
+            cancelled += 1
+    return cancelled
+
+async def expire_stock_reservations():
+    """Release unpaid reservations past their expiry and cancel their orders"""
+    expired = await stock_ledger.expire()
+    if expired:
+        await cancel_pending_orders(expired, "Stock reservation expired before payment")
+        logger.info(f"Expired stock reservations for {len(expired)} orders")
+
+async def cancel_stale_orders():
+    """Cancel orders left pending for longer than PENDING_ORDER_DAYS"""
+    stale = await storage.orders.distinct(
+        "id", {"status": "pending", "created_at": {"$lt": days_ago(PENDING_ORDER_DAYS)}}
+    )
+    if stale:
+        count = await cancel_pending_orders(stale, "Order not paid in time")
+        logger.info(f"Cancelled {count} stale pending orders")
+
+async def reconcile_stock_reservations():
+    """Release or settle reservations whose order status moved on without them"""
+    changed = await stock_ledger.reconcile()
+    if changed:
+        logger.info(f"Reconciled stock reservations for {len(changed)} orders")
+
+async def archive_read_messages():
+    """Archive read contact messages older than CONTACT_ARCHIVE_DAYS, and drop archives past CONTACT_RETENTION_DAYS"""
+    archived = await archive_messages(storage.messages, storage.message_archive, days_ago(CONTACT_ARCHIVE_DAYS))
+    if archived:
+        logger.info(f"Archived {archived} read contact messages")
+    dropped = await drop_archive_segments(storage.message_archive, days_ago(CONTACT_RETENTION_DAYS))
+    if dropped:
+        logger.info(f"Dropped {dropped} contact message archive segments")
+
+async def purge_quarantined_messages():
+    """Delete quarantined contact messages older than CONTACT_QUARANTINE_DAYS"""
+    deleted = await storage.message_quarantine.delete_many({"created_at": {"$lt": days_ago(CONTACT_QUARANTINE_DAYS)}})
+    if deleted:
+        logger.info(f"Purged {deleted} quarantined contact messages")
+
+scheduler.add("expire_stock_reservations", expire_stock_reservations, every=RESERVATION_SWEEP_SECONDS)
+scheduler.add("cancel_stale_orders", cancel_stale_orders, cron="15 * * * *")
+scheduler.add("reconcile_stock_reservations", reconcile_stock_reservations, cron="45 * * * *")
+if hasattr(stock_ledger, "compact"):
+    # Only the JSON backend keeps a journal
+    scheduler.add("compact_stock_journal", stock_ledger.compact, cron="30 3 * * *")
+scheduler.add("archive_read_messages", archive_read_messages, cron="0 4 * * *")
+scheduler.add("purge_quarantined_messages", purge_quarantined_messages, cron="30 4 * * *")
+# The failed-email queue is per process, so every worker retries its own; SMTP blocks, so off the loop
+scheduler.add("retry_failed_emails", lambda: asyncio.to_thread(retry_failed_emails), every=EMAIL_RETRY_SECONDS,
+              leader_only=False, timeout=EMAIL_RETRY_SECONDS)
+
+# ============== APP ==============
+
+async def flush_email_outbox(timeout: float):
+    """Retry the failed emails once more: the queue lives in memory and ends with the process"""
+    if not failed_emails:
+        return
+    try:
+        await asyncio.wait_for(asyncio.to_thread(retry_failed_emails), timeout)
+    except asyncio.TimeoutError:
+        logger.error("Timed out retrying failed emails during shutdown")
+    if failed_emails:
+        logger.error(f"Shutting down with {len(failed_emails)} unsent emails: "
+                     f"{', '.join(email['to_email'] for email in failed_emails)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The Mongo client is created here, by the first index build, not when the module is imported
+    await storage.start()
+    scheduler.start()
+    admin_feed_follower.start()
+    loop_monitor = asyncio.create_task(monitor_event_loop())
+    shutdown_drain.started = True
+    try:
+        yield
+    finally:
+        # Not ready and refusing new writes first, so nothing stops under a request still writing
+        shutdown_drain.begin()
+        pending = await shutdown_drain.wait()
+        if pending:
+            logger.error(f"Shutdown deadline reached with {pending} write requests in flight")
+        loop_monitor.cancel()
+        await admin_feed_follower.stop()
+        await scheduler.stop(timeout=shutdown_drain.remaining())
+        await flush_email_outbox(shutdown_drain.remaining())
+        # Flushes the stock journal and syncs the data files to disk
+        await storage.close()
+        logger.info("Shutdown complete")
+
+def create_app() -> FastAPI:
+    """The API application: routes, middleware, and a lifespan starting storage and the background jobs
+
+    Serve it with ``uvicorn server:app``, or ``uvicorn --factory server:create_app``.
+    """
+    app = FastAPI(title="Pulgax 3D Store API", version="1.0.0", lifespan=lifespan)
+    app.include_router(api_router)
+    app.add_api_route("/metrics", get_metrics, methods=["GET"], include_in_schema=False)
+    # Probes for orchestrators and load balancers; /api/health stays the status page
+    app.add_api_route("/livez", liveness, methods=["GET"], include_in_schema=False)
+    app.add_api_route("/readyz", readiness, methods=["GET"], include_in_schema=False)
+
+    # Innermost: a request's JSON file writes are flushed together just before its response starts
+    app.add_middleware(UnitOfWorkMiddleware, storage=storage)
+    # A write counts as in flight until its files are flushed
+    app.add_middleware(DrainMiddleware, drain=shutdown_drain)
+    # Inside CORS, so a 429 still carries Access-Control-Allow-Origin and the browser can read it
+    app.add_middleware(
+        RateLimitMiddleware,
+        store=storage.rate_limits,
+        token_subject=lambda token: token_service.verify(token)["sub"],
+    )
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=os.environ.get('CORS_ORIGINS', 'http://localhost:3000,http://localhost:3001').split(','),
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["X-Total-Count", "X-Next-Cursor", "X-Unread-Count", "Retry-After"],
+    )
+    app.add_middleware(CompressionMiddleware)
+    app.add_middleware(ProfilingMiddleware, authorize=is_admin_token)
+    app.add_middleware(MetricsMiddleware, routes=app.routes)
+    return app
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+app = create_app()
 
 # Production server configuration
 if __name__ == "__main__":
@@ -699,5 +1309,6 @@ if __name__ == "__main__":
         "server:app",
         host="0.0.0.0",
         port=port,
-        log_level="info"
+        log_level="info",
+        timeout_graceful_shutdown=int(SHUTDOWN_TIMEOUT_SECONDS)
     )
@@ -0,0 +1,91 @@
+"""
+Graceful shutdown: finishing the writes in flight before the process exits.
+
+``DrainMiddleware`` counts the requests that may write (POST, PUT, PATCH,
+DELETE) in a ``ShutdownDrain``. When the app shuts down its lifespan calls
+``begin()``: the readiness probe turns 503, so load balancers stop routing to
+this worker, and new writes are refused with 503 and ``Retry-After`` so the
+client retries them on another worker (reads are still served). ``wait()``
+then waits for the writes already running, until the deadline, before the
+jobs are stopped and storage is closed.
+
+Under uvicorn a SIGTERM first closes the listening socket and waits for the
+open requests (the admin event stream included) for
+``--timeout-graceful-shutdown`` seconds, cancelling what is left, and only
+then runs the lifespan shutdown; the drain covers the requests still
+running after that, and servers that keep accepting while they shut down.
+Readiness also keeps a starting worker out of rotation until its storage is up.
+
+``SHUTDOWN_TIMEOUT_SECONDS`` is the budget of each of the two phases: pass it
+to uvicorn, and keep twice it below the platform's kill timeout.
+"""
+import asyncio
+import os
+import time
+from typing import Optional
+
+from starlette.responses import JSONResponse
+
+SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("SHUTDOWN_TIMEOUT_SECONDS", "10"))
+SHUTDOWN_RETRY_AFTER_SECONDS = 5
+SHUTDOWN_POLL_SECONDS = 0.05
+
+WRITE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+
+
+class ShutdownDrain:
+    """Whether this worker takes traffic, and the write requests it is still serving"""
+
+    def __init__(self, timeout: float = SHUTDOWN_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self.started = False
+        self.draining = False
+        self.in_flight = 0
+        self.deadline: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.started and not self.draining
+
+    def begin(self):
+        """Stop taking writes; the shutdown deadline starts now"""
+        if not self.draining:
+            self.draining = True
+            self.deadline = time.monotonic() + self.timeout
+
+    def remaining(self) -> float:
+        """Seconds left before the shutdown deadline"""
+        if self.deadline is None:
+            return self.timeout
+        return max(0.0, self.deadline - time.monotonic())
+
+    async def wait(self) -> int:
+        """Wait for the writes in flight, until the deadline; returns how many are still running"""
+        while self.in_flight and self.remaining() > 0:
+            await asyncio.sleep(SHUTDOWN_POLL_SECONDS)
+        return self.in_flight
+
+
+class DrainMiddleware:
+    """ASGI middleware counting write requests, and refusing new ones once the drain began"""
+
+    def __init__(self, app, drain: ShutdownDrain):
+        self.app = app
+        self.drain = drain
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in WRITE_METHODS:
+            await self.app(scope, receive, send)
+            return
+        if self.drain.draining:
+            response = JSONResponse(
+                {"detail": "Server is shutting down, retry the request"}, status_code=503,
+                headers={"Retry-After": str(SHUTDOWN_RETRY_AFTER_SECONDS), "Connection": "close"}
+            )
+            await response(scope, receive, send)
+            return
+        self.drain.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.drain.in_flight -= 1
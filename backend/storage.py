@@ -0,0 +1,1987 @@
+"""
+Storage backends behind one repository interface.
+
+The API talks to collections (``storage.products``, ``storage.orders``, ...)
+with the same small async interface whichever backend is configured:
+
+- ``JsonStorage`` keeps each collection as a JSON array file held in memory
+  with an id index, plus sorted secondary indexes where routes need them
+  (orders by customer) and range indexes for reads by time (order events
+  since a timestamp). Reads never touch the disk while the file is unchanged;
+  writes rewrite the file atomically. Unique fields (account emails) have a
+  hash index of their normalized value, checked before every write. Stock
+  lives in the journal-backed ``JsonStockLedger`` and is overlaid on product
+  reads. The order event log is a JSON Lines file that inserts append to.
+- ``SqliteStorage`` keeps each collection as a table of JSON documents in one
+  WAL-mode SQLite file, with expression indexes on the fields routes filter
+  by. Queries run on a small pool of connection threads, off the event loop.
+  Stock uses the same journal-backed ledger as the JSON backend.
+- ``MongoStorage`` maps the same calls onto Motor, creating the client the
+  first time a collection is used rather than at import.
+
+Queries use a subset of Mongo's query language (equality, ``$in``, ``$nin``,
+``$ne``, ``$lt``/``$lte``/``$gt``/``$gte``, ``$exists``, ``$regex`` with
+``$options``, ``$or``, ``$and`` and dotted paths), so a route reads the same
+whichever backend serves it. Both store the document shapes the storefront
+reads: nested orders (``customer``, ``shipping``, ``payment``, ``totals``) and
+product options with ``name`` and ``price_modifier``. Documents the Mongo
+server wrote in its older flat shape are upgraded as they are read.
+
+Collections may declare ``unique`` fields: every backend refuses a write that
+would repeat one (``DuplicateKeyError``), comparing values as ``unique_key``
+does (trimmed, case-insensitive), and a query on a unique field alone, like
+``{"email": ...}``, matches the same way.
+
+``STORAGE_BACKEND`` selects the backend: ``mongo`` (default), ``sqlite``
+(``SQLITE_PATH``, default ``<DATA_DIR>/store.sqlite3``) or ``json``.
+"""
+import asyncio
+import bisect
+import functools
+import itertools
+import logging
+import math
+import os
+import re
+import sqlite3
+import string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+from auth_tokens import JsonRefreshStore, MongoRefreshStore
+from inventory import AsyncStockLedger, JsonStockLedger, MongoStockLedger
+from jobs import FileLeaderLock, MongoLeaderLock
+from metrics import observe_storage, repository_operation_seconds
+from profiling import record_span
+from rate_limit import MemoryBucketStore, MongoBucketStore
+from serialization import dumps, loads
+
+Query = Dict[str, Any]
+Sort = Sequence[Tuple[str, int]]
+
+_MISSING = object()
+
+logger = logging.getLogger(__name__)
+
+
+# ============== JSON FILES ==============
+
+def load_json(file_path: Path) -> List[Dict]:
+    """Load data from JSON file"""
+    if not file_path.exists():
+        return []
+    started = time.perf_counter()
+    try:
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        data = loads(raw)
+    except (OSError, ValueError):
+        return []
+    observe_storage("load", file_path, started, len(raw))
+    record_span("storage.read", started)
+    return data
+
+
+def write_file(file_path: Path, raw: bytes, append: bool = False):
+    """Append ``raw`` to a file, or replace the file with it through a temporary file"""
+    if append:
+        with open(file_path, 'ab') as f:
+            f.write(raw)
+        return
+    tmp_path = file_path.with_name(file_path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(raw)
+    os.replace(tmp_path, file_path)
+
+
+@contextmanager
+def file_lock(path: Path):
+    """Hold an exclusive lock on ``path`` for the block, waiting for other processes to release it"""
+    with open(path, "a+") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def sync_files(data_dir: Path):
+    """fsync the JSON and JSON Lines files of ``data_dir``, and the directory, so a power loss keeps them"""
+    for path in data_dir.iterdir():
+        if path.suffix in (".json", ".jsonl") and path.is_file():
+            # Append mode writes nothing, but unlike read-only can be synced everywhere
+            with open(path, "ab") as f:
+                os.fsync(f.fileno())
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(data_dir, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def save_json(file_path: Path, data: List[Dict]):
+    """Save data to JSON file through a temporary file, so readers never see a partial write"""
+    started = time.perf_counter()
+    raw = dumps(data, indent=True)
+    write_file(file_path, raw)
+    observe_storage("save", file_path, started, len(raw))
+    record_span("storage.write", started)
+
+
+def load_json_lines(file_path: Path) -> List[Dict]:
+    """Load one document per line from a JSON Lines file"""
+    if not file_path.exists():
+        return []
+    started = time.perf_counter()
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    docs = []
+    for line in raw.splitlines():
+        try:
+            docs.append(loads(line))
+        except ValueError:
+            # A torn final line from a crash mid-write
+            continue
+    observe_storage("load", file_path, started, len(raw))
+    record_span("storage.read", started)
+    return docs
+
+
+def save_json_lines(file_path: Path, data: List[Dict]):
+    """Save documents one per line, through a temporary file"""
+    started = time.perf_counter()
+    raw = b"".join(dumps(doc) + b"\n" for doc in data)
+    write_file(file_path, raw)
+    observe_storage("save", file_path, started, len(raw))
+    record_span("storage.write", started)
+
+
+# ============== LEGACY DOCUMENTS ==============
+
+def _upgrade_option(option: Dict[str, Any]) -> Dict[str, Any]:
+    if "name" in option and "price_adjustment" not in option:
+        return option
+    option = dict(option)
+    if "name" not in option:
+        option["name"] = option.get("name_pt") or option.get("name_en", "")
+    if "price_adjustment" in option:
+        adjustment = option.pop("price_adjustment")
+        option.setdefault("price_modifier", adjustment)
+    return option
+
+
+def upgrade_product(product: Dict[str, Any]) -> Dict[str, Any]:
+    """Colors, sizes and options with ``name`` and ``price_modifier``, as the storefront reads them"""
+    doc = dict(product)
+    for key in ("colors", "sizes", "customization_options"):
+        if key in doc:
+            doc[key] = [_upgrade_option(option) for option in doc[key] or []]
+    if doc.get("views"):
+        doc["views"] = {lang: upgrade_product(view) for lang, view in doc["views"].items()}
+    return doc
+
+
+def upgrade_order(order: Dict[str, Any]) -> Dict[str, Any]:
+    """Nest an order written flat (customer_name, shipping_address, ...) by older Mongo servers"""
+    if "customer" in order or "customer_name" not in order:
+        return order
+    # A status update may already have set payment.status on a flat document
+    payment = order.get("payment") or {}
+    items = [{
+        "product_id": item["product_id"],
+        "product_name": item.get("product_name_pt") or item.get("product_name_en", ""),
+        "quantity": item.get("quantity", 1),
+        # Flat items priced the size into unit_price
+        "unit_price": item.get("unit_price", 0.0),
+        "selected_color": item.get("selected_color"),
+        "selected_size": item.get("selected_size"),
+        "size_price_adjustment": 0,
+        "customizations": item.get("customizations") or {},
+        "image_url": item.get("image_url", ""),
+        "total_price": item.get("total_price", item.get("unit_price", 0.0) * item.get("quantity", 1))
+    } for item in order.get("items", [])]
+    subtotal = sum(item["total_price"] for item in items)
+    shipping_cost = order.get("shipping_cost") or 0.0
+    total = order.get("calculated_total", order.get("total_amount", subtotal + shipping_cost))
+    doc = {
+        "id": order["id"],
+        "order_number": order["order_number"],
+        "customer_id": order.get("customer_id"),
+        "customer": {
+            "name": order.get("customer_name", ""),
+            "email": order.get("customer_email", ""),
+            "phone": order.get("customer_phone") or ""
+        },
+        "shipping": {
+            "address": order.get("shipping_address", ""),
+            "notes": order.get("notes") or "",
+            "method": order.get("shipping_method"),
+            "cost": shipping_cost
+        },
+        "payment": {
+            "method": order.get("payment_method", ""),
+            "details": order.get("payment_details") or {},
+            "status": payment.get("status", order.get("payment_status", "pending")),
+            "amount": total
+        },
+        "items": items,
+        "totals": {"subtotal": subtotal, "adjustments": 0, "shipping": shipping_cost, "total": total},
+        "status": order.get("status", "pending"),
+        "created_at": order["created_at"],
+        "updated_at": order.get("updated_at", order["created_at"])
+    }
+    for key in ("status_history", "refund"):
+        if key in order:
+            doc[key] = order[key]
+    return doc
+
+
+# ============== QUERIES ==============
+
+def _resolve(doc: Any, path: str) -> Any:
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return _MISSING
+        doc = doc[part]
+    return doc
+
+
+def _equals(value: Any, expected: Any) -> bool:
+    if isinstance(value, list) and not isinstance(expected, list):
+        return expected in value
+    return value == expected
+
+
+@functools.lru_cache(maxsize=256)
+def _regex(pattern: str, options: str = "") -> "re.Pattern":
+    flags = 0
+    for option, flag in (("i", re.IGNORECASE), ("m", re.MULTILINE), ("s", re.DOTALL), ("x", re.VERBOSE)):
+        if option in options:
+            flags |= flag
+    return re.compile(pattern, flags)
+
+
+def _compare(value: Any, op: str, operand: Any, options: str = "") -> bool:
+    if op == "$regex":
+        return isinstance(value, str) and _regex(operand, options).search(value) is not None
+    if op in ("$eq", "$ne", "$in", "$nin"):
+        # Equality treats a missing field as null, as Mongo does
+        present = None if value is _MISSING else value
+        if op == "$eq":
+            return _equals(present, operand)
+        if op == "$ne":
+            return not _equals(present, operand)
+        found = any(_equals(present, v) for v in operand)
+        return found if op == "$in" else not found
+    if op == "$exists":
+        return (value is not _MISSING) == bool(operand)
+    if value is _MISSING or value is None:
+        return False
+    try:
+        if op == "$lt":
+            return value < operand
+        if op == "$lte":
+            return value <= operand
+        if op == "$gt":
+            return value > operand
+        if op == "$gte":
+            return value >= operand
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported query operator: {op}")
+
+
+def matches(doc: Dict[str, Any], query: Optional[Query]) -> bool:
+    """Whether ``doc`` satisfies a Mongo-style query"""
+    for key, condition in (query or {}).items():
+        if key in ("$or", "$and"):
+            combine = any if key == "$or" else all
+            if not combine(matches(doc, clause) for clause in condition):
+                return False
+            continue
+        value = _resolve(doc, key)
+        if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+            options = condition.get("$options", "")
+            if not all(_compare(value, op, operand, options) for op, operand in condition.items() if op != "$options"):
+                return False
+        elif not _compare(value, "$eq", condition):
+            return False
+    return True
+
+
+def project_fields(doc: Dict[str, Any], fields: Optional[Sequence[str]] = None,
+                   exclude: Sequence[str] = ()) -> Dict[str, Any]:
+    """Copy of ``doc`` with only ``fields`` (dotted paths allowed) or without ``exclude``"""
+    if fields is None:
+        return {k: v for k, v in doc.items() if k not in exclude} if exclude else dict(doc)
+    result: Dict[str, Any] = {}
+    for path in fields:
+        value = _resolve(doc, path)
+        if value is _MISSING:
+            continue
+        target = result
+        *parents, last = path.split(".")
+        for part in parents:
+            target = target.setdefault(part, {})
+        target[last] = value
+    return result
+
+
+def _assign(doc: Dict[str, Any], path: str, value: Any):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+def _sort_key(value: Any):
+    # Missing and null sort first, as in Mongo
+    return (0, "") if value is _MISSING or value is None else (1, value)
+
+
+def sort_documents(docs: List[Dict[str, Any]], sort: Optional[Sort]) -> List[Dict[str, Any]]:
+    for field, direction in reversed(list(sort or [])):
+        docs.sort(key=lambda doc: _sort_key(_resolve(doc, field)), reverse=direction < 0)
+    return docs
+
+
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def unique_key(value: Any) -> Any:
+    """How unique field values compare: trimmed, ASCII letters lowercased (SQLite's ``lower(trim(...))``)"""
+    return value.strip(" ").translate(_ASCII_LOWER) if isinstance(value, str) else value
+
+
+class DuplicateKeyError(ValueError):
+    """A write would give two documents the same id or unique field value"""
+
+    def __init__(self, field: str, value: Any):
+        super().__init__(f"Duplicate {field}: {value}")
+        self.field = field
+        self.value = value
+
+
+def _timed(operation: str):
+    """Record a repository call in ``repository_operation_seconds``"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(self, *args, **kwargs)
+            finally:
+                repository_operation_seconds.observe(time.perf_counter() - started, backend=self.backend,
+                                                     collection=self.name, operation=operation)
+        return wrapper
+    return decorator
+
+
+# ============== JSON BACKEND ==============
+
+class JsonIndex:
+    """Document keys grouped by ``field``, each group kept sorted by ``order_by`` as documents are written
+
+    A query on ``field`` then reads only its group (e.g. one customer's orders,
+    newest first) instead of scanning the collection. Ties keep insertion
+    order, as ``sort_documents`` does.
+    """
+
+    def __init__(self, field: str, order_by: str, key: str = "id"):
+        self.field = field
+        self.order_by = order_by
+        self.key = key
+        self._groups: Dict[Any, List[Tuple[Any, int, Any]]] = {}
+        self._seq: Dict[Any, int] = {}
+        self._next = 0
+        # False once a document holds an array or object in ``field``; those need the full scan
+        self.complete = True
+
+    def _group_value(self, doc: Dict[str, Any]) -> Any:
+        value = _resolve(doc, self.field)
+        if isinstance(value, (list, dict)):
+            self.complete = False
+            return _MISSING
+        return value
+
+    def _entry(self, doc: Dict[str, Any]) -> Tuple[Any, int, Any]:
+        doc_id = doc.get(self.key)
+        if doc_id not in self._seq:
+            self._seq[doc_id] = self._next
+            self._next += 1
+        return (_sort_key(_resolve(doc, self.order_by)), self._seq[doc_id], doc_id)
+
+    def rebuild(self, docs: List[Dict[str, Any]]):
+        self._groups, self._seq, self._next, self.complete = {}, {}, 0, True
+        for doc in docs:
+            self.add(doc)
+
+    def add(self, doc: Dict[str, Any]):
+        value = self._group_value(doc)
+        if value is not _MISSING:
+            bisect.insort(self._groups.setdefault(value, []), self._entry(doc))
+
+    def remove(self, doc: Dict[str, Any], forget: bool = False):
+        """Drop a document as it was last added; ``forget`` when it leaves the collection"""
+        value = self._group_value(doc)
+        group = self._groups.get(value) if value is not _MISSING else None
+        if group is not None:
+            entry = self._entry(doc)
+            position = bisect.bisect_left(group, entry)
+            if position < len(group) and group[position] == entry:
+                del group[position]
+                if not group:
+                    del self._groups[value]
+        if forget:
+            self._seq.pop(doc.get(self.key), None)
+
+    def keys(self, value: Any, direction: Optional[int] = None) -> List[Any]:
+        """Keys in the ``value`` group: by ``order_by`` (1 or -1), or in insertion order"""
+        group = self._groups.get(value, [])
+        if direction is None:
+            return [doc_id for _, _, doc_id in sorted(group, key=lambda entry: entry[1])]
+        if direction > 0:
+            return [doc_id for _, _, doc_id in group]
+        keys = []
+        for _, run in itertools.groupby(reversed(group), key=lambda entry: entry[0]):
+            keys.extend(doc_id for _, _, doc_id in reversed(list(run)))
+        return keys
+
+
+class JsonUniqueIndex:
+    """Document key by the ``unique_key`` of a unique field, e.g. customer id by email
+
+    Lookups on the field are a dict access, and writes check it before they
+    change anything, so two accounts can't end up with one email.
+    """
+
+    def __init__(self, field: str, key: str = "id"):
+        self.field = field
+        self.key = key
+        self._keys: Dict[Any, Any] = {}
+
+    def _value(self, doc: Dict[str, Any]) -> Any:
+        value = _resolve(doc, self.field)
+        return unique_key(value) if isinstance(value, str) else _MISSING
+
+    def rebuild(self, docs: List[Dict[str, Any]]):
+        self._keys = {}
+        for doc in docs:
+            self.add(doc)
+
+    def add(self, doc: Dict[str, Any]):
+        value = self._value(doc)
+        if value is not _MISSING:
+            # A file written before the index existed may repeat a value; the first document keeps it
+            self._keys.setdefault(value, doc.get(self.key))
+
+    def remove(self, doc: Dict[str, Any], forget: bool = False):
+        value = self._value(doc)
+        if value is not _MISSING and self._keys.get(value) == doc.get(self.key):
+            del self._keys[value]
+
+    def get(self, value: Any) -> Any:
+        return self._keys.get(unique_key(value))
+
+    def check(self, doc_id: Any, value: Any):
+        """Raise ``DuplicateKeyError`` if a document other than ``doc_id`` holds ``value``"""
+        if isinstance(value, str):
+            owner = self._keys.get(unique_key(value))
+            if owner is not None and owner != doc_id:
+                raise DuplicateKeyError(self.field, value)
+
+
+class JsonRangeIndex:
+    """Every document key sorted by ``field``, for range queries and sorts on it (e.g. events since a time)
+
+    Used only while every document holds one kind of scalar in ``field`` (all
+    strings or all numbers), so its order is the one ``matches`` compares
+    with. Ties keep insertion order, as ``sort_documents`` does.
+    """
+
+    RANGE_OPERATORS = ("$gt", "$gte", "$lt", "$lte")
+
+    def __init__(self, field: str, key: str = "id"):
+        self.field = field
+        self.key = key
+        self._entries: List[Tuple[Any, int, Any]] = []
+        self._seq: Dict[Any, int] = {}
+        self._next = 0
+        self._kind: Optional[type] = None
+        self.complete = True
+
+    @staticmethod
+    def _kind_of(value: Any) -> Optional[type]:
+        if isinstance(value, str):
+            return str
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float
+        return None
+
+    def _value(self, doc: Dict[str, Any]) -> Any:
+        value = _resolve(doc, self.field)
+        kind = self._kind_of(value)
+        if kind is None or (self._kind is not None and kind is not self._kind):
+            # Missing, null, arrays and mixed kinds need the full scan
+            self.complete = False
+            return _MISSING
+        self._kind = kind
+        return value
+
+    def _entry(self, doc: Dict[str, Any], value: Any) -> Tuple[Any, int, Any]:
+        doc_id = doc.get(self.key)
+        if doc_id not in self._seq:
+            self._seq[doc_id] = self._next
+            self._next += 1
+        return (value, self._seq[doc_id], doc_id)
+
+    def rebuild(self, docs: List[Dict[str, Any]]):
+        self._entries, self._seq, self._next, self._kind, self.complete = [], {}, 0, None, True
+        for doc in docs:
+            self.add(doc)
+
+    def add(self, doc: Dict[str, Any]):
+        value = self._value(doc)
+        if value is not _MISSING:
+            # Logs append in time order, so this is usually an append at the end
+            bisect.insort(self._entries, self._entry(doc, value))
+
+    def remove(self, doc: Dict[str, Any], forget: bool = False):
+        value = _resolve(doc, self.field)
+        if self._kind_of(value) is self._kind and self._kind is not None:
+            entry = self._entry(doc, value)
+            position = bisect.bisect_left(self._entries, entry)
+            if position < len(self._entries) and self._entries[position] == entry:
+                del self._entries[position]
+        if forget:
+            self._seq.pop(doc.get(self.key), None)
+
+    def bounds(self, condition: Any) -> Optional[Dict[str, Any]]:
+        """The range operators of a query condition on the field, or None when the index can't answer it"""
+        if not self.complete:
+            return None
+        if not isinstance(condition, dict):
+            condition = {"$gte": condition, "$lte": condition}
+        if not condition or any(op not in self.RANGE_OPERATORS for op in condition):
+            return None
+        for operand in condition.values():
+            kind = self._kind_of(operand)
+            if kind is None or (self._kind is not None and kind is not self._kind):
+                return None
+        return condition
+
+    def keys(self, bounds: Dict[str, Any], direction: int = 1, limit: Optional[int] = None) -> List[Any]:
+        """Keys within ``bounds``, by the field (1 or -1), at most ``limit`` of them"""
+        start, end = 0, len(self._entries)
+        for op, operand in bounds.items():
+            if op == "$gte":
+                start = max(start, bisect.bisect_left(self._entries, (operand,)))
+            elif op == "$gt":
+                start = max(start, bisect.bisect_left(self._entries, (operand, math.inf)))
+            elif op == "$lte":
+                end = min(end, bisect.bisect_left(self._entries, (operand, math.inf)))
+            else:
+                end = min(end, bisect.bisect_left(self._entries, (operand,)))
+        if direction > 0:
+            stop = end if limit is None else min(end, start + limit)
+            return [doc_id for _, _, doc_id in self._entries[start:stop]]
+        keys = []
+        for _, run in itertools.groupby(reversed(self._entries[start:end] if limit is None else
+                                                 _tail(self._entries, start, end, limit)),
+                                        key=lambda entry: entry[0]):
+            keys.extend(doc_id for _, _, doc_id in reversed(list(run)))
+        return keys if limit is None else keys[:limit]
+
+
+def _tail(entries: List[Tuple[Any, int, Any]], start: int, end: int, limit: int) -> List[Tuple[Any, int, Any]]:
+    """The last ``limit`` entries of ``entries[start:end]``, widened to whole runs of equal values"""
+    first = max(start, end - limit)
+    if first > start:
+        first = max(start, bisect.bisect_left(entries, (entries[first][0],)))
+    return entries[first:end]
+
+
+class JsonCollection:
+    """A JSON array file held in memory with an id index, reloaded when the file changes on disk"""
+
+    backend = "json"
+
+    def __init__(self, path: Path, upgrade: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+                 key: str = "id", indexes: Sequence[Tuple[str, str]] = (), unique: Sequence[str] = (),
+                 ranges: Sequence[str] = ()):
+        self.path = Path(path)
+        self.name = self.path.stem
+        self.upgrade = upgrade
+        self.key = key
+        self._docs: List[Dict[str, Any]] = []
+        self._index: Dict[Any, Dict[str, Any]] = {}
+        # (field, order_by) pairs -> secondary indexes, keyed by field
+        self._secondary = {field: JsonIndex(field, order_by, key) for field, order_by in indexes}
+        self._unique = {field: JsonUniqueIndex(field, key) for field in unique}
+        self._ranges = {field: JsonRangeIndex(field, key) for field in ranges}
+        self._stamp: Any = _MISSING
+        # Written in memory by an open unit of work, not yet on disk
+        self._dirty = False
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _load(self) -> List[Dict[str, Any]]:
+        unit = current_unit_of_work()
+        if self._stamp is not _MISSING and (self._dirty or (unit is not None and self in unit.checked)):
+            # Checked once per request; and never reloaded over writes still to be flushed
+            return self._docs
+        stamp = self._stat()
+        if unit is not None:
+            unit.checked.add(self)
+        if stamp != self._stamp:
+            docs = self._read()
+            if self.upgrade is not None:
+                docs = [self.upgrade(doc) for doc in docs]
+            self._docs = docs
+            self._index = {doc.get(self.key): doc for doc in docs}
+            for index in self._indexes():
+                index.rebuild(docs)
+            self._stamp = stamp
+        return self._docs
+
+    def _read(self) -> List[Dict[str, Any]]:
+        return load_json(self.path)
+
+    def _encode(self, appended: List[Dict[str, Any]]) -> Tuple[bytes, bool]:
+        """The bytes to write, and whether they are appended to the file rather than replacing it"""
+        return dumps(self._docs, indent=True), False
+
+    def _write(self, appended: List[Dict[str, Any]]):
+        started = time.perf_counter()
+        raw, append = self._encode(appended)
+        write_file(self.path, raw, append)
+        observe_storage("append" if append else "save", self.path, started, len(raw))
+        record_span("storage.write", started)
+
+    def _save(self, appended: Sequence[Dict[str, Any]] = ()):
+        """Write the collection out; ``appended`` are the documents an insert added at the end
+
+        Inside a unit of work the write is left to its flush.
+        """
+        unit = current_unit_of_work()
+        if unit is not None:
+            unit.saved(self, list(appended))
+            self._dirty = True
+            return
+        try:
+            self._write(list(appended))
+        except BaseException:
+            self._discard()
+            raise
+        self._stamp = self._stat()
+
+    def _discard(self):
+        """Memory no longer matches the file; reload it on the next access"""
+        self._stamp = _MISSING
+        self._dirty = False
+
+    def _lookup(self, query: Optional[Query]) -> Optional[List[Dict[str, Any]]]:
+        """Candidates for a query on the key or a unique field alone, through their indexes"""
+        if not query or len(query) != 1:
+            return None
+        (field, value), = query.items()
+        if not isinstance(value, str):
+            return None
+        if field == self.key:
+            doc = self._index.get(value)
+        elif field in self._unique:
+            doc = self._index.get(self._unique[field].get(value))
+        else:
+            return None
+        return [doc] if doc is not None else []
+
+    def _index_for(self, query: Optional[Query]) -> Tuple[Optional[JsonIndex], Any]:
+        """A secondary index holding every match of ``query``, and the group to read"""
+        for field, value in (query or {}).items():
+            index = self._secondary.get(field)
+            if index is not None and index.complete and isinstance(value, (str, int, float, bool)):
+                return index, value
+        return None, None
+
+    def _range_for(self, query: Optional[Query], sort: Optional[Sort]) -> Tuple[Optional[JsonRangeIndex], Any]:
+        """A range index answering ``query`` (or, with no query, ``sort``), and the bounds to read"""
+        for field, condition in (query or {}).items():
+            index = self._ranges.get(field)
+            bounds = index.bounds(condition) if index is not None else None
+            if bounds is not None:
+                return index, bounds
+        if not query and sort and len(sort) == 1 and sort[0][0] in self._ranges:
+            index = self._ranges[sort[0][0]]
+            if index.complete:
+                return index, {}
+        return None, None
+
+    def _select(self, query: Optional[Query], sort: Optional[Sort] = None,
+                limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Matching documents, in ``sort`` order when given, otherwise in insertion order
+
+        ``limit`` is a hint: a range index stops reading after that many.
+        """
+        docs = self._load()
+        candidates = self._lookup(query)
+        if candidates is not None:
+            return sort_documents(candidates, sort)
+        index, value = self._index_for(query)
+        if index is not None:
+            presorted = bool(sort) and len(sort) == 1 and sort[0][0] == index.order_by
+            docs = [self._index[doc_id] for doc_id in index.keys(value, sort[0][1] if presorted else None)]
+            if len(query) > 1:
+                docs = [doc for doc in docs if matches(doc, query)]
+            return docs if presorted else sort_documents(docs, sort)
+        ranged, bounds = self._range_for(query, sort)
+        if ranged is not None:
+            presorted = bool(sort) and len(sort) == 1 and sort[0][0] == ranged.field
+            filtered = query is not None and len(query) > 1
+            keys = ranged.keys(bounds, sort[0][1] if presorted else 1,
+                               limit if presorted and not filtered else None)
+            docs = [self._index[doc_id] for doc_id in keys]
+            if filtered:
+                docs = [doc for doc in docs if matches(doc, query)]
+            if presorted:
+                return docs
+            if not sort:
+                # Back to insertion order
+                return sorted(docs, key=lambda doc: ranged._seq[doc.get(self.key)])
+            return sort_documents(docs, sort)
+        if not query:
+            return sort_documents(list(docs), sort)
+        return sort_documents([doc for doc in docs if matches(doc, query)], sort)
+
+    def _indexes(self) -> List[Any]:
+        return [*self._secondary.values(), *self._unique.values(), *self._ranges.values()]
+
+    def _reindex(self, docs: List[Dict[str, Any]]):
+        for index in self._indexes():
+            for doc in docs:
+                index.add(doc)
+
+    def _unindex(self, docs: List[Dict[str, Any]], forget: bool = False):
+        for index in self._indexes():
+            for doc in docs:
+                index.remove(doc, forget)
+
+    def _check_unique(self, doc_id: Any, fields: Dict[str, Any]):
+        """Raise ``DuplicateKeyError`` if writing ``fields`` to ``doc_id`` would repeat a unique value"""
+        for field, index in self._unique.items():
+            if field in fields:
+                index.check(doc_id, fields[field])
+
+    def _check_insert(self, doc: Dict[str, Any]):
+        doc_id = doc.get(self.key)
+        if doc_id in self._index:
+            raise DuplicateKeyError(self.key, doc_id)
+        self._check_unique(doc_id, doc)
+
+    def _out(self, doc: Dict[str, Any], fields: Optional[Sequence[str]] = None,
+             exclude: Sequence[str] = ()) -> Dict[str, Any]:
+        return project_fields(doc, fields, exclude)
+
+    @_timed("get")
+    async def get(self, doc_id: str, fields: Optional[Sequence[str]] = None,
+                  exclude: Sequence[str] = ()) -> Optional[Dict[str, Any]]:
+        self._load()
+        doc = self._index.get(doc_id)
+        return self._out(doc, fields, exclude) if doc is not None else None
+
+    @_timed("find_one")
+    async def find_one(self, query: Optional[Query] = None, fields: Optional[Sequence[str]] = None,
+                       exclude: Sequence[str] = ()) -> Optional[Dict[str, Any]]:
+        docs = self._select(query)
+        return self._out(docs[0], fields, exclude) if docs else None
+
+    @_timed("find")
+    async def find(self, query: Optional[Query] = None, sort: Optional[Sort] = None, limit: Optional[int] = None,
+                   fields: Optional[Sequence[str]] = None, exclude: Sequence[str] = (),
+                   skip: int = 0) -> List[Dict[str, Any]]:
+        docs = self._select(query, sort, skip + limit if limit is not None else None)
+        docs = docs[skip:skip + limit] if limit is not None else docs[skip:]
+        return [self._out(doc, fields, exclude) for doc in docs]
+
+    async def iterate(self, query: Optional[Query] = None, sort: Optional[Sort] = None,
+                      fields: Optional[Sequence[str]] = None, exclude: Sequence[str] = ()) -> AsyncIterator[Dict[str, Any]]:
+        """Documents one at a time, e.g. for streaming exports"""
+        for doc in self._select(query, sort):
+            yield self._out(doc, fields, exclude)
+
+    @_timed("count")
+    async def count(self, query: Optional[Query] = None) -> int:
+        return len(self._load()) if not query else len(self._select(query))
+
+    @_timed("distinct")
+    async def distinct(self, field: str, query: Optional[Query] = None) -> List[Any]:
+        values = []
+        for doc in self._select(query):
+            value = _resolve(doc, field)
+            if value is not _MISSING and value not in values:
+                values.append(value)
+        return values
+
+    @_timed("insert")
+    async def insert(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        self._load()
+        # Checked and applied with no await in between, so concurrent requests can't both pass the check
+        self._check_insert(doc)
+        stored = dict(doc)
+        self._docs.append(stored)
+        self._index[stored.get(self.key)] = stored
+        self._reindex([stored])
+        self._save(appended=[stored])
+        return self._out(stored)
+
+    @_timed("insert_many")
+    async def insert_many(self, docs: List[Dict[str, Any]]) -> Tuple[int, List[Tuple[int, str]]]:
+        """Insert what can be inserted; returns the count and (index, error) for the rest"""
+        self._load()
+        errors = []
+        inserted = []
+        for index, doc in enumerate(docs):
+            try:
+                self._check_insert(doc)
+            except DuplicateKeyError as e:
+                errors.append((index, str(e)))
+                continue
+            stored = dict(doc)
+            self._docs.append(stored)
+            self._index[doc.get(self.key)] = stored
+            self._reindex([stored])
+            inserted.append(stored)
+        if inserted:
+            self._save(appended=inserted)
+        return len(inserted), errors
+
+    @_timed("update_one")
+    async def update_one(self, query: Query, fields: Dict[str, Any],
+                         prepend: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Set ``fields`` (and push ``prepend`` values to the front of arrays) on the first match;
+        returns the updated document, or None when nothing matched"""
+        docs = self._select(query)
+        if not docs:
+            return None
+        doc = docs[0]
+        self._check_unique(doc.get(self.key), fields)
+        self._unindex([doc])
+        for path, value in fields.items():
+            _assign(doc, path, value)
+        for path, value in (prepend or {}).items():
+            current = _resolve(doc, path)
+            _assign(doc, path, [value] + (current if isinstance(current, list) else []))
+        self._reindex([doc])
+        self._save()
+        return self._out(doc)
+
+    @_timed("update_many")
+    async def update_many(self, query: Query, fields: Dict[str, Any]) -> int:
+        docs = self._select(query)
+        for doc in docs:
+            self._check_unique(doc.get(self.key), fields)
+        if len(docs) > 1:
+            repeated = [field for field in self._unique if isinstance(fields.get(field), str)]
+            if repeated:
+                raise DuplicateKeyError(repeated[0], fields[repeated[0]])
+        self._unindex(docs)
+        for doc in docs:
+            for path, value in fields.items():
+                _assign(doc, path, value)
+        self._reindex(docs)
+        if docs:
+            self._save()
+        return len(docs)
+
+    @_timed("delete_one")
+    async def delete_one(self, query: Query) -> bool:
+        docs = self._select(query)
+        if not docs:
+            return False
+        doc = docs[0]
+        self._docs.remove(doc)
+        self._index.pop(doc.get(self.key), None)
+        self._unindex([doc], forget=True)
+        self._save()
+        return True
+
+    @_timed("delete_many")
+    async def delete_many(self, query: Query) -> int:
+        docs = self._select(query)
+        if not docs:
+            return 0
+        removed = {id(doc) for doc in docs}
+        self._docs[:] = [doc for doc in self._docs if id(doc) not in removed]
+        for doc in docs:
+            self._index.pop(doc.get(self.key), None)
+        self._unindex(docs, forget=True)
+        self._save()
+        return len(docs)
+
+    def documents(self) -> List[Dict[str, Any]]:
+        """The stored documents themselves; callers must not modify them"""
+        return self._load()
+
+
+class JsonLogCollection(JsonCollection):
+    """An append-only collection (e.g. order events) as a JSON Lines file
+
+    Inserts append their lines instead of rewriting the file, so writing stays
+    cheap however long the log grows. Updates and deletes, which a log
+    shouldn't need, still rewrite it.
+    """
+
+    def _read(self) -> List[Dict[str, Any]]:
+        return load_json_lines(self.path)
+
+    def _encode(self, appended: List[Dict[str, Any]]) -> Tuple[bytes, bool]:
+        return b"".join(dumps(doc) + b"\n" for doc in appended or self._docs), bool(appended)
+
+
+class JsonProductCollection(JsonCollection):
+    """Products whose reads show live stock from the stock ledger, kept in sync on write"""
+
+    def __init__(self, path: Path, ledger: JsonStockLedger):
+        super().__init__(path, upgrade=upgrade_product)
+        self.ledger = ledger
+
+    def _out(self, doc, fields=None, exclude=()):
+        return super()._out(self.ledger.overlay(doc, self.ledger.available(doc["id"])), fields, exclude)
+
+    async def insert(self, doc):
+        result = await super().insert(doc)
+        self.ledger.set_product_stock(doc)
+        return result
+
+    async def insert_many(self, docs):
+        inserted, errors = await super().insert_many(docs)
+        failed = {index for index, _ in errors}
+        for index, doc in enumerate(docs):
+            if index not in failed and (doc.get("stock") is not None or doc.get("variant_stock")):
+                self.ledger.set_product_stock(doc)
+        return inserted, errors
+
+    async def update_one(self, query, fields, prepend=None):
+        result = await super().update_one(query, fields, prepend)
+        if result is not None and ("stock" in fields or "variant_stock" in fields):
+            self.ledger.set_product_stock(self._index[result["id"]])
+            # The result was read with the counters from before the update
+            result = self._out(self._index[result["id"]])
+        return result
+
+    async def delete_one(self, query):
+        doc = await self.find_one(query, fields=["id"])
+        if doc is None or not await super().delete_one({"id": doc["id"]}):
+            return False
+        self.ledger.remove_product(doc["id"])
+        return True
+
+
+# ============== UNIT OF WORK ==============
+
+_unit_of_work: ContextVar[Optional["JsonUnitOfWork"]] = ContextVar("json_unit_of_work", default=None)
+
+
+def current_unit_of_work() -> Optional["JsonUnitOfWork"]:
+    """The open unit of work of the running request, if any"""
+    unit = _unit_of_work.get()
+    return unit if unit is not None and unit.open else None
+
+
+def _apply_commit(steps: List[Dict[str, Any]]):
+    for step in steps:
+        staged = Path(step["staged"])
+        if not staged.exists():
+            # Applied before the crash that interrupted the commit
+            continue
+        if step["append_at"] is None:
+            os.replace(staged, step["path"])
+            continue
+        # Truncating first makes a repeated append (after a crash) write the lines once
+        with open(step["path"], "ab") as f:
+            f.truncate(step["append_at"])
+            f.write(staged.read_bytes())
+        staged.unlink()
+
+
+def commit_files(data_dir: Path, writes: List[Tuple[Path, bytes, bool]]):
+    """Write (or append to) several files so that a crash leaves all of them written or none
+
+    The new contents are staged next to the files; writing the journal that
+    lists them is the commit point, after which they are moved into place.
+    ``recover_commits`` finishes a commit a crash interrupted.
+    """
+    steps = []
+    for path, raw, append in writes:
+        staged = path.with_name(f"{path.name}.{os.getpid()}.commit")
+        with open(staged, "wb") as f:
+            f.write(raw)
+        steps.append({"path": str(path), "staged": str(staged), "append": append})
+    journal = data_dir / f"commit-{os.getpid()}.journal"
+    with file_lock(data_dir / "commit.lock"):
+        # Under the lock, so no other process appends between the offset and the append
+        for step in steps:
+            path = Path(step["path"])
+            step["append_at"] = (path.stat().st_size if path.exists() else 0) if step.pop("append") else None
+        write_file(journal, dumps(steps))
+        _apply_commit(steps)
+        journal.unlink()
+
+
+def recover_commits(data_dir: Path):
+    """Finish the commits that crashed processes left journaled in ``data_dir``"""
+    # Live processes hold the lock while they commit, so only abandoned journals are found
+    with file_lock(data_dir / "commit.lock"):
+        for journal in data_dir.glob("commit-*.journal"):
+            try:
+                steps = loads(journal.read_bytes())
+            except (OSError, ValueError):
+                continue
+            _apply_commit(steps)
+            journal.unlink()
+            logger.warning(f"Completed an interrupted commit of {len(steps)} files from {journal.name}")
+
+
+class JsonUnitOfWork:
+    """The JSON collections one request reads and writes, written out together when it ends
+
+    While the unit is open each collection checks its file for changes once,
+    on the request's first read of it, and writes change only memory.
+    ``close`` then writes each changed file once, and when several changed,
+    commits them together with ``commit_files``.
+
+    Collections are shared in memory by concurrent requests, so a request
+    that fails still has its writes flushed, as it did before units existed;
+    the unit saves the repeated writes and makes the flush all-or-nothing.
+    """
+
+    def __init__(self, data_dir: Path):
+        self.data_dir = data_dir
+        self.open = True
+        self.checked: Set["JsonCollection"] = set()
+        # Collection -> documents appended since the last flush, or None when the file must be rewritten
+        self.pending: Dict["JsonCollection", Optional[List[Dict[str, Any]]]] = {}
+        self._token = None
+
+    def saved(self, collection: "JsonCollection", appended: List[Dict[str, Any]]):
+        if collection not in self.pending:
+            self.pending[collection] = appended or None
+            return
+        previous = self.pending[collection]
+        self.pending[collection] = previous + appended if previous is not None and appended else None
+
+    def flush(self):
+        pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        started = time.perf_counter()
+        writes = []
+        try:
+            for collection, appended in pending.items():
+                raw, append = collection._encode(appended or [])
+                writes.append((collection.path, raw, append))
+            if len(writes) == 1:
+                write_file(*writes[0])
+            else:
+                commit_files(self.data_dir, writes)
+        except BaseException:
+            for collection in pending:
+                collection._discard()
+            raise
+        for collection in pending:
+            collection._dirty = False
+            collection._stamp = collection._stat()
+        for path, raw, append in writes:
+            observe_storage("append" if append else "save", path, started, len(raw))
+        record_span("storage.write", started)
+
+    def close(self):
+        """Flush, and let later writes go straight to disk"""
+        if self.open:
+            try:
+                self.flush()
+            finally:
+                self.open = False
+
+    def __enter__(self) -> "JsonUnitOfWork":
+        self._token = _unit_of_work.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            self.close()
+        finally:
+            _unit_of_work.reset(self._token)
+
+
+class UnitOfWorkMiddleware:
+    """ASGI middleware running each HTTP request in a storage unit of work
+
+    The unit is flushed just before the response starts, so a failed flush
+    still turns into an error response, and streamed response bodies (which
+    may run for long) read and write outside it.
+    """
+
+    def __init__(self, app, storage):
+        self.app = app
+        self.storage = storage
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with self.storage.unit_of_work() as unit:
+            if unit is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_flushed(message):
+                if message["type"] == "http.response.start":
+                    unit.close()
+                await send(message)
+
+            await self.app(scope, receive, send_flushed)
+
+
+class JsonStorage:
+    """Collections as JSON files in ``data_dir``"""
+
+    name = "json"
+
+    def __init__(self, data_dir: Path, on_change: Optional[Callable[[], None]] = None):
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        recover_commits(self.data_dir)
+        self.stock = JsonStockLedger(self.data_dir / "stock_journal.jsonl", on_change=on_change)
+        self.admins = JsonCollection(self.data_dir / "admins.json", unique=["email"])
+        self.customers = JsonCollection(self.data_dir / "customers.json", unique=["email"])
+        self.categories = JsonCollection(self.data_dir / "categories.json")
+        self.products = JsonProductCollection(self.data_dir / "products.json", self.stock)
+        self.orders = JsonCollection(self.data_dir / "orders.json", upgrade=upgrade_order,
+                                     indexes=[("customer_id", "created_at")])
+        self.messages = JsonCollection(self.data_dir / "messages.json", indexes=[("read", "created_at")])
+        self.message_archive = JsonCollection(self.data_dir / "message_archive.json")
+        self.message_quarantine = JsonCollection(self.data_dir / "message_quarantine.json")
+        # ``at`` ranges: the status counts read only the events logged since they last looked
+        self.order_events = JsonLogCollection(self.data_dir / "order_events.jsonl", indexes=[("order_id", "at")],
+                                              ranges=["at"])
+        self.ledger = AsyncStockLedger(self.stock, self._order_statuses)
+        self.refresh_tokens = JsonRefreshStore(self.data_dir / "refresh_tokens.json", load_json, save_json)
+        self.rate_limits = MemoryBucketStore()
+        self.leader_lock = FileLeaderLock(self.data_dir / "scheduler.lock")
+
+    async def _order_statuses(self) -> Dict[str, str]:
+        return {order["id"]: order.get("status", "pending") for order in self.orders.documents()}
+
+    def unit_of_work(self) -> JsonUnitOfWork:
+        """Buffer the writes of the block (a request) into one flush at its end"""
+        return JsonUnitOfWork(self.data_dir)
+
+    async def start(self):
+        self.stock.load(self.products.documents())
+
+    async def close(self):
+        self.stock.close()
+        await asyncio.to_thread(sync_files, self.data_dir)
+
+    async def ping(self):
+        if not os.access(self.data_dir, os.W_OK):
+            raise OSError(f"Data directory {self.data_dir} is not writable")
+
+
+# ============== MONGO BACKEND ==============
+
+# Unique fields compare case-insensitively, like unique_key on the other backends
+_CASE_INSENSITIVE = {"locale": "en", "strength": 2}
+
+
+def _projection(fields: Optional[Sequence[str]], exclude: Sequence[str]) -> Dict[str, int]:
+    if fields is not None:
+        return {"_id": 0, **{field: 1 for field in fields}}
+    return {"_id": 0, **{field: 0 for field in exclude}}
+
+
+class MongoCollection:
+    """The repository interface over a Motor collection"""
+
+    backend = "mongo"
+    batch_size = 500
+
+    def __init__(self, collection, upgrade: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+                 indexes: Sequence[List[Tuple[str, int]]] = (), unique: Sequence[str] = ()):
+        self.collection = collection
+        self.name = collection.name
+        self.upgrade = upgrade
+        self.indexes = list(indexes)
+        self.unique = tuple(unique)
+
+    async def ensure_indexes(self):
+        for keys in self.indexes:
+            await self.collection.create_index(keys)
+
+    async def ensure_unique_indexes(self):
+        """Build the case-insensitive unique indexes, replacing an index on the field built without the collation
+
+        An older index on the field (like ``email_1`` from an init script)
+        would make the build fail, leaving a case-sensitive index that the
+        case-insensitive lookups of ``_collation`` can't use.
+        """
+        existing = await self.collection.index_information()
+        for field in self.unique:
+            for name, info in list(existing.items()):
+                if [key for key, _ in info["key"]] != [field]:
+                    continue
+                collation = info.get("collation") or {}
+                if (info.get("unique") and collation.get("locale") == _CASE_INSENSITIVE["locale"]
+                        and collation.get("strength") == _CASE_INSENSITIVE["strength"]):
+                    continue
+                logger.warning(f"Replacing index {self.name}.{name}: {field} needs a case-insensitive unique index")
+                await self.collection.drop_index(name)
+            await self.collection.create_index(field, unique=True, collation=_CASE_INSENSITIVE)
+
+    def _collation(self, query: Optional[Query]) -> Optional[Dict[str, Any]]:
+        """The unique index's collation for a query on a unique field alone, so it matches case-insensitively"""
+        if query and len(query) == 1:
+            (field, value), = query.items()
+            if field in self.unique and isinstance(value, str):
+                return _CASE_INSENSITIVE
+        return None
+
+    @staticmethod
+    def _duplicate(error, doc: Dict[str, Any]) -> DuplicateKeyError:
+        field = next(iter((error.details or {}).get("keyPattern") or {"id": 1}))
+        return DuplicateKeyError(field, doc.get(field))
+
+    def _out(self, doc):
+        if doc is None or self.upgrade is None:
+            return doc
+        return self.upgrade(doc)
+
+    @_timed("get")
+    async def get(self, doc_id, fields=None, exclude=()):
+        return self._out(await self.collection.find_one({"id": doc_id}, _projection(fields, exclude)))
+
+    @_timed("find_one")
+    async def find_one(self, query=None, fields=None, exclude=()):
+        return self._out(await self.collection.find_one(query or {}, _projection(fields, exclude),
+                                                        collation=self._collation(query)))
+
+    @_timed("find")
+    async def find(self, query=None, sort=None, limit=None, fields=None, exclude=(), skip=0):
+        cursor = self.collection.find(query or {}, _projection(fields, exclude), collation=self._collation(query))
+        if sort:
+            cursor = cursor.sort(list(sort))
+        if skip:
+            cursor = cursor.skip(skip)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return [self._out(doc) for doc in await cursor.to_list(None)]
+
+    async def iterate(self, query=None, sort=None, fields=None, exclude=()):
+        cursor = self.collection.find(query or {}, _projection(fields, exclude))
+        if sort:
+            cursor = cursor.sort(list(sort))
+        async for doc in cursor.batch_size(self.batch_size):
+            yield self._out(doc)
+
+    @_timed("count")
+    async def count(self, query=None):
+        return await self.collection.count_documents(query or {}, collation=self._collation(query))
+
+    @_timed("distinct")
+    async def distinct(self, field, query=None):
+        return await self.collection.distinct(field, query or {})
+
+    @_timed("insert")
+    async def insert(self, doc):
+        from pymongo.errors import DuplicateKeyError as MongoDuplicateKeyError
+
+        # insert_one adds _id to the document it is given
+        try:
+            await self.collection.insert_one(dict(doc))
+        except MongoDuplicateKeyError as e:
+            raise self._duplicate(e, doc) from None
+        return dict(doc)
+
+    @_timed("insert_many")
+    async def insert_many(self, docs):
+        from pymongo.errors import BulkWriteError
+
+        if not docs:
+            return 0, []
+        try:
+            result = await self.collection.insert_many([dict(doc) for doc in docs], ordered=False)
+        except BulkWriteError as e:
+            return e.details.get("nInserted", 0), [
+                (error["index"], error.get("errmsg", "Write failed")) for error in e.details.get("writeErrors", [])
+            ]
+        return len(result.inserted_ids), []
+
+    @_timed("update_one")
+    async def update_one(self, query, fields, prepend=None):
+        from pymongo import ReturnDocument
+        from pymongo.errors import DuplicateKeyError as MongoDuplicateKeyError
+
+        update: Dict[str, Any] = {"$set": fields}
+        if prepend:
+            update["$push"] = {path: {"$each": [value], "$position": 0} for path, value in prepend.items()}
+        try:
+            return self._out(await self.collection.find_one_and_update(
+                query, update, projection={"_id": 0}, return_document=ReturnDocument.AFTER
+            ))
+        except MongoDuplicateKeyError as e:
+            raise self._duplicate(e, fields) from None
+
+    @_timed("update_many")
+    async def update_many(self, query, fields):
+        from pymongo.errors import DuplicateKeyError as MongoDuplicateKeyError
+
+        try:
+            result = await self.collection.update_many(query, {"$set": fields})
+        except MongoDuplicateKeyError as e:
+            raise self._duplicate(e, fields) from None
+        return result.modified_count
+
+    @_timed("delete_one")
+    async def delete_one(self, query):
+        result = await self.collection.delete_one(query)
+        return result.deleted_count > 0
+
+    @_timed("delete_many")
+    async def delete_many(self, query):
+        result = await self.collection.delete_many(query)
+        return result.deleted_count
+
+
+class DeferredCollection:
+    """A collection of a ``DeferredDatabase``: attribute access goes to the Motor collection"""
+
+    def __init__(self, database: "DeferredDatabase", name: str):
+        self.database = database
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(self.database.resolve()[self.name], attr)
+
+
+class DeferredDatabase:
+    """A Motor database whose client is created the first time a collection is used
+
+    Creating the client imports motor and pymongo, and for a ``mongodb+srv://``
+    URL resolves its DNS records; deferring it keeps both out of the import
+    of the app. ``db.<name>`` is a ``DeferredCollection``.
+    """
+
+    def __init__(self, url: str, db_name: str):
+        self.url = url
+        self.db_name = db_name
+        self.client = None
+        self._db = None
+
+    def resolve(self):
+        """The Motor database, creating the client on first use"""
+        if self._db is None:
+            from motor.motor_asyncio import AsyncIOMotorClient
+            from metrics import MongoCommandMetrics
+            from profiling import SlowQueryListener
+
+            self.client = AsyncIOMotorClient(self.url, event_listeners=[MongoCommandMetrics(), SlowQueryListener()])
+            self._db = self.client[self.db_name]
+        return self._db
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return DeferredCollection(self, name)
+
+    async def command(self, *args, **kwargs):
+        return await self.resolve().command(*args, **kwargs)
+
+    def watch(self, *args, **kwargs):
+        return self.resolve().watch(*args, **kwargs)
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+
+
+class MongoStorage:
+    """Collections in a MongoDB database, connected on first use"""
+
+    name = "mongo"
+
+    def __init__(self, url: str, db_name: str, on_change: Optional[Callable[[], None]] = None):
+        self.db = DeferredDatabase(url, db_name)
+        self.admins = MongoCollection(self.db.admins, unique=["email"])
+        self.customers = MongoCollection(self.db.customers, unique=["email"])
+        self.categories = MongoCollection(self.db.categories)
+        self.products = MongoCollection(self.db.products, upgrade=upgrade_product)
+        self.orders = MongoCollection(self.db.orders, upgrade=upgrade_order,
+                                      indexes=[[("customer_id", 1), ("created_at", -1)]])
+        self.messages = MongoCollection(self.db.contact_messages,
+                                        indexes=[[("read", 1), ("created_at", -1), ("id", -1)],
+                                                 [("created_at", -1), ("id", -1)]])
+        self.message_archive = MongoCollection(self.db.contact_message_archive, indexes=[[("last_created_at", 1)]])
+        self.message_quarantine = MongoCollection(self.db.contact_message_quarantine, indexes=[[("created_at", -1)]])
+        self.order_events = MongoCollection(self.db.order_events, indexes=[[("order_id", 1), ("at", 1)], [("at", 1)]])
+        self.ledger = MongoStockLedger(self.db, on_change=on_change)
+        self.refresh_tokens = MongoRefreshStore(self.db)
+        # RATE_LIMIT_STORE=mongo shares rate limits between workers
+        self.rate_limits = MongoBucketStore(self.db) if os.environ.get('RATE_LIMIT_STORE') == 'mongo' else MemoryBucketStore()
+        self.leader_lock = MongoLeaderLock(self.db)
+
+    def unit_of_work(self):
+        """No buffering: each write is its own atomic update on the server"""
+        return nullcontext()
+
+    async def start(self):
+        indexed = [self.admins, self.customers, self.orders, self.order_events, self.messages,
+                   self.message_archive, self.message_quarantine, self.ledger, self.refresh_tokens]
+        if isinstance(self.rate_limits, MongoBucketStore):
+            indexed.append(self.rate_limits)
+        for owner in indexed:
+            try:
+                await owner.ensure_indexes()
+            except Exception as e:
+                # The app still serves requests without them, only slower
+                logger.error(f"Failed to create indexes for {type(owner).__name__}: {str(e)}")
+        # Not caught: without these, account emails are neither unique nor found case-insensitively
+        for collection in (self.admins, self.customers):
+            try:
+                await collection.ensure_unique_indexes()
+            except Exception as e:
+                raise RuntimeError(f"Cannot build the unique indexes of {collection.name} "
+                                   f"(are there emails differing only in case?): {str(e)}") from e
+
+    async def close(self):
+        self.db.close()
+
+    async def ping(self):
+        await self.db.command("ping")
+
+
+# ============== SQLITE BACKEND ==============
+
+SQLITE_POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", "4"))
+SQLITE_BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", "10"))
+SQLITE_STREAM_BATCH = 500
+
+_SQL_PATH = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+_SQL_SCALARS = (str, int, float, bool, type(None))
+_SQL_COMPARISONS = {"$lt": "<", "$lte": "<=", "$gt": ">", "$gte": ">="}
+
+
+class SqlitePool:
+    """One SQLite connection per worker thread, so queries run off the event loop
+
+    Connections use WAL journaling (readers never block the writer) and keep
+    their prepared statements cached across calls.
+    """
+
+    def __init__(self, path: Path, size: int = SQLITE_POOL_SIZE):
+        self.path = Path(path)
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="sqlite")
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def connect(self) -> sqlite3.Connection:
+        # Autocommit: reads are single statements, writes open their own transaction
+        conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None,
+                               check_same_thread=False, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self.connect()
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """``func(connection, *args)`` on a pool thread"""
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, lambda: func(self._connection(), *args))
+        finally:
+            record_span("storage.sqlite", started)
+
+    async def stream(self, sql: str, params: Sequence[Any], batch: int = SQLITE_STREAM_BATCH) -> AsyncIterator[list]:
+        """Rows of a query in batches, on a connection of its own so the cursor survives between batches"""
+        loop = asyncio.get_running_loop()
+        conn = await loop.run_in_executor(self._executor, self.connect)
+        try:
+            cursor = await loop.run_in_executor(self._executor, conn.execute, sql, params)
+            while True:
+                rows = await loop.run_in_executor(self._executor, cursor.fetchmany, batch)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            conn.close()
+
+    @contextmanager
+    def transaction(self, conn: sqlite3.Connection):
+        """A write transaction; writers in this process queue on a lock instead of SQLite's busy polling"""
+        with self._write_lock:
+            # IMMEDIATE takes the write lock up front, so a read-modify-write can't lose a race
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            if self._connections:
+                # synchronous=NORMAL leaves the last commits in the WAL; a checkpoint syncs them into the database
+                self._connections[0].execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            for conn in self._connections:
+                try:
+                    conn.execute("PRAGMA optimize")
+                finally:
+                    conn.close()
+            self._connections.clear()
+
+
+class SqliteCollection:
+    """A table of JSON documents (``id`` primary key, ``doc`` JSON1 text)
+
+    ``indexed`` fields (or tuples of fields, for a compound index) get an
+    expression index on ``json_extract`` and are filtered and sorted in SQL;
+    they must hold scalars. ``unique`` fields get a unique index on their
+    ``lower(trim(...))``, which also serves lookups on them. Conditions on
+    other fields, and
+    operators SQL can't express, are checked with ``matches`` on the rows
+    the indexed conditions select, so every query behaves as on the other
+    backends.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, pool: SqlitePool, name: str, indexed: Sequence[Any] = (),
+                 upgrade: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None, unique: Sequence[str] = ()):
+        self.pool = pool
+        self.name = name
+        self.indexes = [(fields,) if isinstance(fields, str) else tuple(fields) for fields in indexed]
+        self.unique = tuple(unique)
+        self.upgrade = upgrade
+        self._columns = {"id": "id", **{field: self._extract(field)
+                                         for fields in [*self.indexes, self.unique] for field in fields}}
+
+    @staticmethod
+    def _extract(path: str) -> str:
+        return f"json_extract(doc, '$.{path}')"
+
+    def _unique_column(self, field: str) -> str:
+        return f"lower(trim({self._extract(field)}))"
+
+    def _unique_index(self, field: str) -> str:
+        return f"{self.name}_{field.replace('.', '_')}_unique"
+
+    def _duplicate(self, error: sqlite3.IntegrityError, doc: Dict[str, Any]) -> DuplicateKeyError:
+        """The ``DuplicateKeyError`` for a failed UNIQUE constraint (the id, or the unique index it names)"""
+        field = next((field for field in self.unique if self._unique_index(field) in str(error)), "id")
+        return DuplicateKeyError(field, _resolve(doc, field))
+
+    def create_schema(self, conn: sqlite3.Connection):
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {self.name} "
+                     f"(id TEXT PRIMARY KEY, doc TEXT NOT NULL CHECK (json_valid(doc)))")
+        for fields in self.indexes:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.name}_{'_'.join(fields).replace('.', '_')} "
+                         f"ON {self.name} ({', '.join(self._columns[field] for field in fields)})")
+        for field in self.unique:
+            try:
+                conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {self._unique_index(field)} "
+                             f"ON {self.name} ({self._unique_column(field)})")
+            except sqlite3.IntegrityError as e:
+                # Rows already repeat a value; lookups still work, but nothing stops new repeats
+                logger.error(f"Cannot enforce unique {self.name}.{field}: {str(e)}")
+
+    # ----- query compilation -----
+
+    def _condition(self, field: str, condition: Any) -> Optional[Tuple[str, List[Any]]]:
+        """SQL for one field's condition, or None when it has to be checked in Python"""
+        column = self._columns.get(field)
+        if column is None:
+            return None
+        if not isinstance(condition, dict) or not any(key.startswith("$") for key in condition):
+            condition = {"$eq": condition}
+        parts, params = [], []
+        for op, value in condition.items():
+            if op in ("$eq", "$ne"):
+                if not isinstance(value, _SQL_SCALARS):
+                    return None
+                # IS compares NULL (a missing field) like any other value, and can use the index
+                parts.append(f"{column} IS {'NOT ' if op == '$ne' else ''}?")
+                params.append(value)
+            elif op in ("$in", "$nin"):
+                if not isinstance(value, (list, tuple)) or not all(isinstance(v, _SQL_SCALARS) for v in value):
+                    return None
+                values = [v for v in value if v is not None]
+                listed = f"{column} IN ({', '.join('?' * len(values))})" if values else "0"
+                has_null = len(values) < len(value)
+                if op == "$in":
+                    parts.append(f"({listed} OR {column} IS NULL)" if has_null else listed)
+                else:
+                    parts.append(f"({column} IS NOT NULL AND NOT {listed})" if has_null
+                                 else f"({column} IS NULL OR NOT {listed})")
+                params.extend(values)
+            elif op in _SQL_COMPARISONS:
+                if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                    return None
+                parts.append(f"{column} {_SQL_COMPARISONS[op]} ?")
+                params.append(value)
+            elif op == "$exists":
+                exists = "1" if field == "id" else f"json_type(doc, '$.{field}') IS NOT NULL"
+                parts.append(exists if value else f"NOT ({exists})")
+            else:
+                return None
+        return " AND ".join(parts), params
+
+    def _where(self, query: Optional[Query]) -> Tuple[str, List[Any], bool]:
+        """WHERE clause, its parameters, and whether it expresses the whole query"""
+        if query and len(query) == 1:
+            (field, value), = query.items()
+            if field in self.unique and isinstance(value, str):
+                return f"{self._unique_column(field)} = ?", [unique_key(value)], True
+        clauses, params, exact = [], [], True
+        for field, condition in (query or {}).items():
+            if field == "$or":
+                branches = [self._where(branch) for branch in condition]
+                if all(branch_exact for _, _, branch_exact in branches):
+                    clauses.append("(" + " OR ".join(f"({sql})" for sql, _, _ in branches) + ")" if branches else "0")
+                    for _, branch_params, _ in branches:
+                        params.extend(branch_params)
+                else:
+                    exact = False
+                continue
+            if field == "$and":
+                for sql, branch_params, branch_exact in (self._where(branch) for branch in condition):
+                    clauses.append(f"({sql})")
+                    params.extend(branch_params)
+                    exact = exact and branch_exact
+                continue
+            compiled = self._condition(field, condition)
+            if compiled is None:
+                exact = False
+                continue
+            clauses.append(compiled[0])
+            params.extend(compiled[1])
+        return " AND ".join(clauses) or "1", params, exact
+
+    def _order_by(self, sort: Optional[Sort]) -> Optional[str]:
+        """ORDER BY clause, ties in insertion order like the other backends; None if SQL can't sort"""
+        terms = []
+        for field, direction in sort or []:
+            if not _SQL_PATH.match(field):
+                return None
+            column = self._columns.get(field) or self._extract(field)
+            terms.append(f"{column} {'DESC' if direction < 0 else 'ASC'}")
+        return ", ".join(terms + ["rowid"])
+
+    def _decode(self, raw: str) -> Dict[str, Any]:
+        doc = loads(raw)
+        return self.upgrade(doc) if self.upgrade is not None else doc
+
+    # ----- statements (run on pool threads) -----
+
+    def _select(self, conn: sqlite3.Connection, query: Optional[Query] = None, sort: Optional[Sort] = None,
+                limit: Optional[int] = None, with_rowid: bool = False, skip: int = 0) -> List[Any]:
+        where, params, exact = self._where(query)
+        order = self._order_by(sort)
+        sql = f"SELECT rowid, doc FROM {self.name} WHERE {where} ORDER BY {order or 'rowid'}"
+        if exact and order is not None and (limit is not None or skip):
+            sql += f" LIMIT {-1 if limit is None else int(limit)} OFFSET {int(skip)}"
+            skip = 0
+        end = None if limit is None else skip + limit
+        docs = []
+        for rowid, raw in conn.execute(sql, params):
+            doc = self._decode(raw)
+            if exact or matches(doc, query):
+                docs.append((rowid, doc) if with_rowid else doc)
+                if order is not None and end is not None and len(docs) >= end:
+                    break
+        if order is None:
+            docs = sort_documents(docs, sort)
+        return docs[skip:end]
+
+    def _get(self, conn: sqlite3.Connection, doc_id: str) -> Optional[Dict[str, Any]]:
+        row = conn.execute(f"SELECT doc FROM {self.name} WHERE id = ?", (doc_id,)).fetchone()
+        return self._decode(row[0]) if row else None
+
+    def _count(self, conn: sqlite3.Connection, query: Optional[Query]) -> int:
+        where, params, exact = self._where(query)
+        if not exact:
+            return len(self._select(conn, query))
+        return conn.execute(f"SELECT COUNT(*) FROM {self.name} WHERE {where}", params).fetchone()[0]
+
+    def _insert(self, conn: sqlite3.Connection, docs: List[Dict[str, Any]]) -> List[Tuple[int, DuplicateKeyError]]:
+        errors = []
+        with self.pool.transaction(conn):
+            for index, doc in enumerate(docs):
+                try:
+                    conn.execute(f"INSERT INTO {self.name} (id, doc) VALUES (?, ?)",
+                                 (doc["id"], dumps(doc).decode("utf-8")))
+                except sqlite3.IntegrityError as e:
+                    errors.append((index, self._duplicate(e, doc)))
+        return errors
+
+    def _update(self, conn: sqlite3.Connection, query: Query, fields: Dict[str, Any],
+                prepend: Optional[Dict[str, Any]], limit: Optional[int]) -> List[Dict[str, Any]]:
+        with self.pool.transaction(conn):
+            rows = self._select(conn, query, limit=limit, with_rowid=True)
+            for rowid, doc in rows:
+                for path, value in fields.items():
+                    _assign(doc, path, value)
+                for path, value in (prepend or {}).items():
+                    current = _resolve(doc, path)
+                    _assign(doc, path, [value] + (current if isinstance(current, list) else []))
+                try:
+                    conn.execute(f"UPDATE {self.name} SET doc = ? WHERE rowid = ?",
+                                 (dumps(doc).decode("utf-8"), rowid))
+                except sqlite3.IntegrityError as e:
+                    # Rolls the whole update back
+                    raise self._duplicate(e, doc) from None
+        return [doc for _, doc in rows]
+
+    def _delete(self, conn: sqlite3.Connection, query: Query, limit: Optional[int]) -> List[str]:
+        with self.pool.transaction(conn):
+            rows = self._select(conn, query, limit=limit, with_rowid=True)
+            conn.executemany(f"DELETE FROM {self.name} WHERE rowid = ?", [(rowid,) for rowid, _ in rows])
+        return [doc["id"] for _, doc in rows]
+
+    # ----- repository interface -----
+
+    def _out(self, doc: Dict[str, Any], fields: Optional[Sequence[str]] = None,
+             exclude: Sequence[str] = ()) -> Dict[str, Any]:
+        return project_fields(doc, fields, exclude)
+
+    @_timed("get")
+    async def get(self, doc_id: str, fields: Optional[Sequence[str]] = None,
+                  exclude: Sequence[str] = ()) -> Optional[Dict[str, Any]]:
+        doc = await self.pool.run(self._get, doc_id)
+        return self._out(doc, fields, exclude) if doc is not None else None
+
+    @_timed("find_one")
+    async def find_one(self, query: Optional[Query] = None, fields: Optional[Sequence[str]] = None,
+                       exclude: Sequence[str] = ()) -> Optional[Dict[str, Any]]:
+        docs = await self.pool.run(self._select, query, None, 1)
+        return self._out(docs[0], fields, exclude) if docs else None
+
+    @_timed("find")
+    async def find(self, query: Optional[Query] = None, sort: Optional[Sort] = None, limit: Optional[int] = None,
+                   fields: Optional[Sequence[str]] = None, exclude: Sequence[str] = (),
+                   skip: int = 0) -> List[Dict[str, Any]]:
+        docs = await self.pool.run(self._select, query, sort, limit, False, skip)
+        return [self._out(doc, fields, exclude) for doc in docs]
+
+    async def iterate(self, query: Optional[Query] = None, sort: Optional[Sort] = None,
+                      fields: Optional[Sequence[str]] = None, exclude: Sequence[str] = ()) -> AsyncIterator[Dict[str, Any]]:
+        """Documents one at a time, read in batches, e.g. for streaming exports"""
+        where, params, exact = self._where(query)
+        order = self._order_by(sort)
+        if order is None:
+            for doc in await self.pool.run(self._select, query, sort, None):
+                yield self._out(doc, fields, exclude)
+            return
+        async for rows in self.pool.stream(f"SELECT doc FROM {self.name} WHERE {where} ORDER BY {order}", params):
+            for (raw,) in rows:
+                doc = self._decode(raw)
+                if exact or matches(doc, query):
+                    yield self._out(doc, fields, exclude)
+
+    @_timed("count")
+    async def count(self, query: Optional[Query] = None) -> int:
+        return await self.pool.run(self._count, query)
+
+    @_timed("distinct")
+    async def distinct(self, field: str, query: Optional[Query] = None) -> List[Any]:
+        values = []
+        for doc in await self.pool.run(self._select, query):
+            value = _resolve(doc, field)
+            if value is not _MISSING and value not in values:
+                values.append(value)
+        return values
+
+    @_timed("insert")
+    async def insert(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        stored = dict(doc)
+        errors = await self.pool.run(self._insert, [stored])
+        if errors:
+            raise errors[0][1]
+        return self._out(stored)
+
+    @_timed("insert_many")
+    async def insert_many(self, docs: List[Dict[str, Any]]) -> Tuple[int, List[Tuple[int, str]]]:
+        """Insert what can be inserted; returns the count and (index, error) for the rest"""
+        errors = await self.pool.run(self._insert, docs)
+        return len(docs) - len(errors), [(index, str(error)) for index, error in errors]
+
+    @_timed("update_one")
+    async def update_one(self, query: Query, fields: Dict[str, Any],
+                         prepend: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Set ``fields`` (and push ``prepend`` values to the front of arrays) on the first match;
+        returns the updated document, or None when nothing matched"""
+        docs = await self.pool.run(self._update, query, fields, prepend, 1)
+        return self._out(docs[0]) if docs else None
+
+    @_timed("update_many")
+    async def update_many(self, query: Query, fields: Dict[str, Any]) -> int:
+        return len(await self.pool.run(self._update, query, fields, None, None))
+
+    @_timed("delete_one")
+    async def delete_one(self, query: Query) -> bool:
+        return bool(await self.pool.run(self._delete, query, 1))
+
+    @_timed("delete_many")
+    async def delete_many(self, query: Query) -> int:
+        return len(await self.pool.run(self._delete, query, None))
+
+
+class SqliteProductCollection(SqliteCollection):
+    """Products whose reads show live stock from the stock ledger, kept in sync on write"""
+
+    def __init__(self, pool: SqlitePool, ledger: JsonStockLedger):
+        super().__init__(pool, "products", indexed=["category_id"], upgrade=upgrade_product)
+        self.ledger = ledger
+
+    def _out(self, doc, fields=None, exclude=()):
+        return super()._out(self.ledger.overlay(doc, self.ledger.available(doc["id"])), fields, exclude)
+
+    async def documents(self) -> List[Dict[str, Any]]:
+        """Stored documents without the live stock overlay"""
+        return await self.pool.run(self._select)
+
+    async def insert(self, doc):
+        result = await super().insert(doc)
+        self.ledger.set_product_stock(doc)
+        return result
+
+    async def insert_many(self, docs):
+        inserted, errors = await super().insert_many(docs)
+        failed = {index for index, _ in errors}
+        for index, doc in enumerate(docs):
+            if index not in failed and (doc.get("stock") is not None or doc.get("variant_stock")):
+                self.ledger.set_product_stock(doc)
+        return inserted, errors
+
+    @_timed("update_one")
+    async def update_one(self, query, fields, prepend=None):
+        docs = await self.pool.run(self._update, query, fields, prepend, 1)
+        if not docs:
+            return None
+        if "stock" in fields or "variant_stock" in fields:
+            self.ledger.set_product_stock(docs[0])
+        return self._out(docs[0])
+
+    @_timed("delete_one")
+    async def delete_one(self, query):
+        deleted = await self.pool.run(self._delete, query, 1)
+        for product_id in deleted:
+            self.ledger.remove_product(product_id)
+        return bool(deleted)
+
+
+class SqliteStorage:
+    """Collections as tables of one SQLite database file"""
+
+    name = "sqlite"
+
+    def __init__(self, path: Path, on_change: Optional[Callable[[], None]] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Stock, refresh tokens and the scheduler lock live in files next to the database
+        sibling = lambda suffix: self.path.with_name(f"{self.path.stem}_{suffix}")
+        self.pool = SqlitePool(self.path)
+        self.stock = JsonStockLedger(sibling("stock_journal.jsonl"), on_change=on_change)
+        self.admins = SqliteCollection(self.pool, "admins", unique=["email"])
+        self.customers = SqliteCollection(self.pool, "customers", indexed=["created_at"], unique=["email"])
+        self.categories = SqliteCollection(self.pool, "categories")
+        self.products = SqliteProductCollection(self.pool, self.stock)
+        self.orders = SqliteCollection(self.pool, "orders",
+                                       indexed=["status", "created_at", ("customer_id", "created_at")],
+                                       upgrade=upgrade_order)
+        self.messages = SqliteCollection(self.pool, "messages",
+                                         indexed=[("created_at", "id"), ("read", "created_at", "id")])
+        self.message_archive = SqliteCollection(self.pool, "message_archive", indexed=["last_created_at"])
+        self.message_quarantine = SqliteCollection(self.pool, "message_quarantine", indexed=["created_at"])
+        self.order_events = SqliteCollection(self.pool, "order_events", indexed=[("order_id", "at"), "at"])
+        self.ledger = AsyncStockLedger(self.stock, self._order_statuses)
+        self.refresh_tokens = JsonRefreshStore(sibling("refresh_tokens.json"), load_json, save_json)
+        self.rate_limits = MemoryBucketStore()
+        self.leader_lock = FileLeaderLock(sibling("scheduler.lock"))
+
+        # The schema exists before the first request, even without the startup hook
+        conn = self.pool.connect()
+        try:
+            for collection in (self.admins, self.customers, self.categories, self.products, self.orders,
+                               self.messages, self.message_archive, self.message_quarantine, self.order_events):
+                collection.create_schema(conn)
+        finally:
+            conn.close()
+
+    async def _order_statuses(self) -> Dict[str, str]:
+        def statuses(conn):
+            return dict(conn.execute("SELECT id, coalesce(json_extract(doc, '$.status'), 'pending') FROM orders"))
+        return await self.pool.run(statuses)
+
+    def unit_of_work(self):
+        """No buffering: each write commits as its own transaction"""
+        return nullcontext()
+
+    async def start(self):
+        self.stock.load(await self.products.documents())
+
+    async def close(self):
+        self.stock.close()
+        self.pool.close()
+
+    async def ping(self):
+        await self.pool.run(lambda conn: conn.execute("SELECT 1").fetchone())
+
+
+def create_storage(backend: Optional[str] = None, on_change: Optional[Callable[[], None]] = None):
+    """The storage backend named by ``backend`` or ``STORAGE_BACKEND``"""
+    backend = (backend or os.environ.get("STORAGE_BACKEND", "mongo")).lower()
+    if backend == "json":
+        return JsonStorage(Path(os.environ.get("DATA_DIR", "data")), on_change=on_change)
+    if backend == "sqlite":
+        data_dir = Path(os.environ.get("DATA_DIR", "data"))
+        return SqliteStorage(Path(os.environ.get("SQLITE_PATH", data_dir / "store.sqlite3")), on_change=on_change)
+    if backend == "mongo":
+        url = os.environ.get('MONGODB_URI', os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+        return MongoStorage(url, os.environ.get('DB_NAME', 'pulgax_3d_store'), on_change=on_change)
+    raise ValueError(f"Unknown STORAGE_BACKEND '{backend}': use 'mongo', 'sqlite' or 'json'")
@@ -21,10 +21,17 @@ def validate_product_data(product: Dict[str, Any]) -> Dict[str, Any]:
     if product.get('base_price') and product['base_price'] < 0:
         errors.append("Base price cannot be negative")
     
+    # Validate stock
+    if product.get('stock') is not None and product['stock'] < 0:
+        errors.append("Stock cannot be negative")
+    for key, value in (product.get('variant_stock') or {}).items():
+        if value is not None and value < 0:
+            errors.append(f"Variant stock {key} cannot be negative")
+    
     # Validate colors
     if product.get('colors'):
         for i, color in enumerate(product['colors']):
-            if not color.get('name'):
+            if not (color.get('name') or color.get('name_pt')):
                 errors.append(f"Color {i} missing name")
             if not color.get('hex_code') or not color['hex_code'].startswith('#'):
                 errors.append(f"Color {i} invalid hex code")
@@ -40,7 +47,7 @@ def validate_product_data(product: Dict[str, Any]) -> Dict[str, Any]:
     # Validate customization options
     if product.get('customization_options'):
         for i, opt in enumerate(product['customization_options']):
-            if not opt.get('name'):
+            if not (opt.get('name') or opt.get('name_pt')):
                 errors.append(f"Customization option {i} missing name")
             if opt.get('price_modifier') and opt['price_modifier'] < 0:
                 errors.append(f"Customization option {i} price modifier cannot be negative")
@@ -114,9 +121,10 @@ def validate_category_references(products: List[Dict[str, Any]], categories: Lis
         'errors': errors
     }
 
-def run_full_validation(data_dir: Path = Path("data")) -> Dict[str, Any]:
+def validate_dataset(products: List[Dict[str, Any]], categories: List[Dict[str, Any]],
+                     orders: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
-    Run full validation on all data files
+    Validate products, category references and orders against each other
     """
     results = {
         'valid': True,
@@ -124,6 +132,30 @@ def run_full_validation(data_dir: Path = Path("data")) -> Dict[str, Any]:
         'warnings': []
     }
     
+    # Validate products
+    for product in products:
+        validation = validate_product_data(product)
+        if not validation['valid']:
+            results['errors'].extend([f"Product {product.get('id', 'unknown')}: {error}" for error in validation['errors']])
+    
+    # Validate category references
+    cat_validation = validate_category_references(products, categories)
+    if not cat_validation['valid']:
+        results['errors'].extend(cat_validation['errors'])
+    
+    # Validate orders
+    for order in orders:
+        order_validation = validate_order_data(order, products)
+        if not order_validation['valid']:
+            results['errors'].extend([f"Order {order.get('order_number', 'unknown')}: {error}" for error in order_validation['errors']])
+    
+    results['valid'] = len(results['errors']) == 0
+    return results
+
+def run_full_validation(data_dir: Path = Path("data")) -> Dict[str, Any]:
+    """
+    Run full validation on all data files
+    """
     try:
         # Load data
         with open(data_dir / "products.json", 'r', encoding='utf-8') as f:
@@ -134,31 +166,10 @@ def run_full_validation(data_dir: Path = Path("data")) -> Dict[str, Any]:
         
         with open(data_dir / "orders.json", 'r', encoding='utf-8') as f:
             orders = json.load(f)
-        
-        # Validate products
-        for product in products:
-            validation = validate_product_data(product)
-            if not validation['valid']:
-                results['errors'].extend([f"Product {product.get('id', 'unknown')}: {error}" for error in validation['errors']])
-        
-        # Validate category references
-        cat_validation = validate_category_references(products, categories)
-        if not cat_validation['valid']:
-            results['errors'].extend(cat_validation['errors'])
-        
-        # Validate orders
-        for order in orders:
-            order_validation = validate_order_data(order, products)
-            if not order_validation['valid']:
-                results['errors'].extend([f"Order {order.get('order_number', 'unknown')}: {error}" for error in order_validation['errors']])
-        
-        results['valid'] = len(results['errors']) == 0
-        
     except Exception as e:
-        results['valid'] = False
-        results['errors'].append(f"Validation failed: {str(e)}")
+        return {'valid': False, 'errors': [f"Validation failed: {str(e)}"], 'warnings': []}
     
-    return results
+    return validate_dataset(products, categories, orders)
 
 if __name__ == "__main__":
     # Run validation
@@ -1,8 +1,57 @@
 // Real API client for backend server
 const API_BASE_URL = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8000';
 
-// Helper function to make API requests
-const apiRequest = async (endpoint, options = {}) => {
+// Stored sessions: access tokens expire after minutes, refresh tokens are rotated on every use
+const SESSION_KEYS = {
+  admin: { access: 'pulgax-admin-token', refresh: 'pulgax-admin-refresh-token' },
+  customer: { access: 'pulgax-customer-token', refresh: 'pulgax-customer-refresh-token' },
+};
+
+// Fired with { kind, accessToken } after a refresh, so the auth contexts pick up the new token
+export const TOKENS_REFRESHED_EVENT = 'pulgax-tokens-refreshed';
+
+const pendingRefresh = {};
+
+// Swap the stored refresh token for a new pair; resolves to the new access token, or null when the session is over.
+// One refresh per session at a time: presenting a rotated refresh token twice revokes the whole session.
+export const refreshSession = (kind, expiredToken) => {
+  if (!pendingRefresh[kind]) {
+    pendingRefresh[kind] = (async () => {
+      const keys = SESSION_KEYS[kind];
+      // Another tab may have refreshed already
+      const current = localStorage.getItem(keys.access);
+      if (current && current !== expiredToken) return current;
+      const refreshToken = localStorage.getItem(keys.refresh);
+      if (!refreshToken) return null;
+      try {
+        const response = await fetch(`${API_BASE_URL}/api/auth/refresh`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ refresh_token: refreshToken }),
+        });
+        if (!response.ok) {
+          if (response.status === 401) localStorage.removeItem(keys.refresh);
+          return null;
+        }
+        const data = await response.json();
+        localStorage.setItem(keys.access, data.access_token);
+        localStorage.setItem(keys.refresh, data.refresh_token);
+        window.dispatchEvent(new CustomEvent(TOKENS_REFRESHED_EVENT, { detail: { kind, accessToken: data.access_token } }));
+        return data.access_token;
+      } catch (error) {
+        console.error('Token refresh failed:', error);
+        return null;
+      } finally {
+        delete pendingRefresh[kind];
+      }
+    })();
+  }
+  return pendingRefresh[kind];
+};
+
+// Helper function to make API requests; withHeaders resolves to { data, headers } instead of the body alone.
+// auth ('admin' or 'customer') is the role the endpoint requires: only that session's token is sent and refreshed.
+const apiRequest = async (endpoint, { withHeaders = false, auth = null, ...options } = {}) => {
   const url = `${API_BASE_URL}/api${endpoint}`;
   const config = {
     headers: {
@@ -12,25 +61,33 @@ const apiRequest = async (endpoint, options = {}) => {
     ...options,
   };
 
-  // Add auth token if available
-  const adminToken = localStorage.getItem('pulgax-admin-token');
-  const customerToken = localStorage.getItem('pulgax-customer-token');
-  
-  if (adminToken && !config.headers.Authorization) {
-    config.headers.Authorization = `Bearer ${adminToken}`;
-  } else if (customerToken && !config.headers.Authorization) {
-    config.headers.Authorization = `Bearer ${customerToken}`;
+  // Add the auth token of the endpoint's role, if that session exists
+  let session = null;
+  const token = auth && localStorage.getItem(SESSION_KEYS[auth].access);
+  if (token && !config.headers.Authorization) {
+    session = { kind: auth, token };
+    config.headers.Authorization = `Bearer ${token}`;
   }
 
   try {
-    const response = await fetch(url, config);
+    let response = await fetch(url, config);
+
+    // Expired access token: refresh the session once and retry
+    if (response.status === 401 && session) {
+      const accessToken = await refreshSession(session.kind, session.token);
+      if (accessToken) {
+        config.headers.Authorization = `Bearer ${accessToken}`;
+        response = await fetch(url, config);
+      }
+    }
     
     if (!response.ok) {
       const errorData = await response.json().catch(() => ({ detail: 'Network error' }));
       throw new Error(errorData.detail || `HTTP error! status: ${response.status}`);
     }
     
-    return response.json();
+    const data = await response.json();
+    return withHeaders ? { data, headers: response.headers } : data;
   } catch (error) {
     console.error('API Request failed:', {
       url,
@@ -55,7 +112,14 @@ export const api = {
     body: JSON.stringify(data),
   }),
   
-  adminMe: () => apiRequest('/admin/me'),
+  adminMe: () => apiRequest('/admin/me', { auth: 'admin' }),
+
+  // Revokes the access token and, when given, the refresh token of that session
+  logout: (accessToken, refreshToken) => apiRequest('/auth/logout', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Authorization: `Bearer ${accessToken}` },
+    body: JSON.stringify({ refresh_token: refreshToken || null }),
+  }),
 
   // Customer authentication
   customerRegister: (data) => apiRequest('/customer/register', {
@@ -73,80 +137,127 @@ export const api = {
     body: JSON.stringify(data),
   }),
   
-  getCustomerProfile: () => apiRequest('/customer/profile'),
+  getCustomerProfile: () => apiRequest('/customer/profile', { auth: 'customer' }),
   
   updateCustomerAddress: (data) => apiRequest('/customer/address', {
+    auth: 'customer',
     method: 'PUT',
     body: JSON.stringify(data),
   }),
   
-  getCustomerOrders: () => apiRequest('/customer/orders'),
+  getCustomerOrders: ({ skip = 0, limit = 100 } = {}) => apiRequest(`/customer/orders?skip=${skip}&limit=${limit}`, { auth: 'customer' }),
 
-  // Categories
-  getCategories: () => apiRequest('/categories'),
+  // Categories; lang ('pt' or 'en') returns only that language's fields, as the storefront shows
+  getCategories: ({ lang } = {}) => apiRequest(`/categories${lang ? `?lang=${lang}` : ''}`),
   
   createCategory: (data) => apiRequest('/categories', {
+    auth: 'admin',
     method: 'POST',
     body: JSON.stringify(data),
   }),
   
   updateCategory: (id, data) => apiRequest(`/categories/${id}`, {
+    auth: 'admin',
     method: 'PUT',
     body: JSON.stringify(data),
   }),
   
   deleteCategory: (id) => apiRequest(`/categories/${id}`, {
+    auth: 'admin',
     method: 'DELETE',
   }),
 
-  // Products
+  // Products; params.lang works as for categories
   getProducts: (params = {}) => {
     const queryString = new URLSearchParams(params).toString();
     return apiRequest(`/products${queryString ? `?${queryString}` : ''}`);
   },
   
-  getAllProducts: () => apiRequest('/products/all'),
+  getAllProducts: () => apiRequest('/products/all', { auth: 'admin' }),
   
   getProduct: (id) => apiRequest(`/products/${id}`),
   
   createProduct: (data) => apiRequest('/products', {
+    auth: 'admin',
     method: 'POST',
     body: JSON.stringify(data),
   }),
   
   updateProduct: (id, data) => apiRequest(`/products/${id}`, {
+    auth: 'admin',
     method: 'PUT',
     body: JSON.stringify(data),
   }),
   
   deleteProduct: (id) => apiRequest(`/products/${id}`, {
+    auth: 'admin',
     method: 'DELETE',
   }),
 
   // Orders
-  getOrders: () => apiRequest('/orders'),
+  getOrders: () => apiRequest('/orders', { auth: 'admin' }),
   
-  getOrder: (id) => apiRequest(`/orders/${id}`),
+  getOrder: (id) => apiRequest(`/orders/${id}`, { auth: 'admin' }),
   
-  getOrderDetails: (id) => apiRequest(`/orders/${id}`),
+  getOrderDetails: (id) => apiRequest(`/orders/${id}`, { auth: 'admin' }),
   
+  // Guest checkout works without a session; a signed-in customer's order is linked to them
   createOrder: (data) => apiRequest('/orders', {
+    auth: 'customer',
     method: 'POST',
     body: JSON.stringify(data),
   }).then(response => ({ data: response })), // Wrap response to match expected structure
   
   updateOrderStatus: (id, status, note = '') => apiRequest(`/orders/${id}/status`, {
+    auth: 'admin',
     method: 'PUT',
     body: JSON.stringify({ status, note }),
   }),
   
   processRefund: (id, refundData) => apiRequest(`/orders/${id}/refund`, {
+    auth: 'admin',
     method: 'POST',
     body: JSON.stringify(refundData),
   }),
 
-  // Contact messages
-  getMessages: () => apiRequest('/contact'),
+  // Contact messages: one inbox page, newest first; status is all, read or unread
+  getMessages: async ({ status = 'all', q = '', cursor = null, limit = 50 } = {}) => {
+    const params = new URLSearchParams({ status, limit });
+    if (q) params.set('q', q);
+    if (cursor) params.set('cursor', cursor);
+    const { data, headers } = await apiRequest(`/contact?${params}`, { withHeaders: true, auth: 'admin' });
+    return {
+      data,
+      nextCursor: headers.get('X-Next-Cursor'),
+      unreadCount: Number(headers.get('X-Unread-Count') || 0),
+    };
+  },
+
+  // Submissions held back as duplicates or floods, paged like the inbox
+  getQuarantinedMessages: async ({ q = '', cursor = null, limit = 50 } = {}) => {
+    const params = new URLSearchParams({ limit });
+    if (q) params.set('q', q);
+    if (cursor) params.set('cursor', cursor);
+    const { data, headers } = await apiRequest(`/contact/quarantine?${params}`, { withHeaders: true, auth: 'admin' });
+    return { data, nextCursor: headers.get('X-Next-Cursor') };
+  },
+
+  releaseQuarantinedMessage: (id) => apiRequest(`/contact/quarantine/${id}/release`, {
+    auth: 'admin',
+    method: 'POST',
+  }),
+
+  deleteQuarantinedMessage: (id) => apiRequest(`/contact/quarantine/${id}`, {
+    auth: 'admin',
+    method: 'DELETE',
+  }),
+
+  getMessageArchive: () => apiRequest('/contact/archive', { auth: 'admin' }),
+
+  getArchivedMessages: (segmentId, q = '') => apiRequest(
+    `/contact/archive/${segmentId}${q ? `?q=${encodeURIComponent(q)}` : ''}`,
+    { auth: 'admin' }
+  ),
   
   createMessage: (data) => apiRequest('/contact', {
     method: 'POST',
@@ -154,19 +265,70 @@ export const api = {
   }),
   
   markMessageRead: (id) => apiRequest(`/contact/${id}/read`, {
+    auth: 'admin',
     method: 'PUT',
   }),
   
   deleteMessage: (id) => apiRequest(`/contact/${id}`, {
+    auth: 'admin',
     method: 'DELETE',
   }),
 
   
   // Stats
-  getStats: () => apiRequest('/stats'),
+  getStats: () => apiRequest('/stats', { auth: 'admin' }),
+
+  // Live admin events (server-sent events over fetch, so the auth header can be sent).
+  // Calls onEvent(type, data) until signal aborts, reconnecting and resuming after errors.
+  streamAdminEvents: async (onEvent, signal) => {
+    let lastEventId = null;
+    while (!signal.aborted) {
+      try {
+        const token = localStorage.getItem(SESSION_KEYS.admin.access);
+        const headers = { Authorization: `Bearer ${token}` };
+        if (lastEventId) headers['Last-Event-ID'] = lastEventId;
+        const response = await fetch(`${API_BASE_URL}/api/admin/events`, { headers, signal });
+        if (response.status === 401) {
+          // Reconnect at once with a refreshed token; stop when the session is over
+          if (await refreshSession('admin', token)) continue;
+          return;
+        }
+        if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+        for (;;) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += value;
+          let end;
+          while ((end = buffer.indexOf('\n\n')) >= 0) {
+            const block = buffer.slice(0, end);
+            buffer = buffer.slice(end + 2);
+            let type = 'message';
+            let data = '';
+            block.split('\n').forEach(line => {
+              const colon = line.indexOf(':');
+              if (colon <= 0) return; // comments (keepalives) and malformed lines
+              const field = line.slice(0, colon);
+              const fieldValue = line.slice(colon + 1).replace(/^ /, '');
+              if (field === 'event') type = fieldValue;
+              else if (field === 'data') data += fieldValue;
+              else if (field === 'id') lastEventId = fieldValue;
+            });
+            if (data) onEvent(type, JSON.parse(data));
+          }
+        }
+      } catch (error) {
+        if (signal.aborted) return;
+        console.error('Admin event stream failed:', error);
+      }
+      await new Promise(resolve => setTimeout(resolve, 3000));
+    }
+  },
 
   // Data validation
-  validateData: () => apiRequest('/validate'),
+  validateData: () => apiRequest('/validate', { auth: 'admin' }),
 
   // Image upload (simplified - in production would upload to cloud storage)
   uploadImage: (file) => {
@@ -19,11 +19,11 @@ const GoogleLoginButton = ({ onSuccess, onError }) => {
       };
 
       const result = await api.customerRegister(demoGoogleUser);
-      loginCustomer(result.data.customer, result.data.access_token);
+      loginCustomer(result.customer, result.access_token, result.refresh_token);
       toast.success('Login com Google realizado com sucesso!');
       
       if (onSuccess) {
-        onSuccess(result.data.customer);
+        onSuccess(result.customer);
       } else {
         navigate('/');
       }
@@ -1,15 +1,79 @@
+import { useState, useEffect, useCallback } from 'react';
 import { useLanguage } from '../../context/LanguageContext';
 import { Button } from '../ui/button';
 import { Badge } from '../ui/badge';
+import { Input } from '../ui/input';
 import { toast } from 'sonner';
-import { MessageSquare, Trash2 } from 'lucide-react';
+import { MessageSquare, Trash2, Search, Archive, ShieldAlert } from 'lucide-react';
 import api from '../../api';
 
+const MESSAGES_PAGE_SIZE = 50;
+
+// Pages of the inbox, or of the quarantine when that filter is selected
+const fetchPage = (status, q, cursor) => (status === 'quarantine'
+  ? api.getQuarantinedMessages({ q, cursor, limit: MESSAGES_PAGE_SIZE })
+  : api.getMessages({ status, q, cursor, limit: MESSAGES_PAGE_SIZE }));
+
 export function MessagesManager({ messages, onUpdate }) {
   const { t, language } = useLanguage();
+  const [status, setStatus] = useState('all');
+  const [searchQuery, setSearchQuery] = useState('');
+  const [query, setQuery] = useState('');
+  const [items, setItems] = useState(Array.isArray(messages) ? messages : []);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [unreadCount, setUnreadCount] = useState(0);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [showArchive, setShowArchive] = useState(false);
+  const [segments, setSegments] = useState([]);
+  const [segmentId, setSegmentId] = useState(null);
 
-  // Safe fallback for messages
-  const safeMessages = Array.isArray(messages) ? messages : [];
+  // Search once typing pauses, not on every key
+  useEffect(() => {
+    const timer = setTimeout(() => setQuery(searchQuery.trim()), 300);
+    return () => clearTimeout(timer);
+  }, [searchQuery]);
+
+  const fetchFirstPage = useCallback(async () => {
+    try {
+      if (segmentId) {
+        setItems(await api.getArchivedMessages(segmentId, query));
+        setNextCursor(null);
+        return;
+      }
+      const page = await fetchPage(status, query, null);
+      setItems(Array.isArray(page.data) ? page.data : []);
+      setNextCursor(page.nextCursor);
+      if (page.unreadCount !== undefined) setUnreadCount(page.unreadCount);
+    } catch (error) {
+      console.error('Error fetching messages:', error);
+    }
+  }, [status, query, segmentId]);
+
+  // The dashboard passes new messages in when the live feed reports one
+  useEffect(() => {
+    fetchFirstPage();
+  }, [fetchFirstPage, messages]);
+
+  useEffect(() => {
+    if (!showArchive) return;
+    api.getMessageArchive()
+      .then(result => setSegments(Array.isArray(result) ? result : []))
+      .catch(error => console.error('Error fetching archive:', error));
+  }, [showArchive]);
+
+  const loadMore = async () => {
+    try {
+      setLoadingMore(true);
+      const page = await fetchPage(status, query, nextCursor);
+      setItems(current => [...current, ...(Array.isArray(page.data) ? page.data : [])]);
+      setNextCursor(page.nextCursor);
+      if (page.unreadCount !== undefined) setUnreadCount(page.unreadCount);
+    } catch (error) {
+      toast.error(language === 'pt' ? 'Erro' : 'Error');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   const markAsRead = async (id) => {
     try {
@@ -20,10 +84,26 @@ export function MessagesManager({ messages, onUpdate }) {
     }
   };
 
+  const releaseMessage = async (id) => {
+    try {
+      await api.releaseQuarantinedMessage(id);
+      toast.success(language === 'pt' ? 'Movida para a caixa de entrada' : 'Moved to inbox');
+      setItems(current => current.filter(msg => msg.id !== id));
+      onUpdate();
+    } catch (error) {
+      toast.error(language === 'pt' ? 'Erro' : 'Error');
+    }
+  };
+
   const deleteMessage = async (id) => {
     if (!window.confirm(language === 'pt' ? 'Eliminar?' : 'Delete?')) return;
     try {
-      await api.deleteMessage(id);
+      if (status === 'quarantine') {
+        await api.deleteQuarantinedMessage(id);
+        setItems(current => current.filter(msg => msg.id !== id));
+      } else {
+        await api.deleteMessage(id);
+      }
       toast.success(language === 'pt' ? 'Eliminada!' : 'Deleted!');
       onUpdate();
     } catch (error) {
@@ -31,52 +111,143 @@ export function MessagesManager({ messages, onUpdate }) {
     }
   };
 
+  const formatDate = (value) => new Date(value).toLocaleString(language === 'pt' ? 'pt-PT' : 'en-US');
+
+  const filters = [
+    { id: 'all', label: language === 'pt' ? 'Todas' : 'All' },
+    { id: 'unread', label: `${language === 'pt' ? 'Não lidas' : 'Unread'} (${unreadCount})` },
+    { id: 'read', label: language === 'pt' ? 'Lidas' : 'Read' },
+    { id: 'quarantine', label: language === 'pt' ? 'Quarentena' : 'Quarantine' },
+  ];
+
+  const quarantineReasons = {
+    duplicate: language === 'pt' ? 'Duplicada' : 'Duplicate',
+    email_limit: language === 'pt' ? 'Demasiadas deste email' : 'Too many from this email',
+    ip_limit: language === 'pt' ? 'Demasiadas deste IP' : 'Too many from this IP',
+  };
+
   return (
     <div className="space-y-6" data-testid="messages-tab">
-      <h2 className="text-2xl font-bold text-slate-900 dark:text-white">
-        {t('admin.dashboard.messages')}
-      </h2>
+      <div className="flex flex-wrap items-center justify-between gap-4">
+        <h2 className="text-2xl font-bold text-slate-900 dark:text-white">
+          {t('admin.dashboard.messages')}
+        </h2>
+        <div className="flex items-center gap-4">
+          <div className="relative">
+            <Search className="absolute left-3 top-1/2 -translate-y-1/2 w-4 h-4 text-slate-400" />
+            <Input
+              placeholder={language === 'pt' ? 'Pesquisar mensagens...' : 'Search messages...'}
+              value={searchQuery}
+              onChange={(e) => setSearchQuery(e.target.value)}
+              className="pl-10 w-64"
+            />
+          </div>
+          <Button
+            variant={showArchive ? 'default' : 'outline'}
+            onClick={() => { setShowArchive(!showArchive); setSegmentId(null); }}
+          >
+            <Archive className="w-4 h-4 mr-2" />
+            {language === 'pt' ? 'Arquivo' : 'Archive'}
+          </Button>
+        </div>
+      </div>
+
+      {showArchive ? (
+        <div className="flex flex-wrap gap-2">
+          {segments.length === 0 && (
+            <p className="text-sm text-slate-500">{language === 'pt' ? 'Arquivo vazio' : 'Archive is empty'}</p>
+          )}
+          {segments.map((segment) => (
+            <Button
+              key={segment.id}
+              variant={segmentId === segment.id ? 'default' : 'outline'}
+              size="sm"
+              onClick={() => setSegmentId(segment.id)}
+            >
+              {new Date(segment.first_created_at).toLocaleDateString(language === 'pt' ? 'pt-PT' : 'en-US')}
+              {' – '}
+              {new Date(segment.last_created_at).toLocaleDateString(language === 'pt' ? 'pt-PT' : 'en-US')}
+              {` (${segment.count})`}
+            </Button>
+          ))}
+        </div>
+      ) : (
+        <div className="flex gap-2">
+          {filters.map((filter) => (
+            <Button
+              key={filter.id}
+              variant={status === filter.id ? 'default' : 'outline'}
+              size="sm"
+              onClick={() => setStatus(filter.id)}
+            >
+              {filter.label}
+            </Button>
+          ))}
+        </div>
+      )}
 
       <div className="space-y-4">
-        {safeMessages.length === 0 ? (
+        {(showArchive && !segmentId) ? null : items.length === 0 ? (
           <div className="bg-white dark:bg-slate-800 rounded-xl p-12 text-center">
             <MessageSquare className="w-12 h-12 mx-auto text-slate-300 mb-4" />
             <p className="text-slate-500">
               {language === 'pt' ? 'Nenhuma mensagem' : 'No messages'}
             </p>
           </div>
-        ) : safeMessages.map((msg) => (
+        ) : items.map((msg) => (
           <div
             key={msg.id}
-            className={`bg-white dark:bg-slate-800 rounded-xl p-6 shadow-sm ${!msg.read ? 'ring-2 ring-blue-500' : ''}`}
+            className={`bg-white dark:bg-slate-800 rounded-xl p-6 shadow-sm ${!msg.read && !msg.quarantine ? 'ring-2 ring-blue-500' : ''}`}
           >
             <div className="flex items-start justify-between mb-4">
               <div>
                 <div className="flex items-center gap-2">
                   <h3 className="font-semibold text-slate-900 dark:text-white">{msg.name}</h3>
-                  {!msg.read && <Badge className="bg-blue-100 text-blue-700">{language === 'pt' ? 'Novo' : 'New'}</Badge>}
+                  {msg.quarantine ? msg.quarantine.reasons.map(reason => (
+                    <Badge key={reason} className="bg-amber-100 text-amber-700">
+                      <ShieldAlert className="w-3 h-3 mr-1" />
+                      {quarantineReasons[reason] || reason}
+                    </Badge>
+                  )) : !msg.read && (
+                    <Badge className="bg-blue-100 text-blue-700">{language === 'pt' ? 'Novo' : 'New'}</Badge>
+                  )}
                 </div>
                 <p className="text-sm text-slate-500">{msg.email}</p>
               </div>
-              <div className="flex gap-2">
-                {!msg.read && (
-                  <Button variant="ghost" size="sm" onClick={() => markAsRead(msg.id)}>
-                    {language === 'pt' ? 'Marcar lida' : 'Mark read'}
+              {!segmentId && (
+                <div className="flex gap-2">
+                  {msg.quarantine && (
+                    <Button variant="ghost" size="sm" onClick={() => releaseMessage(msg.id)}>
+                      {language === 'pt' ? 'Não é spam' : 'Not spam'}
+                    </Button>
+                  )}
+                  {!msg.read && !msg.quarantine && (
+                    <Button variant="ghost" size="sm" onClick={() => markAsRead(msg.id)}>
+                      {language === 'pt' ? 'Marcar lida' : 'Mark read'}
+                    </Button>
+                  )}
+                  <Button variant="ghost" size="icon" className="text-red-500" onClick={() => deleteMessage(msg.id)}>
+                    <Trash2 className="w-4 h-4" />
                   </Button>
-                )}
-                <Button variant="ghost" size="icon" className="text-red-500" onClick={() => deleteMessage(msg.id)}>
-                  <Trash2 className="w-4 h-4" />
-                </Button>
-              </div>
+                </div>
+              )}
             </div>
             <h4 className="font-medium text-slate-900 dark:text-white mb-2">{msg.subject}</h4>
             <p className="text-slate-600 dark:text-slate-400">{msg.message}</p>
-            <p className="text-xs text-slate-400 mt-4">
-              {new Date(msg.created_at).toLocaleString(language === 'pt' ? 'pt-PT' : 'en-US')}
-            </p>
+            <p className="text-xs text-slate-400 mt-4">{formatDate(msg.created_at)}</p>
           </div>
         ))}
       </div>
+
+      {nextCursor && !segmentId && (
+        <div className="text-center">
+          <Button variant="outline" onClick={loadMore} disabled={loadingMore}>
+            {loadingMore
+              ? (language === 'pt' ? 'A carregar...' : 'Loading...')
+              : (language === 'pt' ? 'Carregar mais' : 'Load more')}
+          </Button>
+        </div>
+      )}
     </div>
   );
 }
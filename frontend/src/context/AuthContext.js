@@ -1,4 +1,5 @@
 import { createContext, useContext, useState, useEffect } from 'react';
+import api, { TOKENS_REFRESHED_EVENT } from '../api';
 
 const AuthContext = createContext();
 
@@ -28,16 +29,33 @@ export const AuthProvider = ({ children }) => {
     }
   }, [token]);
 
-  const login = (adminData, accessToken) => {
+  // api.js refreshes the session on its own; keep the token here in step
+  useEffect(() => {
+    const onRefresh = (event) => {
+      if (event.detail.kind === 'admin') setToken(event.detail.accessToken);
+    };
+    window.addEventListener(TOKENS_REFRESHED_EVENT, onRefresh);
+    return () => window.removeEventListener(TOKENS_REFRESHED_EVENT, onRefresh);
+  }, []);
+
+  const login = (adminData, accessToken, refreshToken) => {
     setAdmin(adminData);
     setToken(accessToken);
+    if (refreshToken) {
+      localStorage.setItem('pulgax-admin-refresh-token', refreshToken);
+    }
   };
 
   const logout = () => {
+    const refreshToken = localStorage.getItem('pulgax-admin-refresh-token');
+    if (token) {
+      api.logout(token, refreshToken).catch(() => {});
+    }
     setAdmin(null);
     setToken(null);
     localStorage.removeItem('pulgax-admin');
     localStorage.removeItem('pulgax-admin-token');
+    localStorage.removeItem('pulgax-admin-refresh-token');
   };
 
   const isAuthenticated = !!token && !!admin;
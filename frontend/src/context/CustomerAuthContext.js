@@ -1,5 +1,5 @@
 import { createContext, useContext, useState, useEffect, useRef } from 'react';
-import api from '../api';
+import api, { TOKENS_REFRESHED_EVENT } from '../api';
 
 const CustomerAuthContext = createContext();
 
@@ -69,18 +69,35 @@ export const CustomerAuthProvider = ({ children }) => {
     }
   }, [customerToken]);
 
-  const loginCustomer = (customerData, accessToken) => {
+  // api.js refreshes the session on its own; keep the token here in step
+  useEffect(() => {
+    const onRefresh = (event) => {
+      if (event.detail.kind === 'customer') setCustomerToken(event.detail.accessToken);
+    };
+    window.addEventListener(TOKENS_REFRESHED_EVENT, onRefresh);
+    return () => window.removeEventListener(TOKENS_REFRESHED_EVENT, onRefresh);
+  }, []);
+
+  const loginCustomer = (customerData, accessToken, refreshToken) => {
     console.log('Logging in customer:', customerData.email);
     setCustomer(customerData);
     setCustomerToken(accessToken);
+    if (refreshToken) {
+      localStorage.setItem('pulgax-customer-refresh-token', refreshToken);
+    }
   };
 
   const logoutCustomer = () => {
     console.log('Logging out customer');
+    const accessToken = localStorage.getItem('pulgax-customer-token');
+    if (accessToken) {
+      api.logout(accessToken, localStorage.getItem('pulgax-customer-refresh-token')).catch(() => {});
+    }
     setCustomer(null);
     setCustomerToken(null);
     localStorage.removeItem('pulgax-customer');
     localStorage.removeItem('pulgax-customer-token');
+    localStorage.removeItem('pulgax-customer-refresh-token');
   };
 
   const isCustomerAuthenticated = !!customerToken && !!customer && !isValidating;
@@ -277,6 +277,7 @@ export const translations = {
       noOrdersDesc: 'Ainda não fez nenhuma encomenda. Explore os nossos produtos!',
       viewProducts: 'Ver Produtos',
       viewDetails: 'Ver Detalhes',
+      loadMore: 'Carregar mais encomendas',
       color: 'Cor',
       size: 'Tamanho',
       quantity: 'Quantidade',
@@ -753,6 +754,7 @@ export const translations = {
       noOrdersDesc: 'You haven\'t placed any orders yet. Explore our products!',
       viewProducts: 'View Products',
       viewDetails: 'View Details',
+      loadMore: 'Load more orders',
       color: 'Color',
       size: 'Size',
       quantity: 'Quantity',
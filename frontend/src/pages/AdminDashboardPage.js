@@ -66,6 +66,48 @@ export default function AdminDashboardPage() {
     fetchAllData();
   }, [fetchAllData]);
 
+  // Live updates: reload what an event touched, coalescing bursts of events
+  useEffect(() => {
+    if (!token) return undefined;
+    const controller = new AbortController();
+    const pending = new Set();
+    let timer = null;
+
+    const refresh = async () => {
+      timer = null;
+      const kinds = new Set(pending);
+      pending.clear();
+      try {
+        if (kinds.has('reset')) {
+          await fetchAllData();
+          return;
+        }
+        const stats = await api.getStats();
+        setStats(stats?.data || stats || null);
+        if (kinds.has('order')) {
+          const result = await api.getOrders();
+          setOrders(Array.isArray(result?.data) ? result.data : Array.isArray(result) ? result : []);
+        }
+        if (kinds.has('message')) {
+          const result = await api.getMessages();
+          setMessages(Array.isArray(result?.data) ? result.data : Array.isArray(result) ? result : []);
+        }
+      } catch (error) {
+        console.error('Error refreshing dashboard data:', error);
+      }
+    };
+
+    api.streamAdminEvents((type) => {
+      pending.add(type);
+      if (!timer) timer = setTimeout(refresh, 500);
+    }, controller.signal);
+
+    return () => {
+      controller.abort();
+      if (timer) clearTimeout(timer);
+    };
+  }, [token, fetchAllData]);
+
   const handleLogout = () => {
     logout();
     navigate('/admin');
@@ -35,8 +35,8 @@ export default function AdminLoginPage() {
       const response = await api.adminLogin(form);
       console.log('Admin login response:', response);
       
-      // Backend returns: { access_token, token_type, admin }
-      login(response.admin, response.access_token);
+      // Backend returns: { access_token, refresh_token, token_type, admin }
+      login(response.admin, response.access_token, response.refresh_token);
       toast.success(t('admin.login.success') || 'Login realizado com sucesso!');
       navigate('/admin/dashboard');
     } catch (error) {
@@ -56,8 +56,8 @@ export default function AdminLoginPage() {
       const response = await api.adminRegister(registerForm);
       console.log('Admin register response:', response);
       
-      // Backend returns: { access_token, token_type, admin }
-      login(response.admin, response.access_token);
+      // Backend returns: { access_token, refresh_token, token_type, admin }
+      login(response.admin, response.access_token, response.refresh_token);
       toast.success(language === 'pt' ? 'Conta criada com sucesso!' : 'Account created successfully!');
       navigate('/admin/dashboard');
     } catch (error) {
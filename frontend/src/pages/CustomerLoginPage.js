@@ -49,8 +49,8 @@ export default function CustomerLoginPage() {
       const response = await api.customerLogin(loginForm);
       console.log('Customer login response:', response);
       
-      // Backend returns: { access_token, token_type, customer }
-      loginCustomer(response.customer, response.access_token);
+      // Backend returns: { access_token, refresh_token, token_type, customer }
+      loginCustomer(response.customer, response.access_token, response.refresh_token);
       toast.success(t('customer.login.success') || 'Login realizado com sucesso!');
       navigate('/');
     } catch (error) {
@@ -70,8 +70,8 @@ export default function CustomerLoginPage() {
       const response = await api.customerRegister(registerForm);
       console.log('Customer register response:', response);
       
-      // Backend returns: { access_token, token_type, customer }
-      loginCustomer(response.customer, response.access_token);
+      // Backend returns: { access_token, refresh_token, token_type, customer }
+      loginCustomer(response.customer, response.access_token, response.refresh_token);
       toast.success(t('customer.register.success') || 'Conta criada com sucesso!');
       navigate('/');
     } catch (error) {
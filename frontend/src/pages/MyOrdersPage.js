@@ -21,12 +21,16 @@ import {
   MapPin
 } from 'lucide-react';
 
+const ORDERS_PAGE_SIZE = 20;
+
 export default function MyOrdersPage() {
   const navigate = useNavigate();
   const { t, language } = useLanguage();
   const { customer, isCustomerAuthenticated } = useCustomerAuth();
   const [orders, setOrders] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [hasMore, setHasMore] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [selectedOrder, setSelectedOrder] = useState(null);
 
   const fetchOrders = useCallback(async () => {
@@ -39,12 +43,13 @@ export default function MyOrdersPage() {
       setLoading(true);
       console.log('Fetching customer orders...');
       
-      const response = await api.getCustomerOrders();
+      const response = await api.getCustomerOrders({ limit: ORDERS_PAGE_SIZE });
       console.log('Orders response:', response);
       
-      // Backend returns array directly
+      // Backend returns array directly, newest first
       const ordersData = Array.isArray(response) ? response : [];
       setOrders(ordersData);
+      setHasMore(ordersData.length === ORDERS_PAGE_SIZE);
       
     } catch (error) {
       console.error('Error fetching orders:', error);
@@ -63,6 +68,21 @@ export default function MyOrdersPage() {
     }
   }, [t, isCustomerAuthenticated, navigate]);
 
+  const loadMoreOrders = async () => {
+    try {
+      setLoadingMore(true);
+      const response = await api.getCustomerOrders({ skip: orders.length, limit: ORDERS_PAGE_SIZE });
+      const ordersData = Array.isArray(response) ? response : [];
+      setOrders(current => [...current, ...ordersData]);
+      setHasMore(ordersData.length === ORDERS_PAGE_SIZE);
+    } catch (error) {
+      console.error('Error fetching more orders:', error);
+      toast.error(t('orders.loadError') || 'Erro ao carregar encomendas');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     if (!isCustomerAuthenticated) {
       navigate('/login');
@@ -419,6 +439,13 @@ export default function MyOrdersPage() {
                   </CardContent>
                 </Card>
               ))}
+              {hasMore && (
+                <div className="flex justify-center pt-2">
+                  <Button variant="outline" onClick={loadMoreOrders} disabled={loadingMore}>
+                    {t('orders.loadMore')}
+                  </Button>
+                </div>
+              )}
             </div>
           )}
         </div>
@@ -17,7 +17,9 @@ export default function ProductsPage() {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
+  // Only the active language is downloaded, so a language switch fetches the catalog again
   useEffect(() => {
+    let stale = false;
     const fetchData = async () => {
       try {
         setLoading(true);
@@ -26,9 +28,11 @@ export default function ProductsPage() {
         console.log('Fetching products and categories...');
         
         const [productsRes, categoriesRes] = await Promise.all([
-          api.getProducts(),
-          api.getCategories()
+          api.getProducts({ lang: language }),
+          api.getCategories({ lang: language })
         ]);
+        // A newer language switch already replaced this request
+        if (stale) return;
         
         console.log('API Response - Products:', productsRes);
         console.log('API Response - Categories:', categoriesRes);
@@ -44,17 +48,19 @@ export default function ProductsPage() {
         setCategories(categoriesData);
         
       } catch (error) {
+        if (stale) return;
         console.error('Error fetching data:', error);
         setError(error.message || 'Erro ao carregar produtos');
         setProducts([]);
         setCategories([]);
       } finally {
-        setLoading(false);
+        if (!stale) setLoading(false);
       }
     };
     
     fetchData();
-  }, []);
+    return () => { stale = true; };
+  }, [language]);
 
   // Safe filtering with fallback
   const safeProducts = Array.isArray(products) ? products : [];
@@ -0,0 +1,45 @@
+"""
+Shared fixtures: the backend modules on the import path, and the API on a
+throwaway JSON data directory.
+
+``server`` builds its storage when imported, so the environment is set here,
+before any test module imports it.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ["STORAGE_BACKEND"] = "json"
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="pulgax-tests-")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    import server
+
+    with TestClient(server.app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def admin_headers(client):
+    response = client.post("/api/admin/register",
+                           json={"email": "admin@example.com", "password": "admin123", "name": "Admin"})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+def category(client, admin_headers):
+    response = client.post("/api/categories", json={"name_pt": "Categoria", "name_en": "Category"},
+                           headers=admin_headers)
+    assert response.status_code == 200, response.text
+    return response.json()
@@ -0,0 +1,78 @@
+"""Access tokens, refresh-token rotation and reuse detection"""
+import asyncio
+import json
+
+import pytest
+
+from auth_tokens import JsonRefreshStore, TokenError, TokenService, principal_claims
+
+ADA = principal_claims("customer", {"id": "c1", "name": "Ada", "email": "ada@example.com"})
+
+
+def load(path):
+    return json.loads(path.read_text()) if path.exists() else []
+
+
+def save(path, records):
+    path.write_text(json.dumps(records))
+
+
+@pytest.fixture
+def tokens(tmp_path):
+    return TokenService("test-secret", "HS256", JsonRefreshStore(tmp_path / "refresh_tokens.json", load, save))
+
+
+def test_access_token_is_only_valid_for_its_role(tokens):
+    pair = asyncio.run(tokens.issue(ADA))
+    assert tokens.verify(pair["access_token"], "customer")["sub"] == "c1"
+    with pytest.raises(TokenError):
+        tokens.verify(pair["access_token"], "admin")
+    with pytest.raises(TokenError):
+        tokens.verify(pair["refresh_token"])
+
+
+def test_refresh_token_is_rotated_on_use(tokens):
+    first = asyncio.run(tokens.issue(ADA))
+    record = asyncio.run(tokens.rotate(first["refresh_token"]))
+    assert (record["subject"], record["role"]) == ("c1", "customer")
+    second = asyncio.run(tokens.issue(ADA))
+    assert asyncio.run(tokens.rotate(second["refresh_token"]))["subject"] == "c1"
+    with pytest.raises(TokenError, match="Invalid refresh token"):
+        asyncio.run(tokens.rotate("never-issued"))
+
+
+def test_reused_refresh_token_revokes_the_whole_session(tokens):
+    stolen = asyncio.run(tokens.issue(ADA))
+    asyncio.run(tokens.rotate(stolen["refresh_token"]))
+    rotated = asyncio.run(tokens.issue(ADA))
+
+    with pytest.raises(TokenError, match="reused"):
+        asyncio.run(tokens.rotate(stolen["refresh_token"]))
+    # The legitimate client's newer tokens are void too
+    with pytest.raises(TokenError, match="Invalid refresh token"):
+        asyncio.run(tokens.rotate(rotated["refresh_token"]))
+    with pytest.raises(TokenError, match="revoked"):
+        tokens.verify(rotated["access_token"])
+
+
+def test_logout_revokes_access_and_refresh_token(tokens):
+    pair = asyncio.run(tokens.issue(ADA))
+    other = asyncio.run(tokens.issue(ADA))
+    asyncio.run(tokens.revoke(tokens.verify(pair["access_token"]), pair["refresh_token"]))
+    with pytest.raises(TokenError, match="revoked"):
+        tokens.verify(pair["access_token"])
+    # Other sessions stay logged in
+    assert tokens.verify(other["access_token"])["sub"] == "c1"
+    with pytest.raises(TokenError):
+        asyncio.run(tokens.rotate(pair["refresh_token"]))
+
+
+def test_refresh_endpoint_issues_a_new_pair(client):
+    registered = client.post("/api/customer/register",
+                             json={"name": "Bea", "email": "bea@example.com", "password": "secret123"}).json()
+    refreshed = client.post("/api/auth/refresh", json={"refresh_token": registered["refresh_token"]})
+    assert refreshed.status_code == 200, refreshed.text
+    assert refreshed.json()["refresh_token"] != registered["refresh_token"]
+    headers = {"Authorization": f"Bearer {refreshed.json()['access_token']}"}
+    assert client.get("/api/customer/profile", headers=headers).status_code == 200
+    assert client.post("/api/auth/refresh", json={"refresh_token": registered["refresh_token"]}).status_code == 401
@@ -0,0 +1,29 @@
+"""Response compression middleware"""
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from compression import CompressionMiddleware
+
+
+def make_client(vary=None):
+    async def text(request):
+        headers = {"Vary": vary} if vary else {}
+        return PlainTextResponse("pulgax " * 200, headers=headers)
+    app = Starlette(routes=[Route("/", text)])
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+    return TestClient(app)
+
+
+def test_compressed_response_keeps_existing_vary():
+    response = make_client("Origin").get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Origin, Accept-Encoding"
+    assert response.text == "pulgax " * 200
+
+
+def test_accept_encoding_is_not_repeated_in_vary():
+    response = make_client("accept-encoding").get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["vary"] == "accept-encoding"
+    assert make_client().get("/", headers={"Accept-Encoding": "gzip"}).headers["vary"] == "Accept-Encoding"
@@ -0,0 +1,120 @@
+"""Stock reservation engine (JSON ledger)"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from inventory import InsufficientStockError, JsonStockLedger, variant_key
+
+RED_SMALL = variant_key("Red", "S")
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = JsonStockLedger(tmp_path / "stock_journal.jsonl")
+    ledger.load([
+        {"id": "vase", "stock": 5},
+        {"id": "cup", "variant_stock": {RED_SMALL: 2}},
+        {"id": "poster"},
+    ])
+    yield ledger
+    ledger.close()
+
+
+def test_reserve_takes_stock_and_release_returns_it(ledger):
+    ledger.reserve("o1", [("vase", "", 3)])
+    assert ledger.available("vase") == {"": 2}
+    assert ledger.release("o1")
+    assert ledger.available("vase") == {"": 5}
+    # Idempotent
+    assert not ledger.release("o1")
+    assert ledger.available("vase") == {"": 5}
+
+
+def test_reserve_is_all_or_nothing(ledger):
+    with pytest.raises(InsufficientStockError) as error:
+        ledger.reserve("o1", [("vase", "", 1), ("cup", RED_SMALL, 3)])
+    assert (error.value.requested, error.value.available) == (3, 2)
+    assert ledger.available("vase") == {"": 5}
+    assert ledger.available("cup") == {RED_SMALL: 2}
+    assert ledger.reservations() == {}
+
+
+def test_lines_fall_back_to_product_stock_and_untracked_products_never_block(ledger):
+    ledger.reserve("o1", [("vase", variant_key("Blue", "L"), 2), ("poster", "", 100)])
+    assert ledger.available("vase") == {"": 3}
+    assert ledger.available("poster") == {}
+
+
+def test_lifecycle_commit_consume_and_release(ledger):
+    ledger.reserve("o1", [("vase", "", 1)], expires_at="2000-01-01T00:00:00+00:00")
+    ledger.reserve("o2", [("vase", "", 1)])
+    assert ledger.apply_status("o1", "confirmed")
+    assert ledger.reservations()["o1"]["status"] == "committed"
+    # Committed reservations no longer expire
+    assert ledger.expire() == []
+    assert ledger.apply_status("o1", "delivered")
+    assert "o1" not in ledger.reservations()
+    assert ledger.available("vase") == {"": 3}
+    # A refund after delivery has nothing left to return
+    assert not ledger.apply_status("o1", "refunded")
+    assert ledger.apply_status("o2", "cancelled")
+    assert ledger.available("vase") == {"": 4}
+
+
+def test_expire_releases_only_held_reservations_past_expiry(ledger):
+    now = datetime.now(timezone.utc)
+    ledger.reserve("old", [("vase", "", 1)], expires_at=(now - timedelta(minutes=1)).isoformat())
+    ledger.reserve("new", [("vase", "", 1)], expires_at=(now + timedelta(minutes=10)).isoformat())
+    assert ledger.expire(now) == ["old"]
+    assert ledger.available("vase") == {"": 4}
+
+
+def test_admin_stock_change_keeps_open_reservations(ledger):
+    ledger.reserve("o1", [("vase", "", 2)])
+    ledger.set_product_stock({"id": "vase", "stock": 10})
+    assert ledger.available("vase") == {"": 10}
+    ledger.release("o1")
+    assert ledger.available("vase") == {"": 12}
+
+
+def test_journal_replay_restores_counters_and_reservations(ledger, tmp_path):
+    ledger.reserve("o1", [("vase", "", 2)])
+    ledger.reserve("o2", [("cup", RED_SMALL, 1)])
+    ledger.commit("o2")
+    ledger.release("o1")
+    ledger.close()
+
+    replayed = JsonStockLedger(tmp_path / "stock_journal.jsonl")
+    replayed.load([{"id": "vase", "stock": 5}, {"id": "cup", "variant_stock": {RED_SMALL: 2}}])
+    assert replayed.available("vase") == {"": 5}
+    assert replayed.available("cup") == {RED_SMALL: 1}
+    assert replayed.reservations()["o2"]["status"] == "committed"
+    replayed.close()
+
+
+def test_torn_final_journal_line_is_skipped(ledger, tmp_path):
+    ledger.reserve("o1", [("vase", "", 2)])
+    ledger.close()
+    with open(tmp_path / "stock_journal.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"op": "reserve", "order_id": "o2", "li')
+
+    replayed = JsonStockLedger(tmp_path / "stock_journal.jsonl")
+    replayed.load([{"id": "vase", "stock": 5}])
+    assert replayed.available("vase") == {"": 3}
+    assert list(replayed.reservations()) == ["o1"]
+    replayed.close()
+
+
+def test_compaction_keeps_state(ledger, tmp_path):
+    ledger.reserve("o1", [("vase", "", 2)])
+    ledger.reserve("o2", [("vase", "", 1)])
+    ledger.commit("o2")
+    ledger.release("o1")
+    ledger.compact()
+    ledger.close()
+
+    replayed = JsonStockLedger(tmp_path / "stock_journal.jsonl")
+    replayed.load([{"id": "vase", "stock": 5}])
+    assert replayed.available("vase") == {"": 4}
+    assert replayed.reservations()["o2"]["status"] == "committed"
+    replayed.close()
@@ -0,0 +1,49 @@
+"""Background job scheduler"""
+import asyncio
+import threading
+import time
+
+from jobs import Scheduler
+
+
+def test_async_job_past_its_timeout_fails_and_backs_off():
+    async def slow():
+        await asyncio.sleep(1)
+
+    scheduler = Scheduler()
+    job = scheduler.add("slow", slow, every=60, timeout=0.01)
+    assert not asyncio.run(scheduler.run(job))
+    assert job.failures == 1 and not job.running
+
+
+def test_blocking_job_in_a_thread_leaves_the_loop_free():
+    release = threading.Event()
+    scheduler = Scheduler()
+    job = scheduler.add("smtp", lambda: asyncio.to_thread(release.wait, 1), every=60, timeout=0.2)
+
+    async def main():
+        started = time.perf_counter()
+        run = asyncio.create_task(scheduler.run(job))
+        await asyncio.sleep(0.05)
+        # The loop kept serving while the job blocked its thread
+        ticked = time.perf_counter() - started
+        succeeded = await run
+        release.set()
+        return ticked, succeeded
+
+    ticked, succeeded = asyncio.run(main())
+    assert ticked < 0.15
+    assert not succeeded and job.failures == 1
+
+
+def test_email_retry_skips_while_a_timed_out_run_is_still_going():
+    import email_service
+
+    email_service.failed_emails.append({"to_email": "a@example.com", "subject": "s", "html_content": "h",
+                                        "text_content": None, "attempts": 1})
+    with email_service._retry_lock:
+        assert email_service.retry_failed_emails() == {"sent": 0, "requeued": 0, "dropped": 0}
+    assert len(email_service.failed_emails) == 1
+    # Without SMTP credentials delivery only logs, so the retry succeeds
+    assert email_service.retry_failed_emails()["sent"] == 1
+    assert not email_service.failed_emails
@@ -0,0 +1,63 @@
+"""JSON collection range index: the same answers as the full scan, without scanning"""
+import asyncio
+import random
+
+import pytest
+
+import storage
+from storage import JsonLogCollection
+
+QUERIES = [
+    None,
+    {"at": "t05"},
+    {"at": {"$gte": "t03"}},
+    {"at": {"$gt": "t03"}},
+    {"at": {"$lt": "t04"}},
+    {"at": {"$gte": "t02", "$lte": "t06"}},
+    {"at": {"$gte": "t02"}, "kind": "a"},
+    {"at": {"$gt": "t99"}},
+]
+SORTS = [None, [("at", 1)], [("at", -1)], [("kind", 1), ("at", -1)]]
+
+
+@pytest.fixture
+def logs(tmp_path):
+    indexed = JsonLogCollection(tmp_path / "indexed.jsonl", ranges=["at"])
+    scanned = JsonLogCollection(tmp_path / "scanned.jsonl")
+    rng = random.Random(7)
+    docs = [{"id": f"e{n}", "at": f"t{rng.randint(0, 9):02d}", "kind": rng.choice("ab")} for n in range(60)]
+    for collection in (indexed, scanned):
+        asyncio.run(collection.insert_many(docs))
+    return indexed, scanned
+
+
+@pytest.mark.parametrize("query", QUERIES)
+@pytest.mark.parametrize("sort", SORTS)
+@pytest.mark.parametrize("limit", [None, 1, 7])
+def test_range_index_answers_like_the_scan(logs, query, sort, limit):
+    indexed, scanned = logs
+    expected = asyncio.run(scanned.find(query, sort=sort, limit=limit))
+    assert asyncio.run(indexed.find(query, sort=sort, limit=limit)) == expected
+    assert asyncio.run(indexed.count(query)) == asyncio.run(scanned.count(query))
+
+
+def test_tail_read_does_not_scan_the_log(logs, monkeypatch):
+    indexed, _ = logs
+    asyncio.run(indexed.insert({"id": "last", "at": "t99", "kind": "a"}))
+
+    def scan(doc, query):
+        raise AssertionError("scanned the log")
+    monkeypatch.setattr(storage, "matches", scan)
+    assert [doc["id"] for doc in asyncio.run(indexed.find({"at": {"$gte": "t99"}}, sort=[("at", 1)]))] == ["last"]
+    assert asyncio.run(indexed.find(sort=[("at", -1)], limit=1))[0]["id"] == "last"
+
+
+def test_mixed_values_fall_back_to_the_scan(tmp_path):
+    log = JsonLogCollection(tmp_path / "mixed.jsonl", ranges=["at"])
+    asyncio.run(log.insert_many([{"id": "a", "at": "t2"}, {"id": "b", "at": 5}, {"id": "c", "at": "t1"}]))
+    assert [doc["id"] for doc in asyncio.run(log.find({"at": {"$gte": "t0"}}))] == ["a", "c"]
+    assert [doc["id"] for doc in asyncio.run(log.find({"at": {"$gt": 1}}))] == ["b"]
+    missing = JsonLogCollection(tmp_path / "missing.jsonl", ranges=["at"])
+    asyncio.run(missing.insert_many([{"id": "a", "at": "t2"}, {"id": "b"}, {"id": "c", "at": "t1"}]))
+    # Missing values sort first, as the scan orders them
+    assert [doc["id"] for doc in asyncio.run(missing.find(sort=[("at", 1)]))] == ["b", "c", "a"]
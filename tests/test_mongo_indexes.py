@@ -0,0 +1,47 @@
+"""Mongo unique email indexes (against a stand-in for the Motor collection)"""
+import asyncio
+
+import pytest
+
+from storage import MongoCollection
+
+
+class FakeCollection:
+    name = "admins"
+
+    def __init__(self, indexes, fail=False):
+        self.indexes = indexes
+        self.fail = fail
+        self.dropped = []
+
+    async def index_information(self):
+        return self.indexes
+
+    async def drop_index(self, name):
+        self.dropped.append(name)
+        del self.indexes[name]
+
+    async def create_index(self, keys, **options):
+        if self.fail:
+            raise RuntimeError("E11000 duplicate key")
+        self.indexes[f"{keys}_1"] = {"key": [(keys, 1)], **options}
+
+
+def test_index_without_collation_is_replaced():
+    collection = FakeCollection({"_id_": {"key": [("_id", 1)]}, "email_1": {"key": [("email", 1)], "unique": True}})
+    asyncio.run(MongoCollection(collection, unique=["email"]).ensure_unique_indexes())
+    assert collection.dropped == ["email_1"]
+    assert collection.indexes["email_1"]["collation"] == {"locale": "en", "strength": 2}
+
+
+def test_matching_index_is_kept():
+    collation = {"locale": "en", "caseLevel": False, "strength": 2, "version": "57.1"}
+    collection = FakeCollection({"email_1": {"key": [("email", 1.0)], "unique": True, "collation": collation}})
+    asyncio.run(MongoCollection(collection, unique=["email"]).ensure_unique_indexes())
+    assert collection.dropped == []
+
+
+def test_build_failure_is_raised():
+    collection = FakeCollection({}, fail=True)
+    with pytest.raises(RuntimeError):
+        asyncio.run(MongoCollection(collection, unique=["email"]).ensure_unique_indexes())
@@ -0,0 +1,29 @@
+"""CSV / NDJSON export encoding"""
+import asyncio
+import csv
+import io
+
+from order_export import stream_rows_async
+
+
+async def _rows(rows):
+    for row in rows:
+        yield row
+
+
+def encode(rows, fmt, columns):
+    async def collect():
+        return "".join([line async for line in stream_rows_async(_rows(rows), fmt, columns)])
+    return asyncio.run(collect())
+
+
+def test_csv_quotes_formula_cells():
+    rows = [{"name": "=HYPERLINK(\"http://x\")", "notes": "+351 912", "address": "@home", "total": -5},
+            {"name": "\tTab", "notes": "Rua - 1", "address": "-cmd", "total": 3}]
+    parsed = list(csv.DictReader(io.StringIO(encode(rows, "csv", ["name", "notes", "address", "total"]))))
+    assert parsed[0] == {"name": "'=HYPERLINK(\"http://x\")", "notes": "'+351 912", "address": "'@home", "total": "-5"}
+    assert parsed[1] == {"name": "'\tTab", "notes": "Rua - 1", "address": "'-cmd", "total": "3"}
+
+
+def test_ndjson_keeps_values_as_is():
+    assert encode([{"name": "=1+1"}], "ndjson", ["name"]) == '{"name": "=1+1"}\n'
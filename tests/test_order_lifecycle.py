@@ -0,0 +1,113 @@
+"""Order status transitions and their event log"""
+import asyncio
+
+import pytest
+
+from order_lifecycle import (InvalidTransitionError, OrderLifecycle, OrderStatusCounts, TRANSITIONS,
+                             can_transition)
+from storage import JsonStorage
+from .test_products import order_payload, product_payload
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JsonStorage(tmp_path)
+    yield store
+    asyncio.run(store.close())
+
+
+def place(store, lifecycle, order_id="o1"):
+    order = {"id": order_id, "order_number": order_id.upper(), "status": "pending",
+             "created_at": "2026-01-01T00:00:00+00:00", "status_history": []}
+
+    async def run():
+        await store.orders.insert(order)
+        await lifecycle.created(order)
+    asyncio.run(run())
+    return order
+
+
+def test_transition_table():
+    assert can_transition("pending", "confirmed")
+    assert can_transition("cancelled", "refunded")
+    assert not can_transition("pending", "shipped")
+    assert not can_transition("delivered", "cancelled")
+    assert not any(can_transition("refunded", status) for status in TRANSITIONS)
+
+
+def test_order_moves_forward_and_logs_every_change(store):
+    lifecycle = OrderLifecycle(store.orders, store.order_events)
+    seen = []
+
+    async def hook(order, event):
+        seen.append((event["from"], event["to"]))
+    lifecycle.on(hook, statuses=["confirmed", "shipped"])
+    place(store, lifecycle)
+
+    for status in ("confirmed", "processing", "shipped"):
+        order = asyncio.run(lifecycle.transition("o1", status, actor="admin@example.com"))
+        assert order["status"] == status
+    assert order["status_history"][0]["status"] == "shipped"
+    # A note without a status change is logged, but runs no hooks
+    asyncio.run(lifecycle.transition("o1", "shipped", note="Tracking PT123"))
+
+    timeline = asyncio.run(lifecycle.timeline("o1"))
+    assert [event["type"] for event in timeline] == ["created"] + ["status_changed"] * 3 + ["note"]
+    assert timeline[-1]["note"] == "Tracking PT123"
+    assert seen == [("pending", "confirmed"), ("processing", "shipped")]
+
+
+def test_invalid_transition_is_refused_and_changes_nothing(store):
+    lifecycle = OrderLifecycle(store.orders, store.order_events)
+    place(store, lifecycle)
+    with pytest.raises(InvalidTransitionError) as error:
+        asyncio.run(lifecycle.transition("o1", "delivered"))
+    assert (error.value.current, error.value.status) == ("pending", "delivered")
+    assert asyncio.run(store.orders.get("o1"))["status"] == "pending"
+    assert len(asyncio.run(lifecycle.timeline("o1"))) == 1
+
+
+def test_expected_status_guards_the_change(store):
+    lifecycle = OrderLifecycle(store.orders, store.order_events)
+    place(store, lifecycle)
+    asyncio.run(lifecycle.transition("o1", "confirmed"))
+    # The expiry job only cancels orders that are still pending
+    assert asyncio.run(lifecycle.transition("o1", "cancelled", expected=["pending"])) is None
+    assert asyncio.run(store.orders.get("o1"))["status"] == "confirmed"
+    assert asyncio.run(lifecycle.transition("missing", "confirmed")) is None
+
+
+def test_failing_hook_keeps_the_transition(store):
+    lifecycle = OrderLifecycle(store.orders, store.order_events)
+
+    async def broken(order, event):
+        raise RuntimeError("mail server down")
+    lifecycle.on(broken)
+    place(store, lifecycle)
+    assert asyncio.run(lifecycle.transition("o1", "cancelled"))["status"] == "cancelled"
+
+
+def test_status_counts_follow_the_event_log(store):
+    lifecycle = OrderLifecycle(store.orders, store.order_events)
+    counts = OrderStatusCounts(store.orders, store.order_events)
+    place(store, lifecycle, "o1")
+    place(store, lifecycle, "o2")
+    assert asyncio.run(counts.get())["pending"] == 2
+    asyncio.run(lifecycle.transition("o1", "confirmed"))
+    asyncio.run(lifecycle.transition("o2", "cancelled"))
+    asyncio.run(lifecycle.transition("o2", "refunded"))
+    result = asyncio.run(counts.get())
+    assert (result["pending"], result["confirmed"], result["cancelled"], result["refunded"]) == (0, 1, 0, 1)
+
+
+def test_status_route_releases_stock_on_cancel(client, admin_headers, category):
+    product = client.post("/api/products", json=product_payload(category["id"], stock=3),
+                          headers=admin_headers).json()
+    order = client.post("/api/orders", json=order_payload(product["id"], 2)).json()
+    assert client.get(f"/api/products/{product['id']}").json()["stock"] == 1
+
+    refused = client.put(f"/api/orders/{order['id']}/status", params={"status": "delivered"}, headers=admin_headers)
+    assert refused.status_code == 400
+    cancelled = client.put(f"/api/orders/{order['id']}/status", params={"status": "cancelled"}, headers=admin_headers)
+    assert cancelled.status_code == 200, cancelled.text
+    assert client.get(f"/api/products/{product['id']}").json()["stock"] == 3
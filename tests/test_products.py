@@ -0,0 +1,69 @@
+"""Admin product edits"""
+
+
+def product_payload(category_id, **fields):
+    # The fields the admin editor sends: no stock, variant stock or print time
+    return {
+        "name_pt": "Vaso", "name_en": "Vase", "description_pt": "Vaso impresso", "description_en": "Printed vase",
+        "base_price": 12.5, "category_id": category_id,
+        "colors": [{"name": "Red", "hex_code": "#ff0000"}], "sizes": [], "customization_options": [],
+        "images": [], "featured": False, "active": True, **fields
+    }
+
+
+def order_payload(product_id, quantity):
+    return {
+        "customer_name": "Ana", "customer_email": "ana@example.com", "shipping_address": "Rua 1",
+        "payment_method": "transfer", "shipping_cost": 0,
+        "items": [{"product_id": product_id, "quantity": quantity, "selected_color": "Red"}],
+        "total_amount": 12.5 * quantity
+    }
+
+
+def test_edit_without_stock_keeps_stock(client, admin_headers, category):
+    created = client.post("/api/products", json=product_payload(category["id"], stock=5),
+                          headers=admin_headers).json()
+    assert client.post("/api/orders", json=order_payload(created["id"], 2)).status_code == 200
+
+    edited = client.put(f"/api/products/{created['id']}", json=product_payload(category["id"], name_en="Tall vase"),
+                        headers=admin_headers)
+    assert edited.status_code == 200, edited.text
+    assert edited.json()["name_en"] == "Tall vase"
+    assert edited.json()["stock"] == 3
+    assert client.get(f"/api/products/{created['id']}").json()["stock"] == 3
+
+    # The stock is still enforced after the edit
+    assert client.post("/api/orders", json=order_payload(created["id"], 2)).status_code == 200
+    assert client.post("/api/orders", json=order_payload(created["id"], 2)).status_code == 409
+    assert client.get(f"/api/products/{created['id']}").json()["stock"] == 1
+
+
+def test_edit_with_stock_sets_it(client, admin_headers, category):
+    created = client.post("/api/products", json=product_payload(category["id"], stock=5),
+                          headers=admin_headers).json()
+    edited = client.put(f"/api/products/{created['id']}", json=product_payload(category["id"], stock=9),
+                        headers=admin_headers)
+    assert edited.json()["stock"] == 9
+
+
+def test_edit_without_print_time_keeps_it(client, admin_headers, category):
+    created = client.post("/api/products", json=product_payload(category["id"], print_time_minutes=90),
+                          headers=admin_headers).json()
+    edited = client.put(f"/api/products/{created['id']}", json=product_payload(category["id"], base_price=14),
+                        headers=admin_headers)
+    assert edited.status_code == 200, edited.text
+    assert edited.json()["print_time_minutes"] == 90
+    assert edited.json()["base_price"] == 14
+
+
+def test_storefront_language_projection(client, admin_headers, category):
+    created = client.post("/api/products", json=product_payload(category["id"], stock=4),
+                          headers=admin_headers).json()
+    products = client.get("/api/products", params={"lang": "en"}).json()
+    product = next(p for p in products if p["id"] == created["id"])
+    assert product["name_en"] == "Vase" and "name_pt" not in product and "description_pt" not in product
+    assert product["stock"] == 4
+    categories = client.get("/api/categories", params={"lang": "pt"}).json()
+    assert all("name_en" not in c and "name_pt" in c for c in categories)
+    # Without lang, clients such as the admin still get both languages
+    assert "name_pt" in client.get(f"/api/products/{created['id']}").json()
@@ -0,0 +1,27 @@
+"""Rate limiting behind CORS"""
+import pytest
+
+from rate_limit import RateLimitMiddleware
+
+ORIGIN = "http://localhost:3000"
+
+
+@pytest.fixture
+def rate_limiter(client):
+    import server
+
+    layer = server.app.middleware_stack
+    while not isinstance(layer, RateLimitMiddleware):
+        layer = layer.app
+    layer.enabled = True
+    yield layer
+    layer.enabled = False
+
+
+def test_throttled_response_is_readable_cross_origin(client, rate_limiter):
+    statuses = [client.post("/api/customer/register", json={}, headers={"Origin": ORIGIN}) for _ in range(6)]
+    throttled = statuses[-1]
+    assert throttled.status_code == 429
+    assert int(throttled.headers["retry-after"]) >= 1
+    assert throttled.headers["access-control-allow-origin"] == ORIGIN
+    assert "Retry-After" in throttled.headers["access-control-expose-headers"]
@@ -0,0 +1,74 @@
+"""JSON commit journal and crash recovery"""
+import os
+
+import pytest
+
+import storage
+from serialization import dumps
+from storage import commit_files, recover_commits
+
+
+def test_commit_writes_and_appends_every_file(tmp_path):
+    (tmp_path / "orders.json").write_bytes(b"[]")
+    (tmp_path / "events.jsonl").write_bytes(b'{"n": 1}\n')
+    commit_files(tmp_path, [
+        (tmp_path / "orders.json", b'[{"id": "o1"}]', False),
+        (tmp_path / "events.jsonl", b'{"n": 2}\n', True),
+    ])
+    assert (tmp_path / "orders.json").read_bytes() == b'[{"id": "o1"}]'
+    assert (tmp_path / "events.jsonl").read_bytes() == b'{"n": 1}\n{"n": 2}\n'
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["commit.lock", "events.jsonl", "orders.json"]
+
+
+def test_crash_after_the_journal_is_finished_by_recovery(tmp_path, monkeypatch):
+    (tmp_path / "orders.json").write_bytes(b"[]")
+    (tmp_path / "events.jsonl").write_bytes(b'{"n": 1}\n')
+    writes = [
+        (tmp_path / "events.jsonl", b'{"n": 2}\n', True),
+        (tmp_path / "orders.json", b'[{"id": "o1"}]', False),
+    ]
+    apply_commit = storage._apply_commit
+
+    def crash_midway(steps):
+        # The append lands, then the process dies before the replace
+        apply_commit(steps[:1])
+        with open(steps[0]["staged"], "wb") as f:
+            f.write(b'{"n": 2}\n')
+        raise SystemExit
+
+    monkeypatch.setattr(storage, "_apply_commit", crash_midway)
+    with pytest.raises(SystemExit):
+        commit_files(tmp_path, writes)
+    monkeypatch.undo()
+    assert (tmp_path / f"commit-{os.getpid()}.journal").exists()
+
+    recover_commits(tmp_path)
+    assert (tmp_path / "orders.json").read_bytes() == b'[{"id": "o1"}]'
+    # Re-applied from the recorded offset, so the line is appended once
+    assert (tmp_path / "events.jsonl").read_bytes() == b'{"n": 1}\n{"n": 2}\n'
+    assert not list(tmp_path.glob("*.commit")) and not list(tmp_path.glob("commit-*.journal"))
+
+
+def test_crash_before_the_journal_leaves_files_untouched(tmp_path):
+    (tmp_path / "orders.json").write_bytes(b"[]")
+    # Staged but never journaled: not committed
+    (tmp_path / "orders.json.999.commit").write_bytes(b'[{"id": "o1"}]')
+    recover_commits(tmp_path)
+    assert (tmp_path / "orders.json").read_bytes() == b"[]"
+
+
+def test_unreadable_journal_is_skipped(tmp_path):
+    (tmp_path / "commit-999.journal").write_bytes(b'[{"path": ')
+    recover_commits(tmp_path)
+    assert (tmp_path / "commit-999.journal").exists()
+
+
+def test_recovery_of_a_journal_written_by_another_process(tmp_path):
+    (tmp_path / "customers.json").write_bytes(b"[]")
+    staged = tmp_path / "customers.json.999.commit"
+    staged.write_bytes(b'[{"id": "c1"}]')
+    (tmp_path / "commit-999.journal").write_bytes(
+        dumps([{"path": str(tmp_path / "customers.json"), "staged": str(staged), "append_at": None}]))
+    recover_commits(tmp_path)
+    assert (tmp_path / "customers.json").read_bytes() == b'[{"id": "c1"}]'
+    assert not (tmp_path / "commit-999.journal").exists()